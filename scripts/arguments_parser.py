@@ -25,6 +25,10 @@ error = Exception(''' Please specify the street.
 	setting starting idx of filenames:
 	python -m DataGeneration/main_data_generation.py --street 4 --approximate root_nodes --start-idx 1
 	(if none defined, then 0 is used)
+
+	setting number of threads of lookahead iterations (per process):
+	python -m DataGeneration/main_data_generation.py --street 4 --threads 4
+	(if none defined, then arguments.lookahead_num_threads is used)
 	''')
 
 
@@ -0,0 +1,115 @@
+'''
+	Benchmarks cfr iterations of lookahead (see Lookahead._compute_iteration).
+	Reports memory of every layer, average time of one iteration and allocator
+	churn: number of bytes of temporary arrays, that are allocated (and freed)
+	during one iteration (measured with tracemalloc, numpy reports its allocations to it).
+	Streets other than river need trained models of neural network.
+
+	examples:
+	python benchmark_lookahead.py
+	python benchmark_lookahead.py --board Ah7d2c9sTs --batch 4 --iters 100
+	python benchmark_lookahead.py --batch 100 --memory-only
+	python benchmark_lookahead.py --batch 8 --threads 4
+'''
+import sys
+import os
+import time
+import tracemalloc
+os.chdir('..')
+sys.path.append( os.path.join(os.getcwd(),'src') )
+
+import numpy as np
+
+from Settings.arguments import arguments
+from Settings.constants import constants
+from Game.card_tools import card_tools
+from Game.card_to_string_conversion import card_to_string
+from TerminalEquity.terminal_equity import TerminalEquity
+from Tree.tree_builder import PokerTreeBuilder
+from Lookahead.lookahead import Lookahead
+from helper_classes import Node, TreeParams
+
+from arguments_parser import search_argument
+
+
+def build_lookahead(board, batch_size):
+	''' Builds lookahead for the first node of the street with random ranges '''
+	terminal_equity = TerminalEquity()
+	terminal_equity.set_board(board)
+	node = Node()
+	node.board = board
+	node.street = card_tools.board_to_street(board)
+	node.current_player = constants.players.P1
+	node.bets = np.array([arguments.ante, arguments.ante], dtype=arguments.dtype)
+	node.num_bets = 0
+	params = TreeParams()
+	params.root_node = node
+	params.limit_to_street = True
+	tree = PokerTreeBuilder().build_tree(params)
+	lookahead = Lookahead(tree, terminal_equity, batch_size)
+	mask = card_tools.get_possible_hands_mask(board)
+	for player in range(constants.players_count):
+		ranges = np.random.rand(batch_size, constants.hand_count).astype(arguments.dtype) * mask
+		lookahead.layers[0].ranges[ 0, 0, 0, : , player, : ] = ranges / ranges.sum(axis=1, keepdims=True)
+	return lookahead
+
+
+def get_layers_bytes(lookahead):
+	''' Gives number of bytes of arrays owned by every layer and by lookahead itself
+		(views, ex: layer.work, are counted only once, in the array they are taken from)
+	@return list :[(layer name, {array name: bytes})]
+	'''
+	def owned_arrays(obj):
+		return { name: a.nbytes for name, a in vars(obj).items() if isinstance(a, np.ndarray) and a.base is None }
+	report = [ ('layer {}'.format(d), owned_arrays(layer)) for d, layer in enumerate(lookahead.layers[ :lookahead.depth ]) ]
+	report.append( ('shared', owned_arrays(lookahead)) )
+	return report
+
+
+def measure(lookahead, num_iters):
+	''' Measures average time (in milliseconds) and allocator churn (in MB) of one iteration '''
+	# warm up (first iterations may allocate lazily created arrays)
+	for iter in range(2):
+		lookahead._compute_iteration(iter, reconstruct_opponent_cfvs=False)
+	t0 = time.perf_counter()
+	for iter in range(num_iters):
+		lookahead._compute_iteration(iter, reconstruct_opponent_cfvs=False)
+	iter_time = (time.perf_counter() - t0) / num_iters * 1000
+	tracemalloc.start()
+	churn = 0
+	for iter in range(num_iters):
+		tracemalloc.reset_peak()
+		before, _ = tracemalloc.get_traced_memory()
+		lookahead._compute_iteration(iter, reconstruct_opponent_cfvs=False)
+		_, peak = tracemalloc.get_traced_memory()
+		churn += peak - before
+	tracemalloc.stop()
+	return iter_time, churn / num_iters / 1024 / 1024
+
+
+def main():
+	args = sys.argv[1:]
+	board_string = search_argument('--board', args, string=True) or 'Ah7d2c9sTs'
+	batch_size = search_argument('--batch', args) or 1
+	num_iters = search_argument('--iters', args) or 50
+	arguments.lookahead_num_threads = search_argument('--threads', args) or arguments.lookahead_num_threads
+	board = card_to_string.string_to_board(board_string)
+	lookahead = build_lookahead(board, batch_size)
+	print('board: {}, batch size: {}, depth: {}, threads: {}'.format(board_string, batch_size, lookahead.depth, arguments.lookahead_num_threads))
+	total = 0
+	print('{:>10} {:>12}   {}'.format('', 'MB', 'largest arrays (MB)'))
+	for name, arrays in get_layers_bytes(lookahead):
+		megabytes = sum(arrays.values()) / 1024 / 1024
+		largest = sorted(arrays.items(), key=lambda item: -item[1])[:4]
+		print('{:>10} {:>12.2f}   {}'.format(name, megabytes, ', '.join([ '{} {:.2f}'.format(k, v/1024/1024) for k, v in largest ])))
+		total += megabytes
+	print('{:>10} {:>12.2f}'.format('total', total))
+	if '--memory-only' in args:
+		return
+	iter_time, churn = measure(lookahead, num_iters)
+	print('{:>14} {:>16}'.format('iter (ms)', 'churn (MB/iter)'))
+	print('{:>14.2f} {:>16.2f}'.format(iter_time, churn))
+
+
+
+main()
@@ -0,0 +1,73 @@
+'''
+	Benchmarks showdown kernels of terminal equity on the river
+	(see arguments.showdown_kernel) for different numbers of ranges (N).
+	N = 1 is the GEMV shaped case of live play (batch size 1).
+	'cold' times are measured after flushing CPU caches, so the matrix
+	has to be streamed from memory (as in lookahead iterations).
+
+	examples:
+	python benchmark_terminal_equity.py
+	python benchmark_terminal_equity.py --board AhKd7c2s9h --repeats 200
+'''
+import sys
+import os
+import time
+os.chdir('..')
+sys.path.append( os.path.join(os.getcwd(),'src') )
+
+import numpy as np
+
+from Settings.arguments import arguments
+from Settings.constants import constants
+from Game.card_to_string_conversion import card_to_string
+from TerminalEquity.terminal_equity import TerminalEquity
+
+from arguments_parser import search_argument
+
+KERNELS = ['dense', 'sorted']
+NUM_RANGES = [1, 2, 8, 64]
+
+
+def get_kernel_bytes(terminal_equity, kernel):
+	''' Gives number of bytes, that kernel reads for every call '''
+	if kernel == 'dense':
+		return terminal_equity.get_equity_matrix().nbytes
+	return sum([ a.nbytes for a in terminal_equity._showdown.values() ])
+
+
+def measure(terminal_equity, ranges, repeats, flush=None):
+	''' Measures average time (in microseconds) of one call '''
+	terminal_equity.get_call_values(ranges)
+	total = 0
+	for _ in range(repeats):
+		if flush is not None:
+			flush += 1
+		t0 = time.perf_counter()
+		terminal_equity.get_call_values(ranges)
+		total += time.perf_counter() - t0
+	return total / repeats * 1e6
+
+
+def main():
+	args = sys.argv[1:]
+	board_string = search_argument('--board', args, string=True) or 'Ah7d2c9sTs'
+	repeats = search_argument('--repeats', args) or 100
+	board = card_to_string.string_to_board(board_string)
+	terminal_equity = TerminalEquity()
+	# buffer bigger than cpu caches
+	flush = np.ones([64*1024*1024 // 4], dtype=np.float32)
+	print('board: {}'.format(board_string))
+	print('{:>8} {:>10} {:>6} {:>12} {:>12}'.format('kernel', 'MB', 'N', 'warm (us)', 'cold (us)'))
+	for kernel in KERNELS:
+		arguments.showdown_kernel = kernel
+		terminal_equity.set_board(board)
+		megabytes = get_kernel_bytes(terminal_equity, kernel) / 1024 / 1024
+		for N in NUM_RANGES:
+			ranges = np.random.rand(N, constants.hand_count).astype(arguments.dtype)
+			warm = measure(terminal_equity, ranges, repeats)
+			cold = measure(terminal_equity, ranges, repeats, flush)
+			print('{:>8} {:>10.2f} {:>6} {:>12.1f} {:>12.1f}'.format(kernel, megabytes, N, warm, cold))
+
+
+
+main()
@@ -10,12 +10,16 @@ from Settings.arguments import arguments
 from Game.card_to_string_conversion import card_to_string
 from DataGeneration.data_generation import DataGeneration
 
-from arguments_parser import parse_arguments
+from arguments_parser import parse_arguments, search_argument
 
 
 def main():
 	args = sys.argv[1:]
 	street, starting_idx, approximate = parse_arguments(args)
+	# threads of lookahead iterations in this process (see arguments.lookahead_num_threads)
+	num_threads = search_argument('--threads', args)
+	if num_threads is not None:
+		arguments.lookahead_num_threads = num_threads
 	street_name = card_to_string.street_to_name(street)
 	dirpath = os.path.join( arguments.data_path, street_name, '{}_{}'.format(approximate, 'npy') )
 	data_generation = DataGeneration(dirpath)
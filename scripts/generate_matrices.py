@@ -0,0 +1,56 @@
+'''
+	Script that generates matrices used by terminal equity (block_matrix.npy, pf_equity.npy),
+	validates 7 card lookup table (texas_lookup.npy) and writes manifest with checksums.
+
+	examples:
+	python generate_matrices.py --processes 8
+	python generate_matrices.py --block-only
+	python generate_matrices.py --verify
+'''
+import sys
+import os
+import time
+if __name__ == '__main__': # (not in child processes of process pool)
+	os.chdir('..')
+sys.path.append( os.path.join(os.getcwd(),'src') )
+
+import numpy as np
+
+from TerminalEquity.matrices_generator import matrices_generator, MATRICES_DIR
+
+from arguments_parser import search_argument
+
+
+def main():
+	args = sys.argv[1:]
+	if '--verify' in args:
+		errors = matrices_generator.verify()
+		print('\n'.join(errors) if errors else 'all matrices are valid')
+		return
+	num_processes = search_argument('--processes', args) or os.cpu_count()
+	matrices = {}
+	matrices['block_matrix.npy'] = matrices_generator.create_block_matrix()
+	if '--block-only' not in args:
+		texas_lookup = np.load(os.path.join(MATRICES_DIR, 'texas_lookup.npy'), mmap_mode='r')
+		errors = matrices_generator.validate_texas_lookup(texas_lookup)
+		if errors:
+			print('invalid texas_lookup.npy:\n' + '\n'.join(errors))
+			return
+		print('creating preflop equity matrix ({} processes)...'.format(num_processes))
+		t0 = time.time()
+		pf_equity, categories = matrices_generator.create_pf_equity(num_processes)
+		print('done in {:.0f}s'.format(time.time() - t0))
+		errors = matrices_generator.validate_texas_lookup(texas_lookup, categories=categories)
+		if errors:
+			print('invalid texas_lookup.npy:\n' + '\n'.join(errors))
+			return
+		matrices['pf_equity.npy'] = pf_equity
+		# lookup table is not generated, only its checksum is saved
+		matrices['texas_lookup.npy'] = None
+	matrices_generator.save(matrices)
+	print('saved: {}'.format(', '.join(matrices.keys())))
+
+
+
+if __name__ == '__main__':
+	main()
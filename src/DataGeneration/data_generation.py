@@ -28,29 +28,39 @@ class DataGeneration():
 		# init range generator and term eq
 		self.range_generator = RangeGenerator()
 		self.term_eq = TerminalEquity()
+		# terminal equity of every board solved together (see self.solve_root_nodes)
+		self.term_eqs = [self.term_eq]
 		# main vars
 		HC, PC = constants.hand_count, constants.players_count
 		self.target_size = HC * PC
 		self.input_size = HC * PC + 1
 
 
-	def solve_root_node(self, board, batch_size):
-		''' solves random root nodes to get cfvs
-		@param: [0-5] :vector of board cards, where card is unique index (int)
-		@param: int   :batch of how many situations are evaluated simultaneously (usually will be = 1)
+	def solve_root_nodes(self, boards, batch_size):
+		''' solves random root nodes to get cfvs. Boards are solved together
+			in one board-batched lookahead (see Lookahead._set_terminal_equity)
+		@param: [[0-5],...] :list of boards (on the same street), where card is unique index (int)
+		@param: int         :batch of how many situations are evaluated simultaneously for every board
+		@return [k x b, I x P + 1], [k x b, I x P] :inputs and targets (k = number of boards)
 		'''
 		HC, PC = constants.hand_count, constants.players_count
-		# set board in terminal equity and range generator
-		self.term_eq.set_board(board)
-		hand_strengths = self.term_eq.get_hand_strengths() # [I]
-		self.range_generator.set_board(hand_strengths, board)
+		num_boards = len(boards)
+		while len(self.term_eqs) < num_boards:
+			self.term_eqs.append(TerminalEquity())
 		# init inputs and outputs
-		targets = np.zeros([batch_size, self.target_size], dtype=arguments.dtype)
-		inputs = np.zeros([batch_size, self.input_size], dtype=arguments.dtype)
-		# generating ranges
-		ranges = np.zeros([PC, batch_size, HC], dtype=arguments.dtype)
-		for player in range(PC):
-			self.range_generator.generate_range(ranges[player])
+		targets = np.zeros([num_boards*batch_size, self.target_size], dtype=arguments.dtype)
+		inputs = np.zeros([num_boards*batch_size, self.input_size], dtype=arguments.dtype)
+		# generating ranges (situations of every board are next to each other)
+		ranges = np.zeros([PC, num_boards*batch_size, HC], dtype=arguments.dtype)
+		terminal_equities = []
+		for i, board in enumerate(boards):
+			# set board in terminal equity and range generator
+			self.term_eqs[i].set_board(board)
+			hand_strengths = self.term_eqs[i].get_hand_strengths() # [I]
+			self.range_generator.set_board(hand_strengths, board)
+			for player in range(PC):
+				self.range_generator.generate_range(ranges[ player, i*batch_size:(i+1)*batch_size ])
+			terminal_equities += [self.term_eqs[i]] * batch_size
 		# put generated ranges into inputs
 		for p in range(PC):
 			inputs[ : , p*HC:(p+1)*HC ] = ranges[p]
@@ -63,11 +73,11 @@ class DataGeneration():
 		normalized_pot_size = random_pot_size / arguments.stack
 		# put normalized pot size into inputs
 		inputs[ : , -1 ].fill(normalized_pot_size)
-		# set up solver
-		resolving = Resolving(self.term_eq, verbose=0)
-		# setting up first node
+		# set up solver (with one board lookahead is not board-batched)
+		resolving = Resolving(terminal_equities if num_boards > 1 else self.term_eqs[0], verbose=0)
+		# setting up first node (board of the tree is used only for the first board)
 		current_node = Node()
-		current_node.board = board
+		current_node.board = boards[0]
 		current_node.street = self.street
 		current_node.num_bets = 0
 		current_node.current_player = constants.players.P1 if self.street == 1 else constants.players.P2
@@ -122,10 +132,10 @@ class DataGeneration():
 		nn_output = np.zeros([batch_size, self.target_size], dtype=arguments.dtype)
 		# iterate through all possible boards
 		next_boards = card_tools.get_next_round_boards(board)
-		for next_board in next_boards:
-			board_features = card_tools.convert_board_to_nn_feature(next_board)
+		next_boards_features = card_tools.convert_boards_to_nn_features(next_boards)
+		next_boards_masks = card_tools.get_possible_hands_masks(next_boards)
+		for board_features, mask in zip(next_boards_features, next_boards_masks):
 			nn_input[ : , self.input_size: ] = board_features
-			mask = card_tools.get_possible_hands_mask(next_board)
 			nn_input[ : , :self.input_size ] = inputs.copy()
 			nn_input[ : , 0:HC ] *= mask
 			nn_input[ : , HC:2*HC ] *= mask
@@ -159,20 +169,26 @@ class DataGeneration():
 			TARGETS = np.zeros([num_batches_in_file, self.target_size], dtype=arguments.dtype)
 			INPUTS =  np.zeros([num_batches_in_file, self.input_size],  dtype=arguments.dtype)
 			BOARDS = np.zeros([num_different_boards_per_file, num_board_cards], dtype=arguments.dtype)
-			for b in range(num_different_boards_per_file):
+			# root nodes of several boards can be solved together (preflop has only one board)
+			boards_per_solve = arguments.gen_boards_per_solve if approximate == 'root_nodes' and self.street > 1 else 1
+			for b in range(0, num_different_boards_per_file, boards_per_solve):
 				t0 = time.time()
-				# create random board
-				if self.street == 1: board = np.zeros([], dtype=arguments.int_dtype)
-				else: board = np.random.choice(card_count, size=num_board_cards, replace=False)
+				num_boards = min(boards_per_solve, num_different_boards_per_file - b)
+				# create random boards
+				boards = []
+				for _ in range(num_boards):
+					if self.street == 1: boards.append( np.zeros([], dtype=arguments.int_dtype) )
+					else: boards.append( np.random.choice(card_count, size=num_board_cards, replace=False) )
 				# init targets, inputs and solve it
 				if approximate == 'root_nodes':
-					inputs, targets = self.solve_root_node(board, batch_size)
+					inputs, targets = self.solve_root_nodes(boards, batch_size)
 				else: # approximate == 'leaf_nodes'
-					inputs, targets = self.solve_leaf_node(board, batch_size)
+					inputs, targets = self.solve_leaf_node(boards[0], batch_size)
 				# save to placeholders for later
-				TARGETS[ b*batch_size:(b+1)*batch_size , : ] = targets
-				INPUTS[ b*batch_size:(b+1)*batch_size , : ] = inputs
-				BOARDS[ b , : ] = board
+				TARGETS[ b*batch_size:(b+num_boards)*batch_size , : ] = targets
+				INPUTS[ b*batch_size:(b+num_boards)*batch_size , : ] = inputs
+				for i, board in enumerate(boards):
+					BOARDS[ b+i , : ] = board
 				print('took:{}'.format(time.time()-t0))
 			# save
 			fpath = os.path.join(self.dirpath, '{}.{}')
@@ -23,6 +23,11 @@ class CardCombinations():
 		for i in range(1,self.max_choose+1):
 			for j in range(1,i+1):
 				self.C[i*self.max_choose + j] = self.C[(i-1)*self.max_choose + j-1] + self.C[(i-1)*self.max_choose + j]
+		# [n,k] table of C(k,n) (used for vectorized ranking of boards)
+		self.choose_table = np.zeros([self.max_choose+1, self.max_choose+1], dtype=np.int64)
+		for i in range(0,self.max_choose+1):
+			for j in range(0,self.max_choose+1):
+				self.choose_table[i,j] = self.C[i*self.max_choose + j]
 
 
 	def choose(self, n, k):
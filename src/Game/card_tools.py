@@ -5,6 +5,7 @@
 	vectors over the set of possible private hands. For Leduc Hold'em,
 	each private hand consists of one card.
 '''
+import itertools
 import numpy as np
 
 from Settings.arguments import arguments
@@ -14,7 +15,35 @@ from Game.card_combinations import card_combinations
 
 class CardTools():
 	def __init__(self):
-		pass
+		self._init_card_tables()
+		# memoized boards from self.get_next_round_boards and self.get_last_round_boards
+		self._boards_cache = {}
+		self._boards_cache_size = 4096
+
+
+	def _init_card_tables(self):
+		''' Creates static tables that map hand index to its cards, cards to hand index
+			and card to all hands that hold this card
+		'''
+		HC, CC = constants.hand_count, constants.card_count
+		# all hands (card_1 < card_2)
+		card1, card2 = np.triu_indices(CC, k=1)
+		hand_idxs = card1 + card2 * (card2 - 1) // 2
+		# [I,2] :hand_idx -> [card_1, card_2]
+		self.hand_to_cards = np.zeros([HC,2], dtype=arguments.int_dtype)
+		self.hand_to_cards[ hand_idxs, 0 ] = card1
+		self.hand_to_cards[ hand_idxs, 1 ] = card2
+		# [C,C] :[card_1, card_2] -> hand_idx (in any order of cards, -1 for the same cards)
+		self.cards_to_hand = np.full([CC,CC], -1, dtype=np.int64)
+		self.cards_to_hand[ card1, card2 ] = hand_idxs
+		self.cards_to_hand[ card2, card1 ] = hand_idxs
+		# [I,C] :incidence matrix with ones, where hand holds particular card
+		self.hand_card_matrix = np.zeros([HC,CC], dtype=arguments.dtype)
+		self.hand_card_matrix[ np.arange(HC), self.hand_to_cards[:,0] ] = 1
+		self.hand_card_matrix[ np.arange(HC), self.hand_to_cards[:,1] ] = 1
+		# [C,C-1] :card -> [hand_idx,...] (all hands that hold this card, in increasing order)
+		self.card_to_hands = np.nonzero(self.hand_card_matrix.T)[1].reshape([CC,CC-1]).astype(arguments.int_dtype)
+
 
 	def convert_board_to_nn_feature(self, board):
 		'''
@@ -49,45 +78,55 @@ class CardTools():
 		return out
 
 
+	def convert_boards_to_nn_features(self, boards):
+		''' Does self.convert_board_to_nn_feature for batch of boards (in one operation)
+		@param: [B,0-5]     :boards (the same number of cards on each board)
+		@return [B,52+4+13] :board features
+		'''
+		num_ranks, num_suits, num_cards = constants.rank_count, constants.suit_count, constants.card_count
+		num_boards = boards.shape[0]
+		out = np.zeros([num_boards, num_cards + num_suits + num_ranks], dtype=np.float32)
+		one_hot_boards = out[ : , :num_cards ]
+		one_hot_boards[ np.arange(num_boards).reshape([-1,1]), boards.reshape([num_boards,-1]) ] = 1
+		# card = rank * num_suits + suit
+		one_hot_boards = one_hot_boards.reshape([num_boards, num_ranks, num_suits])
+		out[ : , num_cards:num_cards+num_suits ] = one_hot_boards.sum(axis=1) / num_suits
+		out[ : , num_cards+num_suits: ] = one_hot_boards.sum(axis=2) / num_ranks
+		return out
+
+
 	def get_possible_hands_mask(self, board):
 		''' Gives the private hands which are valid with a given board.
 		@param: [0-5] :vector of board cards, where card is unique index (int)
 		@return [I]   :vector with an entry for every possible hand (private card),
 				which is `1` if the hand shares no cards with the board and `0` otherwise
 		'''
-		HC, CC = constants.hand_count, constants.card_count
-		out = np.zeros([HC], dtype=arguments.int_dtype)
-		if board.ndim == 0 or board.shape[0] == 0:
-			out.fill(1)
-			return out
+		if board.ndim == 0:
+			board = np.zeros([0], dtype=arguments.int_dtype)
+		return self.get_possible_hands_masks(board.reshape([1,-1]))[0]
 
-		used = np.zeros([CC], dtype=bool)
-		for card in board:
-			used[ card ] = 1
-
-		for card1 in range(CC):
-			if not used[card1]:
-				for card2 in range(card1+1,CC):
-					if not used[card2]:
-						hand = [card1, card2]
-						hand_index = self.get_hand_index(hand)
-						out[ hand_index ] = 1
-		return out
+
+	def get_possible_hands_masks(self, boards):
+		''' Does self.get_possible_hands_mask for batch of boards (in one operation)
+		@param: [B,0-5] :boards (the same number of cards on each board)
+		@return [B,I]   :masks of possible hands for every board
+		'''
+		CC, num_boards = constants.card_count, boards.shape[0]
+		# [B,C] cards, that are used on each board
+		used = np.zeros([num_boards,CC], dtype=bool)
+		used[ np.arange(num_boards).reshape([-1,1]), boards.reshape([num_boards,-1]) ] = True
+		# [B,I] hands, that do not hold any of used cards
+		blocked = used[ : , self.hand_to_cards[:,0] ]
+		blocked |= used[ : , self.hand_to_cards[:,1] ]
+		return np.logical_not(blocked).astype(arguments.int_dtype)
 
 
 	def same_boards(self, board1, board2):
-		''' checks if board1 == board2
+		''' checks if board1 == board2 (in any order of cards)
 		@param: [0-5] :vector of board cards, where card is unique index (int)
 		@param: [0-5] :vector of board cards, where card is unique index (int)
 		'''
-		for card1 in board1:
-			found_match = False
-			for card2 in board2:
-				found_match = True
-				break
-			if not found_match:
-				return False
-		return True
+		return np.array_equal(np.sort(board1.reshape([-1])), np.sort(board2.reshape([-1])))
 
 
 	def board_to_street(self, board):
@@ -104,77 +143,114 @@ class CardTools():
 					return i+1
 
 
-	def _build_boards(self, boards, cur_board, out, card_index, last_index, base_index):
+	def _enumerate_boards(self, board, num_cards):
+		''' Gives all boards, that extend the board with `num_cards` new cards.
+			New cards are all combinations of cards, that are not on the board
+			(in lexicographical order), appended after the board cards
+		@param: [0-5] :vector of board cards, where card is unique index (int)
+		@param: int   :number of board cards after extension
+		@return [B,k] :all extended boards
+		'''
 		CC = constants.card_count
-		if card_index == last_index + 1:
-			for i in range(1, last_index+1):
-				boards[0][boards[1]-1][i-1] = cur_board[i-1] # (boards[0] - boards, boards[1] - index)
-			out[boards[1]-1] = cur_board.copy()
-			boards[1] += 1
-		else:
-			startindex = 1
-			if card_index > base_index:
-				startindex = int(cur_board[card_index-1-1] + 1)
-			for i in range(startindex, CC+1):
-				good = True
-				for j in range(1, card_index - 1 + 1):
-					if cur_board[j-1] == i:
-						good = False
-				if good:
-					cur_board[card_index-1] = i
-					self._build_boards(boards, cur_board, out, card_index+1, last_index, base_index)
+		board = np.zeros([0], dtype=arguments.int_dtype) if board.ndim == 0 else board.astype(arguments.int_dtype)
+		num_new_cards = num_cards - board.shape[0]
+		key = (tuple(board.tolist()), num_cards)
+		if key in self._boards_cache:
+			return self._boards_cache[key]
+		# all combinations of remaining cards
+		remaining_cards = np.setdiff1d(np.arange(CC, dtype=arguments.int_dtype), board)
+		num_boards = card_combinations.choose(remaining_cards.shape[0], num_new_cards)
+		combinations = itertools.chain.from_iterable(itertools.combinations(range(remaining_cards.shape[0]), num_new_cards))
+		combinations = np.fromiter(combinations, dtype=np.int64, count=num_boards*num_new_cards).reshape([num_boards, num_new_cards])
+		out = np.zeros([num_boards, num_cards], dtype=arguments.int_dtype)
+		out[ : , :board.shape[0] ] = board
+		out[ : , board.shape[0]: ] = remaining_cards[combinations]
+		# boards are shared between all callers
+		out.setflags(write=False)
+		if len(self._boards_cache) >= self._boards_cache_size:
+			self._boards_cache.pop(next(iter(self._boards_cache)))
+		self._boards_cache[key] = out
+		return out
 
 
 	def get_next_round_boards(self, board):
 		''' Gives all possible sets of board cards for the game.
+			Boards are memoized for every board (returned array is read-only)
 		@param: [0-5] :vector of board cards, where card is unique index (int)
 		@return [B,I] :tensor, where B is all possible next round boards
 		'''
-		BCC, CC = constants.board_card_count, constants.card_count
+		BCC = constants.board_card_count
 		street = self.board_to_street(board)
-		boards_count = card_combinations.count_next_street_boards(street)
-		out = np.zeros([ boards_count, BCC[street] ], dtype=arguments.int_dtype)
-		boards = [out,1] # (boards, index)
-		cur_board = np.zeros([ BCC[street] ], dtype=arguments.int_dtype)
-		if board.ndim > 0:
-			for i in range(board.shape[0]):
-				cur_board[i] = board[i] + 1
-		#
-		self._build_boards(boards, cur_board, out, BCC[street-1] + 1, BCC[street], BCC[street-1] + 1)
-		out -= 1
-		return out
+		return self._enumerate_boards(board, BCC[street])
 
 
 	def get_last_round_boards(self, board):
 		''' Gives all possible sets of board cards for the game.
+			Boards are memoized for every board (returned array is read-only)
 		@param: [0-5] :vector of board cards, where card is unique index (int)
 		@return [B,I] :tensor, where B is all possible next round boards
 		'''
 		BCC, SC = constants.board_card_count, constants.streets_count
-		street = self.board_to_street(board)
-		boards_count = card_combinations.count_last_street_boards(street)
-		out = np.zeros([ boards_count, BCC[SC-1] ], dtype=arguments.int_dtype)
-		boards = [out,1] # (boards, index)
-		cur_board = np.zeros([ BCC[SC-1] ], dtype=arguments.dtype)
-		if board.ndim > 0:
-			for i in range(board.shape[0]):
-				cur_board[i] = board[i] + 1
-		self._build_boards(boards, cur_board, out, BCC[street-1] + 1, BCC[SC-1], BCC[street-1] + 1)
-		out -= 1
+		return self._enumerate_boards(board, BCC[SC-1])
+
+
+	def get_boards_indexes(self, board, boards):
+		''' Gives indexes of boards in the order of self.get_next_round_boards(board)
+			or self.get_last_round_boards(board) (in O(1) for each board). New cards are ranked
+			in combinatorial number system: lexicographical index of sorted combination
+			`a` of k cards (from n remaining cards) is C(k,n) - 1 - sum_j C(j, b_j),
+			where `b` is colex ordered complement of `a` (b = n - 1 - a, sorted ascending)
+		@param: [0-5]         :vector of board cards, where card is unique index (int)
+		@param: [B,k] or [k]  :boards that extend the board (new cards can be in any order)
+		@return [B]   or int  :indexes of the boards
+		'''
+		CC, C = constants.card_count, card_combinations.choose_table
+		board = np.zeros([0], dtype=np.int64) if board.ndim == 0 else np.sort(board.astype(np.int64))
+		boards = np.asarray(boards).astype(np.int64)
+		single = boards.ndim == 1
+		boards = boards.reshape([-1, boards.shape[-1]])
+		n, k = CC - board.shape[0], boards.shape[1] - board.shape[0]
+		# [B,k] new cards (sorted) and their positions in the remaining cards
+		new_cards = np.sort(boards[ ~np.isin(boards, board) ].reshape([-1,k]), axis=1)
+		positions = new_cards - np.searchsorted(board, new_cards)
+		# colex rank of the complement
+		complement = n - 1 - positions[ : , ::-1 ]
+		colex_rank = C[ complement, np.arange(1, k+1) ].sum(axis=1)
+		indexes = C[n,k] - 1 - colex_rank
+		return int(indexes[0]) if single else indexes
+
+
+	def get_boards_from_indexes(self, board, indexes, num_cards):
+		''' Inverse of self.get_boards_indexes (unranking)
+		@param: [0-5] :vector of board cards, where card is unique index (int)
+		@param: [B]   :indexes of boards
+		@param: int   :number of cards on the boards
+		@return [B,k] :boards (board cards, followed by sorted new cards)
+		'''
+		CC, C = constants.card_count, card_combinations.choose_table
+		board = np.zeros([0], dtype=arguments.int_dtype) if board.ndim == 0 else board.astype(arguments.int_dtype)
+		indexes = np.asarray(indexes, dtype=np.int64).reshape([-1])
+		n, k = CC - board.shape[0], num_cards - board.shape[0]
+		remaining_cards = np.setdiff1d(np.arange(CC, dtype=arguments.int_dtype), board)
+		colex_rank = C[n,k] - 1 - indexes
+		out = np.zeros([indexes.shape[0], num_cards], dtype=arguments.int_dtype)
+		out[ : , :board.shape[0] ] = board
+		for j in range(k, 0, -1):
+			# the biggest b, that C(j,b) <= colex_rank
+			complement = np.searchsorted(C[ :n, j ], colex_rank, side='right') - 1
+			colex_rank -= C[ complement, j ]
+			out[ : , board.shape[0] + k - j ] = remaining_cards[ n - 1 - complement ]
 		return out
 
 
 	def get_hand_index(self, hand):
 		''' Gives a numerical index for a set of hand
-		@param: [2] :vector of player private cards, where card is unique index (int)
-		@return int :numerical index for the hand (0-1326)
-		(first card is always smaller then second!)
+		@param: [2] or [...,2] :vector of player private cards, where card is unique index (int)
+					(or batch of hands)
+		@return int or [...]   :numerical index for the hand (0-1326)
 		'''
-		index = 1
-		for i in range(len(hand)):
-			index += card_combinations.choose(hand[i], i+1)
-		return index - 1
-
+		hand = np.asarray(hand)
+		return self.cards_to_hand[ hand[...,0], hand[...,1] ]
 
 
 
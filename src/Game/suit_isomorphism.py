@@ -0,0 +1,205 @@
+'''
+	Suit isomorphism of boards and hands.
+
+	Boards that differ only by a permutation of suits are strategically identical
+	(ex: 'AhKhQd' and 'AsKsQc'). Every board is mapped to a canonical representative
+	(lexicographically smallest sorted board of all 24 suit permutations) and the
+	suit permutation that transforms the board to it. Range/value vectors over
+	hands ([...,I]) can then be remapped between the board and its canonical board,
+	so that equity matrices, neural network queries, caches and generated data
+	can be shared between isomorphic boards.
+'''
+import itertools
+import numpy as np
+
+from Settings.arguments import arguments
+from Settings.constants import constants
+from Game.card_tools import card_tools
+
+class SuitIsomorphism():
+	def __init__(self):
+		self._init_permutation_tables()
+		# memoized results of self.get_next_round_canonical_boards and self.get_last_round_canonical_boards
+		self._boards_cache = {}
+		self._boards_cache_size = 4096
+
+
+	def _init_permutation_tables(self):
+		''' Creates tables for all suit permutations (P = 4! = 24) '''
+		SC, CC = constants.suit_count, constants.card_count
+		# [P,4] :permutation -> [new suit of suit 0, ..., new suit of suit 3]
+		self.suit_permutations = np.array(list(itertools.permutations(range(SC))), dtype=np.int64)
+		num_permutations = self.suit_permutations.shape[0]
+		# [P] :permutation -> its inverse permutation
+		self.inverse_permutations = np.zeros([num_permutations], dtype=np.int64)
+		for p, suit_permutation in enumerate(self.suit_permutations):
+			inverse = np.argsort(suit_permutation)
+			self.inverse_permutations[p] = np.nonzero(np.all(self.suit_permutations == inverse, axis=1))[0][0]
+		# [P,C] :permutation -> [permuted card of card 0, ...]
+		cards = np.arange(CC)
+		ranks, suits = cards // SC, cards % SC
+		self.card_permutations = ranks.reshape([1,-1]) * SC + self.suit_permutations[ : , suits ]
+		# [P,I] :permutation -> [permuted hand of hand 0, ...]
+		permuted_cards = np.sort(self.card_permutations[ : , card_tools.hand_to_cards ], axis=2) # [P,I,2]
+		self.hand_permutations = card_tools.get_hand_index(permuted_cards)
+		# the identity permutation (first permutation of itertools.permutations)
+		self.identity = 0
+
+
+	def _boards_to_keys(self, boards):
+		''' Converts sorted boards to integers, that preserve lexicographic order
+		@param: [...,k] :sorted boards
+		@return [...]   :keys of boards
+		'''
+		CC = constants.card_count
+		keys = np.zeros(boards.shape[:-1], dtype=np.int64)
+		for i in range(boards.shape[-1]):
+			keys = keys * CC + boards[...,i]
+		return keys
+
+
+	def get_canonical_boards(self, boards):
+		''' Gives canonical representatives for a batch of boards
+		@param: [B,k] :boards (k cards on each board)
+		@return [B,k] :canonical boards (sorted)
+		@return [B]   :indexes of suit permutations that transform boards to canonical boards
+		'''
+		boards = np.asarray(boards).astype(np.int64)
+		if boards.shape[1] == 0:
+			return boards.copy(), np.full([boards.shape[0]], self.identity, dtype=np.int64)
+		# [P,B,k] all permuted boards
+		permuted_boards = np.sort(self.card_permutations[ : , boards ], axis=2)
+		keys = self._boards_to_keys(permuted_boards) # [P,B]
+		permutations = np.argmin(keys, axis=0) # [B]
+		canonical_boards = permuted_boards[ permutations, np.arange(boards.shape[0]) ]
+		return canonical_boards, permutations
+
+
+	def get_canonical_board(self, board):
+		''' Gives canonical representative of the board
+		@param: [0-5] :vector of board cards (int)
+		@return [0-5] :canonical board (sorted)
+		@return int   :index of suit permutation that transforms board to canonical board
+		'''
+		if board.ndim == 0 or board.shape[0] == 0:
+			return np.zeros([], dtype=arguments.int_dtype), self.identity
+		canonical_boards, permutations = self.get_canonical_boards(board.reshape([1,-1]))
+		return canonical_boards[0].astype(arguments.int_dtype), int(permutations[0])
+
+
+	def _get_unique_canonical_boards(self, boards, key):
+		''' Groups boards by their canonical boards (memoized by key)
+		@param: [B,k] :boards
+		@param: tuple :key of memoized result
+		@return [U,k] :unique canonical boards (sorted)
+		@return [B]   :index of canonical board (in unique canonical boards) of every board
+		@return [B]   :indexes of suit permutations that transform boards to canonical boards
+		'''
+		if key in self._boards_cache:
+			return self._boards_cache[key]
+		canonical_boards, permutations = self.get_canonical_boards(boards)
+		keys = self._boards_to_keys(canonical_boards)
+		_, unique_idxs, canonical_idxs = np.unique(keys, return_index=True, return_inverse=True)
+		out = ( canonical_boards[unique_idxs].astype(arguments.int_dtype), canonical_idxs.reshape([-1]), permutations )
+		# results are shared between all callers
+		for a in out:
+			a.setflags(write=False)
+		if len(self._boards_cache) >= self._boards_cache_size:
+			self._boards_cache.pop(next(iter(self._boards_cache)))
+		self._boards_cache[key] = out
+		return out
+
+
+	def get_next_round_canonical_boards(self, board):
+		''' Canonical variant of card_tools.get_next_round_boards (memoized for every board)
+		@param: [0-5] :vector of board cards (int)
+		@return [U,k] :unique canonical boards of all next round boards
+		@return [B]   :index of canonical board of every next round board
+		@return [B]   :indexes of suit permutations that transform next round boards to canonical boards
+		'''
+		next_boards = card_tools.get_next_round_boards(board)
+		return self._get_unique_canonical_boards(next_boards, ('next',) + self.get_board_key(board))
+
+
+	def get_last_round_canonical_boards(self, board):
+		''' Canonical variant of card_tools.get_last_round_boards (memoized for every board)
+		@param: [0-5] :vector of board cards (int)
+		@return [U,5] :unique canonical boards of all last round boards
+		@return [B]   :index of canonical board of every last round board
+		@return [B]   :indexes of suit permutations that transform last round boards to canonical boards
+		'''
+		last_boards = card_tools.get_last_round_boards(board)
+		return self._get_unique_canonical_boards(last_boards, ('last',) + self.get_board_key(board))
+
+
+	def get_board_key(self, board):
+		''' Gives hashable key of the board (without canonicalization)
+		@param: [0-5] :vector of board cards (int)
+		@return tuple :board as tuple of cards
+		'''
+		return tuple(int(card) for card in board.reshape([-1])) if board.ndim > 0 else ()
+
+
+	def get_canonical_key(self, board):
+		''' Gives the same hashable key for all isomorphic boards
+		@param: [0-5] :vector of board cards (int)
+		@return tuple :canonical board as tuple of cards
+		'''
+		canonical_board, _ = self.get_canonical_board(board)
+		return tuple(int(card) for card in canonical_board.reshape([-1]))
+
+
+	def permute_cards(self, cards, permutation):
+		''' Applies suit permutation to cards
+		@param: [...] :cards
+		@param: int   :index of suit permutation
+		@return [...] :permuted cards
+		'''
+		return self.card_permutations[ permutation, cards ]
+
+
+	def to_canonical_hands(self, values, permutation, axis=-1):
+		''' Remaps vectors over hands from the board to its canonical board
+			(hand `h` on the board becomes hand `permute(h)` on the canonical board)
+		@param: [...,I,...] :ranges/values for each hand (for the board)
+		@param: int         :index of suit permutation (from self.get_canonical_board)
+		@param: int         :axis of hands
+		@return [...,I,...] :ranges/values for each hand (for the canonical board)
+		'''
+		inverse = self.inverse_permutations[permutation]
+		return np.take(values, self.hand_permutations[inverse], axis=axis)
+
+
+	def from_canonical_hands(self, values, permutation, axis=-1):
+		''' Remaps vectors over hands from the canonical board back to the board
+			(inverse of self.to_canonical_hands)
+		@param: [...,I,...] :ranges/values for each hand (for the canonical board)
+		@param: int         :index of suit permutation (from self.get_canonical_board)
+		@param: int         :axis of hands
+		@return [...,I,...] :ranges/values for each hand (for the board)
+		'''
+		return np.take(values, self.hand_permutations[permutation], axis=axis)
+
+
+	def to_canonical_matrix(self, matrix, permutation):
+		''' Remaps [I,I] matrix (ex: equity matrix) from the board to its canonical board
+		@param: [I,I] :matrix for the board
+		@param: int   :index of suit permutation (from self.get_canonical_board)
+		@return [I,I] :matrix for the canonical board
+		'''
+		return self.from_canonical_matrix(matrix, self.inverse_permutations[permutation])
+
+
+	def from_canonical_matrix(self, matrix, permutation):
+		''' Remaps [I,I] matrix (ex: equity matrix) from the canonical board back to the board
+		@param: [I,I] :matrix for the canonical board
+		@param: int   :index of suit permutation (from self.get_canonical_board)
+		@return [I,I] :matrix for the board
+		'''
+		hands = self.hand_permutations[permutation]
+		return matrix[ hands.reshape([-1,1]), hands.reshape([1,-1]) ]
+
+
+
+
+suit_isomorphism = SuitIsomorphism()
@@ -12,51 +12,61 @@ from Game.card_tools import card_tools
 class CFRDGadget():
 	def __init__(self, board, opponent_cfvs):
 		''' Constructor
-		@param: [0-5] :vector of board cards (int)
-		@param: [I]   :initial opponent counterfactual values vector used for re-solving
+		@param: [0-5]   :vector of board cards (int)
+				[b,0-5] :or board of every batch entry (board-batched lookahead)
+		@param: [b,I]   :initial opponent counterfactual values of every batch entry used for re-solving
+				[I]     :or vector of initial opponent counterfactual values
 		'''
-		HC = constants.hand_count
+		# shape of values for one action: [b,I] or [I]
+		shape = list(opponent_cfvs.shape)
 		# init variables for this state
-		self.cfvs = np.zeros([2,HC], dtype=arguments.dtype)
-		self.regrets = np.zeros([2,HC], dtype=arguments.dtype)
-		self.strategy = np.zeros([2,HC], dtype=arguments.dtype)
+		self.cfvs = np.zeros([2] + shape, dtype=arguments.dtype)
+		self.regrets = np.zeros([2] + shape, dtype=arguments.dtype)
+		self.strategy = np.zeros([2] + shape, dtype=arguments.dtype)
+		# work buffers (reused in every iteration)
+		self.total_cfvs = np.zeros(shape, dtype=arguments.dtype)
+		self.regrets_sum = np.zeros([1] + shape, dtype=arguments.dtype)
 		# 2 possible actions are: Terminal (fold action), Follow (continue playing)
 		self.F, self.T = 0, 1 # first dimension indexes of previously defined variables
 		# store initial cfvs (used to get terminal values)
-		self.cfvs[self.T] = opponent_cfvs.copy()
-		self.strategy[self.T] = np.ones([HC], dtype=arguments.dtype)
+		self.cfvs[self.T] = opponent_cfvs
+		self.strategy[self.T] = 1
 		# init range/strategy mask for masking out impossible hands
-		self.mask = card_tools.get_possible_hands_mask(board) # [I]
+		if board.ndim == 2:
+			self.mask = card_tools.get_possible_hands_masks(board) # [b,I]
+		else:
+			self.mask = card_tools.get_possible_hands_mask(board) # [I]
 
 
 	def compute_opponent_range(self, current_opponent_cfvs):
 		''' Uses one iteration of the gadget game to generate an opponent
 			range for the current re-solving iteration.
-		@param: [I] :vector of cfvs that the opponent receives with the current strategy in the re-solve game
-		@return [I] :opponent range vector for this iteration
+		@param: [b,I] :cfvs that the opponent receives with the current strategy in the re-solve game ([I] without batch)
+		@return [b,I] :opponent range of every batch entry for this iteration ([I] without batch)
 		'''
-		HC = constants.hand_count
 		# store cfvs, got from solving sub-game (if we continue playing)
 		self.cfvs[self.F] = current_opponent_cfvs
 		# conpute total possible values (depends on current strategy)
-		# [I] = sum([2,I] * [2,I], axis=0)
-		total_cfvs = np.sum(self.cfvs * self.strategy, axis=0)
+		# [b,I] = sum([2,b,I] * [2,b,I], axis=0)
+		np.multiply(self.cfvs[self.F], self.strategy[self.F], out=self.total_cfvs)
+		self.total_cfvs += self.cfvs[self.T] * self.strategy[self.T]
 		# add current regrets (for both actions) to cumulative regrets:
-		# broadcasting total_cfvs: [I] -> [2,I]
-		# [2,I] = [2,I] - [I]
-		self.regrets += self.cfvs - total_cfvs
+		# broadcasting total_cfvs: [b,I] -> [2,b,I]
+		# [2,b,I] += [2,b,I] - [b,I]
+		self.regrets += self.cfvs
+		self.regrets -= self.total_cfvs
 		# use cfr+
-		self.regrets = np.clip(self.regrets, constants.regret_epsilon, constants.max_number)
+		np.clip(self.regrets, constants.regret_epsilon, constants.max_number, out=self.regrets)
 		# use regret matching to compute strategies for both actions
-		# broadcasting sum(regrets): [I] -> [2,I]
-		# [2,I] = [2,I] / [I]
-		self.strategy = self.regrets / np.sum(self.regrets)
-		# compute and add current regrets to cumulative regrets: self.play_regrets and self.terminate_regrets
-		# [I] = [I] * [I] + [I] * [I]
+		# (every hand of every batch entry chooses between actions separately)
+		# broadcasting sum(regrets): [1,b,I] -> [2,b,I]
+		# [2,b,I] = [2,b,I] / [1,b,I]
+		np.sum(self.regrets, axis=0, keepdims=True, out=self.regrets_sum)
+		np.divide(self.regrets, self.regrets_sum, out=self.strategy)
 		# for poker, the range size is larger than the allowed hands, so we need
 		# to make sure reconstruction does not choose a range that is not allowed
-		# broadcasting mask: [I] -> [2,I]
-		# [2,I] *= [I]
+		# broadcasting mask: [b,I] or [I] -> [2,b,I]
+		# [2,b,I] *= [b,I]
 		self.strategy *= self.mask
 		# return strategy of Follow (continue playing) action
 		# here range = strategy, thats why we can return strategy
@@ -10,9 +10,11 @@
 		* P - number of players (here 2)
 		* I - number of infosets (here it is number of possible hands 52*51/2=1326)
 '''
+import os
 import time
 import numpy as np
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
 
 from Lookahead.lookahead_builder import LookaheadBuilder
 from TerminalEquity.terminal_equity import TerminalEquity
@@ -21,20 +23,100 @@ from Settings.arguments import arguments
 from Settings.constants import constants
 from helper_classes import LookaheadResults
 
+# thread pools of lookahead iterations {(process id, number of threads): ThreadPoolExecutor}
+THREAD_POOLS = {}
+
+def get_thread_pool():
+	''' Gives thread pool used by lookahead iterations (see arguments.lookahead_num_threads).
+		Pool is created lazily for each process (pools are not inherited by forked processes)
+	@return ThreadPoolExecutor :thread pool (None if iterations are single-threaded)
+	'''
+	num_threads = arguments.lookahead_num_threads
+	if num_threads <= 1:
+		return None
+	key = (os.getpid(), num_threads)
+	if key not in THREAD_POOLS:
+		THREAD_POOLS[key] = ThreadPoolExecutor(max_workers=num_threads)
+	return THREAD_POOLS[key]
+
+# worker threads of neural network evaluation {process id: ThreadPoolExecutor}
+NN_WORKERS = {}
+
+def get_nn_worker():
+	''' Gives worker thread, that evaluates neural network in lookahead iterations
+		(see arguments.nn_evaluation_mode). Worker is created lazily for each process
+	@return ThreadPoolExecutor :worker thread
+	'''
+	key = os.getpid()
+	if key not in NN_WORKERS:
+		NN_WORKERS[key] = ThreadPoolExecutor(max_workers=1)
+	return NN_WORKERS[key]
+
+
 class Lookahead():
 	def __init__(self, tree, terminal_equity, batch_size):
 		'''
 		@param: Node           :root node of tree
 		@param: TerminalEquity :object that evaluates rewards with specified board
+				[TerminalEquity,...] :or terminal equity of every batch entry (entries can have
+								 different boards on the same street, see self._set_terminal_equity)
 		@param: int            :batch of how many situations are evaluated simultaneously (usually will be = 1)
 		'''
 		self.builder = LookaheadBuilder(self)
-		self.terminal_equity = terminal_equity
 		self.batch_size = batch_size
+		self._set_terminal_equity(terminal_equity)
+		self.thread_pool = get_thread_pool()
+		# evaluation of neural network, that runs in worker thread and its last
+		# finished values ('async' and 'stale' modes, see arguments.nn_evaluation_mode)
+		self.approximation_future, self.stale_cfvs = None, None
+		# number of done iterations, number of iterations in averages and last measured gap (see self._compute)
+		self.num_iters, self.num_avg_iters, self.gap = 0, 0, None
 		# build lookahead
 		self.builder.build_from_tree(tree)
 
 
+	def reuse(self, tree, terminal_equity):
+		''' Prepares built lookahead for a tree with the same structure (see LookaheadPool),
+			only pot sizes, masks and state are reset, tensors and plans are kept
+		@param: Node           :root node of tree
+		@param: TerminalEquity :object that evaluates rewards with specified board (or list, see self.__init__)
+		'''
+		self._set_terminal_equity(terminal_equity)
+		self.approximation_future, self.stale_cfvs = None, None
+		self.builder.reset_from_tree(tree)
+
+
+	def _set_terminal_equity(self, terminal_equity):
+		''' Sets terminal equity. With list of terminal equities (board-batched lookahead),
+			every batch entry uses its own board for terminal values and neural network inputs,
+			betting tree (and pot sizes) is shared. Consecutive entries, that share the same
+			terminal equity object, are evaluated together
+		@param: TerminalEquity :object that evaluates rewards with specified board (or list, see self.__init__)
+		'''
+		self.terminal_equity = terminal_equity
+		self.board_batched = isinstance(terminal_equity, list)
+		if self.board_batched:
+			assert(len(terminal_equity) == self.batch_size)
+			# [(TerminalEquity, first entry, last entry + 1),...]
+			self.terminal_equity_groups = []
+			for entry, entry_terminal_equity in enumerate(terminal_equity):
+				if self.terminal_equity_groups and self.terminal_equity_groups[-1][0] is entry_terminal_equity:
+					self.terminal_equity_groups[-1][2] = entry + 1
+				else:
+					self.terminal_equity_groups.append([entry_terminal_equity, entry, entry + 1])
+
+
+	def get_nbytes(self):
+		''' Gives number of bytes of all arrays owned by lookahead and its layers
+		(views are counted only once, in the array they are taken from)
+		@return int :number of bytes
+		'''
+		nbytes = 0
+		for obj in [self] + self.layers:
+			nbytes += sum([ a.nbytes for a in vars(obj).values() if isinstance(a, np.ndarray) and a.base is None ])
+		return nbytes
+
+
 	def get_results(self, reconstruct_opponent_cfvs):
 		''' Gets the results of re-solving the lookahead
 		@return LookaheadResults :results of solving lookahead
@@ -53,6 +135,9 @@ class Lookahead():
 			print('WARNING: THERE ARE NO NODES THAT NEEDS APPROXIMATION (lookahead.cfvs_approximator is not defined)')
 		# save actions
 		out.actions = self.tree.actions
+		# convergence of re-solving
+		out.num_iters = self.num_iters
+		out.gap = self.gap
 		# lookahead already computes the averate strategy we just convert the dimensions
 		# reshape: [A{0}, 1, 1, b, I] -> [A{0}, b, I]
 		out.strategy = self.layers[1].strategies_avg.reshape([-1,batch_size,HC]).copy()
@@ -72,7 +157,7 @@ class Lookahead():
 			out.root_cfvs_both_players[ : , P1 , : ] = first_layer_avg_cfvs[ : , P2 , : ].copy()
 		# children CFVs
 		# slicing and reshaping: [A{0}, 1, 1, b, P, I] -> [A{0}, b, I]
-		out.children_cfvs = self.layers[1].cfvs_avg[ : , : , : , : , P1 , : ].reshape([-1,batch_size,HC])
+		out.children_cfvs = self.layers[1].cfvs_avg[ : , : , : , : , P1 , : ].reshape([-1,batch_size,HC]).copy()
 		# IMPORTANT divide average CFVs by average strategy in here
 		# reshape: [A{0}, 1, 1, b, I] -> [A{0}, b, I]
 		strategy = self.layers[1].strategies_avg.reshape([-1,batch_size,HC])
@@ -82,18 +167,20 @@ class Lookahead():
 		# [A{0}, b, 1] = sum([A{0}, b, I])
 		scaler = np.sum(strategy * range_mul, axis=2, keepdims=True)
 		# [A{0}, b, 1] *= scalar
-		scaler *= arguments.cfr_iters - arguments.cfr_skip_iters
+		scaler *= self.num_avg_iters
 		# broadcasting scaler: [A{0}, b, 1] -> [A{0}, b, I]
 		# [A{0}, b, I] /= [A{0}, b, 1]
 		out.children_cfvs /= scaler
 		return out
 
 
-	def resolve(self, player_range, opponent_range=None, opponent_cfvs=None):
+	def resolve(self, player_range, opponent_range=None, opponent_cfvs=None, time_budget=None, target_gap=None):
 		''' Creates lookahead and solves it
 		@param: [I] :current player's range
 		@param: [I] :opponent's range
-		@param: [I] :opponent's cfvs (used to reconstruct opponent's range)
+		@param: [b,I] :opponent's cfvs (used to reconstruct opponent's range)
+		@param: float :(optional) max time of re-solving in seconds (see self._compute)
+		@param: float :(optional) target gap, re-solving stops when it is reached (see self._compute_gap)
 		(only one of `opponent_range` and `opponent_cfvs` should be used)
 		'''
 		P1, P2 = constants.players.P1, constants.players.P2
@@ -101,74 +188,130 @@ class Lookahead():
 		self.layers[0].ranges[ 0 , 0 , 0 , : , P1 , : ] = player_range.copy()
 		if opponent_cfvs is None:
 			self.layers[0].ranges[ 0 , 0 , 0 , : , P2 , : ] = opponent_range.copy()
-			self._compute(reconstruct_opponent_cfvs=False)
+			self._compute(reconstruct_opponent_cfvs=False, time_budget=time_budget, target_gap=target_gap)
 		else: # opponent_range is None:
-			self.reconstruction_gadget = CFRDGadget(self.tree.board, opponent_cfvs)
-			self._compute(reconstruct_opponent_cfvs=True)
-
-
-	def _compute(self, reconstruct_opponent_cfvs):
-		''' Re-solves the lookahead '''
+			# gadget masks hands with board of the tree (or with board of every batch entry)
+			if self.board_batched:
+				board = np.stack([ terminal_equity.board for terminal_equity in self.terminal_equity ]) # [b, 0-5]
+			else:
+				board = self.tree.board
+			# [b, I] = [b, I] or [I]
+			self.reconstruction_gadget = CFRDGadget(board, opponent_cfvs.reshape([self.batch_size, -1]))
+			self._compute(reconstruct_opponent_cfvs=True, time_budget=time_budget, target_gap=target_gap)
+
+
+	def _compute(self, reconstruct_opponent_cfvs, time_budget=None, target_gap=None):
+		''' Re-solves the lookahead. Runs `arguments.cfr_iters` iterations or stops earlier,
+			when next iteration would not fit into time budget or when target gap is reached.
+			Gap is measured every `arguments.resolve_check_iters` averaged iterations.
+			Time budget is checked after every iteration (also during `arguments.cfr_skip_iters`),
+			when it runs out before averaging started, the last iteration is used as the average
+		@param: bool  :opponent's range is reconstructed from his cfvs
+		@param: float :(optional) max time of re-solving in seconds
+		@param: float :(optional) target gap (see self._compute_gap)
+		'''
+		self.stale_cfvs = None
+		self.num_iters, self.num_avg_iters, self.gap = 0, 0, None
+		prev_avg_cfvs = None
+		t0 = time.time()
 		for iter in tqdm(range(arguments.cfr_iters)):
-			if reconstruct_opponent_cfvs:
-				self._set_opponent_starting_range()
-			self._compute_current_strategies()
-			self._compute_ranges()
-			if iter > arguments.cfr_skip_iters:
-				self._compute_update_average_strategies()
-			self._compute_cfvs()
-			self._compute_expected_cfvs()
-			self._compute_regrets()
-			if iter > arguments.cfr_skip_iters:
-				self._compute_cumulate_average_cfvs()
+			self._compute_iteration(iter, reconstruct_opponent_cfvs)
+			self.num_iters = iter + 1
+			if self.num_avg_iters > 0 and self.num_avg_iters % arguments.resolve_check_iters == 0:
+				# [ 1, 1, 1, b, P, I] = [ 1, 1, 1, b, P, I] / scalar
+				avg_cfvs = self.layers[0].cfvs_avg / self.num_avg_iters
+				if prev_avg_cfvs is not None:
+					self.gap = self._compute_gap(prev_avg_cfvs, avg_cfvs)
+				prev_avg_cfvs = avg_cfvs
+				if target_gap is not None and self.gap is not None and self.gap <= target_gap:
+					break
+			# expect, that next iteration takes average time of iteration
+			elapsed = time.time() - t0
+			if time_budget is not None and elapsed + elapsed / self.num_iters > time_budget:
+				if self.num_avg_iters == 0:
+					# averages (normalized by number of averaged iterations) are strategy and cfvs of the last iteration
+					self._compute_update_average_strategies()
+					self._compute_cumulate_average_cfvs()
+				break
+		# wait for evaluation of neural network, that is still running (values of last iteration are not used,
+		# but evaluation is finished, so neural network stores cfvs of all iterations)
+		self._wait_for_approximated_cfvs()
 		# at the end normalize average strategy
 		self._compute_normalize_average_strategies()
 		# normalize root's CFVs
 		self._compute_normalize_average_cfvs()
 
 
-	def _compute_current_strategies(self):
-		''' Uses regret matching to generate the players' current strategies '''
+	def _compute_iteration(self, iter, reconstruct_opponent_cfvs):
+		''' Runs one cfr iteration. Iteration works only with memory
+			preallocated by LookaheadBuilder._construct_work_buffers
+		@param: int  :number of the iteration
+		@param: bool :opponent's range is reconstructed from his cfvs
+		'''
+		if reconstruct_opponent_cfvs:
+			self._set_opponent_starting_range()
+		self._run_on_hands(self._compute_current_strategies)
+		self._run_on_hands(self._compute_ranges)
+		if iter > arguments.cfr_skip_iters:
+			self._compute_update_average_strategies()
+		self._compute_cfvs()
+		self._run_on_hands(self._compute_expected_cfvs)
+		self._run_on_hands(self._compute_regrets)
+		if iter > arguments.cfr_skip_iters:
+			self._compute_cumulate_average_cfvs()
+
+
+	def _run_on_hands(self, function):
+		''' Runs element-wise computation on all hands. With thread pool, hand axis
+			is split into chunks (see LookaheadBuilder._construct_work_buffers),
+			that are computed concurrently (numpy releases GIL in element-wise operations)
+		@param: function :function, that takes slice of hand axis
+		'''
+		if self.thread_pool is None:
+			function(slice(None))
+		else:
+			futures = [ self.thread_pool.submit(function, hands) for hands in self.hand_chunks ]
+			for future in futures:
+				future.result()
+
+
+	def _compute_current_strategies(self, hands=slice(None)):
+		''' Uses regret matching to generate the players' current strategies
+		@param: slice :hands, that are computed (hands are independent)
+		'''
 		for d in range(1,self.depth):
 			layer = self.layers[d]
+			# positive regrets are computed directly into current strategy
 			# [A{d-1}, B{d-2}, NTNAN{d-2}, b, I] = [A{d-1}, B{d-2}, NTNAN{d-2}, b, I]
-			positive_regrets = np.clip(layer.regrets, constants.regret_epsilon, constants.max_number)
+			positive_regrets = np.clip(layer.regrets[ ..., hands ], constants.regret_epsilon, constants.max_number, out=layer.current_strategy[ ..., hands ])
 			# 1.0 set regret of empty actions to 0
-			# [A{d-1}, B{d-2}, NTNAN{d-2}, b, I] *= [A{d-1}, B{d-2}, NTNAN{d-2}, b, I]
+			# broadcasting mask: [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1] -> [A{d-1}, B{d-2}, NTNAN{d-2}, b, I]
+			# [A{d-1}, B{d-2}, NTNAN{d-2}, b, I] *= [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1]
 			positive_regrets *= layer.empty_action_mask
 			# 1.1  regret matching
 			# note that the regrets as well as the CFVs have switched player indexing
 			# [ 1, B{d-2}, NTNAN{d-2}, b, I] = [A{d-1}, B{d-2}, NTNAN{d-2}, b, I]
-			regrets_sum = np.sum(positive_regrets, axis=0, keepdims=True)
+			regrets_sum = np.sum(positive_regrets, axis=0, keepdims=True, out=layer.regrets_sum[ ..., hands ])
 			# broadcasting regrets_sum: [ 1, B{d-2}, NTNAN{d-2}, b, I] -> [A{d-1}, B{d-2}, NTNAN{d-2}, b, I]
-			# [ A{d-1}, B{d-2}, NTNAN{d-2}, b, I] = [A{d-1}, B{d-2}, NTNAN{d-2}, b, I] / [A{d-1}, B{d-2}, NTNAN{d-2}, b, I]
-			layer.current_strategy = positive_regrets / regrets_sum
+			# [ A{d-1}, B{d-2}, NTNAN{d-2}, b, I] /= [A{d-1}, B{d-2}, NTNAN{d-2}, b, I]
+			positive_regrets /= regrets_sum
 
 
-	def _compute_ranges(self):
+	def _compute_ranges(self, hands=slice(None)):
 		''' Using the players' current strategies, computes their
 			probabilities of reaching each state of the lookahead.
+		@param: slice :hands, that are computed (hands are independent)
 		'''
-		PC, HC, batch_size = constants.players_count, constants.hand_count, self.batch_size
 		for d in range(0, self.depth-1):
-			next_layer, layer, parent, grandparent = self.layers[d+1], self.layers[d], self.layers[d-1], self.layers[d-2]
-			p_num_terminal_actions = parent.num_terminal_actions if d > 0 else 0
-			p_num_bets = parent.num_bets if d > 0 else 1
-			gp_num_nonallin_bets = grandparent.num_nonallin_bets if d > 1 else 1
-			gp_num_terminal_actions = grandparent.num_terminal_actions if d > 1 else 0
-			# copy the ranges of inner nodes and transpose (np.transpose - swaps axis: 1dim <-> 2 dim)
-			# array slicing: [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] -> [B{d-1}, NAB{d-2}, NTNAN{d-2}, b, P, I]
-			# [B{d-1}, NTNAN{d-2}, NAB{d-2}, b, P, I] = [B{d-1}, NAB{d-2}, NTNAN{d-2}, b, P, I]
-			next_layer_ranges = np.transpose(layer.ranges[ p_num_terminal_actions: , :gp_num_nonallin_bets , : , : , : , : ], [0,2,1,3,4,5])
-			# [ 1, B{d-1}, NTNAN{d-2} x NAB{d-2}, b, P, I] = [B{d-1}, NTNAN{d-2}, NAB{d-2}, b, P, I]
-			# [ 1, B{d-1}, NTNAN{d-2} x NAB{d-2}, b, P, I] is the same as [ 1, B{d-1}, NTNAN{d-1}, b, P, I]
-			next_layer_ranges = next_layer_ranges.reshape([1, p_num_bets, -1, batch_size, PC, HC])
-			# repeat next_layer_ranges: [ 1, B{d-1}, NTNAN{d-1}, b, P, I] -> [A{d}, B{d-1}, NTNAN{d-1}, b, P, I]
-			# [A{d}, B{d-1}, NTNAN{d-1}, b, P, I] = [A{d}, B{d-1}, NTNAN{d-1}, b, P, I]
-			next_layer.ranges = np.repeat(next_layer_ranges, next_layer.ranges.shape[0], axis=0)
+			next_layer, layer = self.layers[d+1], self.layers[d]
+			# copy the ranges of inner nodes into all their children (views are created in LookaheadBuilder._construct_work_buffers)
+			# broadcasting source: [ 1, B{d-1}, NTNAN{d-2}, NAB{d-2}, b, P, I] -> [A{d}, B{d-1}, NTNAN{d-2}, NAB{d-2}, b, P, I]
+			# [A{d}, B{d-1}, NTNAN{d-2}, NAB{d-2}, b, P, I] is the same as [A{d}, B{d-1}, NTNAN{d-1}, b, P, I]
+			source, destination = layer.next_ranges_plan
+			np.copyto(destination[ ..., hands ], source[ ..., hands ])
 			# multiply the ranges of the acting player by his strategy
 			# [ A{d}, B{d-1}, NTNAN{d-1}, b, P, I] *= [ A{d}, B{d-1}, NTNAN{d-1}, b, I]
-			next_layer.ranges[ : , : , : , : , layer.acting_player, : ] *= next_layer.current_strategy
+			next_layer.ranges[ : , : , : , : , layer.acting_player, hands ] *= next_layer.current_strategy[ ..., hands ]
 
 
 	def _compute_update_average_strategies(self):
@@ -179,43 +322,35 @@ class Lookahead():
 		self.layers[1].strategies_avg += self.layers[1].current_strategy
 
 
-	def _compute_expected_cfvs(self):
+	def _compute_expected_cfvs(self, hands=slice(None)):
 		''' Using the players' reach probabilities and terminal counterfactual
 			values, computes their cfvs at all states of the lookahead.
+		@param: slice :hands, that are computed (hands are independent)
 		'''
-		PC, HC, batch_size = constants.players_count, constants.hand_count, self.batch_size
 		for d in range(self.depth-1, 0, -1):
-			layer, parent = self.layers[d], self.layers[d-1]
-			num_gp_terminal_actions = self.layers[d-2].num_terminal_actions if d > 1 else 0
-			num_ggp_nonallin_bets = self.layers[d-3].num_nonallin_bets if d > 2 else 1
-			num_ggp_nonterminal_nonallin_nodes = self.layers[d-3].num_nonterminal_nonallin_nodes if d > 2 else 1
-			num_ggp_nonallin_bets = self.layers[d-3].num_nonallin_bets if d > 2 else 1
-			# expand_dims on mask: [A{d-1}, B{d-2}, NTNAN{d-2}, b, I] -> [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1, I]
-			# broadcasting mask: [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1, I] -> [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I]
-			# [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] *= [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1, I]
-			layer.cfvs *= np.expand_dims(layer.empty_action_mask, axis=4)
-			# save acting_player cfvs and use layer.cfvs as placeholder
-			# player indexing is swapped for cfvs
-			# slicing: [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] -> [A{d-1}, B{d-2}, NTNAN{d-2}, b, I]
-			acting_player_cfvs = layer.cfvs[ : , : , : , : , layer.acting_player, : ].copy()
-			# [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] *= [A{d-1}, B{d-2}, NTNAN{d-2}, b, I]
-			layer.cfvs[ : , : , : , : , layer.acting_player, : ] *= layer.current_strategy
-			# [ 1, B{d-2}, NTNAN{d-2}, b, P, I] = [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I]
-			expected_cfvs = np.sum(layer.cfvs, axis=0, keepdims=True)
-			# leave cfvs the same as it was before
-			layer.cfvs[ : , : , : , : , layer.acting_player, : ] = acting_player_cfvs
-			# change dimensions
-			num_gp_bets = expected_cfvs.shape[1]
+			layer = self.layers[d]
+			acting_player, other_player = layer.acting_player, 1 - layer.acting_player
+			# expand_dims on mask: [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1] -> [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1, 1]
+			# broadcasting mask: [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1, 1] -> [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I]
+			# [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] *= [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1, 1]
+			layer.cfvs[ ..., hands ] *= np.expand_dims(layer.empty_action_mask, axis=4)
+			# acting player's cfvs weighted by his strategy (player indexing is swapped for cfvs)
+			# [A{d-1}, B{d-2}, NTNAN{d-2}, b, I] = [A{d-1}, B{d-2}, NTNAN{d-2}, b, I] * [A{d-1}, B{d-2}, NTNAN{d-2}, b, I]
+			work = np.multiply(layer.cfvs[ : , : , : , : , acting_player, hands ], layer.current_strategy[ ..., hands ], out=layer.work[ ..., hands ])
+			# [ 1, B{d-2}, NTNAN{d-2}, b, I] = [A{d-1}, B{d-2}, NTNAN{d-2}, b, I]
+			np.sum(work, axis=0, keepdims=True, out=layer.expected_cfvs[ : , : , : , : , acting_player, hands ])
+			np.sum(layer.cfvs[ : , : , : , : , other_player, hands ], axis=0, keepdims=True, out=layer.expected_cfvs[ : , : , : , : , other_player, hands ])
 			# note: NTNAN{d-3} x NAB{d-3} = NTNAN{d-2}
-			# reshape: [ 1, B{d-2}, NTNAN{d-2}, b, P, I] -> [B{d-2}, NTNAN{d-3}, NAB{d-3}, b, P, I]
-			expected_cfvs = expected_cfvs.reshape([num_gp_bets, num_ggp_nonterminal_nonallin_nodes, num_ggp_nonallin_bets, batch_size, PC, HC])
-			parent.cfvs[ num_gp_terminal_actions: , :num_ggp_nonallin_bets , : , : , : , : ] = np.transpose(expected_cfvs, [0,2,1,3,4,5])
+			# [B{d-2}, NAB{d-3}, NTNAN{d-3}, b, P, I] = transpose([B{d-2}, NTNAN{d-3}, NAB{d-3}, b, P, I])
+			source, destination = layer.expected_cfvs_plan
+			np.copyto(destination[ ..., hands ], source[ ..., hands ])
 
 
 	def _compute_cumulate_average_cfvs(self):
 		''' Updates the players' average counterfactual values with their
 			cfvs from the current iteration.
 		'''
+		self.num_avg_iters += 1
 		# [ 1, 1, 1, b, I] += [ 1, 1, 1, b, I]
 		self.layers[0].cfvs_avg += self.layers[0].cfvs
 		# [ A{0}, 1, 1, b, I] += [ A{0}, 1, 1, b, I]
@@ -245,31 +380,43 @@ class Lookahead():
 			un-normalized average cfvs, which are simpler to compute.
 		'''
 		# [ 1, 1, 1, b, P, I] /= scalar
-		self.layers[0].cfvs_avg /= (arguments.cfr_iters - arguments.cfr_skip_iters)
+		self.layers[0].cfvs_avg /= self.num_avg_iters
 
 
-	def _compute_regrets(self):
+	def _compute_gap(self, prev_avg_cfvs, avg_cfvs):
+		''' Computes gap: max change of average root cfvs between two checks,
+			relative to the largest average cfv (of the same batch entry and player).
+			It is cheap convergence signal (root cfvs of converged strategies do not change)
+		@param: [ 1, 1, 1, b, P, I] :average root cfvs of previous check
+		@param: [ 1, 1, 1, b, P, I] :average root cfvs of this check
+		@return float :gap
+		'''
+		# [ 1, 1, 1, b, P, 1] = max([ 1, 1, 1, b, P, I])
+		change = np.max(np.abs(avg_cfvs - prev_avg_cfvs), axis=-1, keepdims=True)
+		scale = np.max(np.abs(avg_cfvs), axis=-1, keepdims=True)
+		# remove division by 0 (entries without values)
+		scale[ scale == 0 ] = 1
+		return float(np.max(change / scale))
+
+
+	def _compute_regrets(self, hands=slice(None)):
 		''' Using the players' counterfactual values, updates their
 			total regrets for every state in the lookahead.
+		@param: slice :hands, that are computed (hands are independent)
 		'''
-		HC, batch_size = constants.hand_count, self.batch_size
 		for d in range(self.depth-1, 0, -1):
-			layer, parent = self.layers[d], self.layers[d-1] # current layer, parent layer
-			gp_num_terminal_actions = self.layers[d-2].num_terminal_actions if d > 1 else 0
-			gp_num_bets = self.layers[d-2].num_bets if d > 1 else 1
-			ggp_num_nonallin_bets = self.layers[d-3].num_nonallin_bets if d > 2 else 1
-			# slicing: [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] -> [A{d-1}, B{d-2}, NTNAN{d-2}, b, I]
-			current_cfvs = layer.cfvs[ : , : , : , : , layer.acting_player, : ]
-			# slicing: [A{d-2}, B{d-3}, NTNAN{d-3}, b, P, I] -> [B{d-2}, NAB{d-3}, NTNAN{d-3}, b, I]
-			# transpose: [B{d-2}, NAB{d-3}, NTNAN{d-3}, b, I] -> [B{d-2}, NTNAN{d-3}, NAB{d-3}, b, I]
-			expected_cfvs = np.transpose(parent.cfvs[ gp_num_terminal_actions: , :ggp_num_nonallin_bets, : , : , layer.acting_player, : ], [0,2,1,3,4])
-			# reshape: [B{d-2}, NTNAN{d-3}, NAB{d-3}, b, I] -> [ 1, B{d-2}, NTNAN{d-3} x NAB{d-3}, b, I] = [ 1, B{d-2}, NTNAN{d-2}, b, I]
-			expected_cfvs = expected_cfvs.reshape([1, gp_num_bets, -1, batch_size, HC])
-			# broadcasting parent_cfvs: [ 1, B{d-2}, NTNAN{d-2}, b, I] -> [ A{d-1}, B{d-2}, NTNAN{d-2}, b, I]
-			# [ A{d-1}, B{d-2}, NTNAN{d-2}, b, I] += [ A{d-1}, B{d-2}, NTNAN{d-2}, b, I] - [ 1, B{d-2}, NTNAN{d-2}, b, I]
-			layer.regrets += current_cfvs - expected_cfvs
+			layer = self.layers[d]
+			# current_cfvs: [A{d-1}, B{d-2}, NTNAN{d-3}, NAB{d-3}, b, I] (acting player's cfvs)
+			# expected_cfvs: [ 1, B{d-2}, NTNAN{d-3}, NAB{d-3}, b, I] (acting player's cfvs of parent nodes)
+			# destination: [A{d-1}, B{d-2}, NTNAN{d-3}, NAB{d-3}, b, I] (view of layer.work)
+			current_cfvs, expected_cfvs, destination = layer.regrets_plan
+			# broadcasting expected_cfvs: [ 1, B{d-2}, NTNAN{d-3}, NAB{d-3}, b, I] -> [A{d-1}, B{d-2}, NTNAN{d-3}, NAB{d-3}, b, I]
+			np.subtract(current_cfvs[ ..., hands ], expected_cfvs[ ..., hands ], out=destination[ ..., hands ])
+			# [ A{d-1}, B{d-2}, NTNAN{d-2}, b, I] += [ A{d-1}, B{d-2}, NTNAN{d-2}, b, I]
+			regrets = layer.regrets[ ..., hands ]
+			regrets += layer.work[ ..., hands ]
 			# (CFR+)
-			np.clip(layer.regrets, 0, constants.max_number, out=layer.regrets)
+			np.clip(regrets, 0, constants.max_number, out=regrets)
 
 
 	def _set_opponent_starting_range(self):
@@ -278,9 +425,10 @@ class Lookahead():
 		'''
 		P1, P2, HC = constants.players.P1, constants.players.P2, constants.hand_count
 		# note that CFVs indexing is swapped, thus the CFVs for the reconstruction player are for player '1'
-		opponent_cfvs = self.layers[0].cfvs[ : , : , : , : , P1 , : ].reshape(HC)
+		# [b, I] = [1, 1, 1, b, I]
+		opponent_cfvs = self.layers[0].cfvs[ : , : , : , : , P1 , : ].reshape([self.batch_size, HC])
 		opponent_range = self.reconstruction_gadget.compute_opponent_range(opponent_cfvs)
-		# [1, 1, 1, P, I] = [I]
+		# [1, 1, 1, b, I] = [b, I]
 		self.layers[0].ranges[ : , : , : , : , P2 , : ] = opponent_range
 
 
@@ -289,93 +437,157 @@ class Lookahead():
 			values at all terminal states of the lookahead.
 			These include terminal states of the game and depth-limited states.
 		'''
-		P1, P2, HC = constants.players.P1, constants.players.P2, constants.hand_count
 		# if this is not last street and there are nodes to approximate, then approximate equity from neural network
-		if self.tree.street != constants.streets_count and self.num_pot_sizes != 0:
-			# store ranges of all nodes, that are transitioning to next street
-			# ranges.shape = [ self.num_pot_sizes x self.batch_size, P, I ]
-			ranges = self._get_ranges_from_transitioning_nodes()
-			# order ranges to same order as trained examples of neural network
-			if self.tree.current_player == P1:
-				temp = ranges.copy()
-				ranges[ : , P1, : ] = temp[ : , P2, : ]
-				ranges[ : , P2, : ] = temp[ : , P1, : ]
-			# use neural net to approximate cfvs
-			# cfvs.shape = [ self.num_pot_sizes x self.batch_size, P, I ]
-			approximated_cfvs = self.cfvs_approximator.evaluate_ranges(ranges)
-			# now the neural net outputs for P1 and P2 respectively, so we need to swap the output values if necessary
-			if self.tree.current_player == P2:
-				temp = approximated_cfvs.copy()
-				approximated_cfvs[ : , P1, : ] = temp[ : , P2, : ]
-				approximated_cfvs[ : , P2, : ] = temp[ : , P1, : ]
-			# store outputs into respective nodes
-			self._store_cfvs_to_transitioning_nodes(approximated_cfvs)
+		# (with 'async'/'stale' evaluation mode, neural network is evaluated in worker thread)
+		approximate = self.tree.street != constants.streets_count and self.num_pot_sizes != 0
+		if approximate:
+			self._approximate_cfvs()
 		# equities of all other nodes are easily computable
 		# by using terminal equity/reward matrix from rules of the game
 		# equities to all nodes that are terminal (game is over) are computed
 		# using fold matrix (if last move was fold) and equity matrix (when all cards are shown)
-		equity_matrix = self.terminal_equity.get_equity_matrix()
-		fold_matrix = self.terminal_equity.get_fold_matrix()
-		# load ranges from nodes that are terminal
-		call_ranges = self._get_ranges_from_call_nodes() # [TN x b, P, I]
-		fold_ranges = self._get_ranges_from_fold_nodes() # [TN x b, P, I]
-		# calculate cfvs for all terminal nodes and both players
-		# [TN x b x P, I] = dot_product( [TN x b x P, I], [I,I] )
-		call_cfvs = np.dot(call_ranges.reshape([-1,HC]), equity_matrix)
-		fold_cfvs = np.dot(fold_ranges.reshape([-1,HC]), fold_matrix)
-		# no need to reshape cfvs. tensors are reshaped inside store functions
-		self._store_cfvs_to_call_nodes(call_cfvs)
-		self._store_cfvs_to_fold_nodes(fold_cfvs)
+		# (terminal and transitioning nodes do not share data, so they can be computed concurrently)
+		# load ranges from nodes that are terminal and calculate cfvs for them (for both players)
+		# with thread pool call and fold nodes have separate buffers and are computed concurrently,
+		# otherwise they share buffers, so they are processed one after another
+		if self.thread_pool is None:
+			self._compute_call_cfvs()
+			self._compute_fold_cfvs()
+		else:
+			futures = [ self.thread_pool.submit(self._compute_call_cfvs), self.thread_pool.submit(self._compute_fold_cfvs) ]
+			for future in futures:
+				future.result()
+		if approximate and arguments.nn_evaluation_mode == 'async':
+			self._store_approximated_cfvs(self._wait_for_approximated_cfvs())
 		# multiply all equities (from neural network and terminal equity) by pot scale factor
+		self._run_on_hands(self._scale_cfvs_by_pot)
+
+
+	def _approximate_cfvs(self):
+		''' Evaluates neural network on ranges of all transitioning nodes.
+			With 'sync' mode cfvs are stored immediately, with 'async' mode they are
+			stored after terminal equity is computed (see Lookahead._compute_cfvs) and
+			with 'stale' mode cfvs of previous iteration are stored (see arguments.nn_evaluation_mode)
+		'''
+		P1 = constants.players.P1
+		# previous evaluation still reads ranges buffer ('stale' mode)
+		finished_cfvs = self._wait_for_approximated_cfvs()
+		# store ranges of all nodes, that are transitioning to next street
+		# order ranges to same order as trained examples of neural network (swap players for P1)
+		# ranges.shape = [ self.num_pot_sizes x self.batch_size, P, I ]
+		ranges = self._get_ranges_from_transitioning_nodes(swap_players=self.tree.current_player == P1)
+		# use neural net to approximate cfvs
+		# cfvs.shape = [ self.num_pot_sizes x self.batch_size, P, I ]
+		if arguments.nn_evaluation_mode == 'sync':
+			self._store_approximated_cfvs(self.cfvs_approximator.evaluate_ranges(ranges))
+		elif arguments.nn_evaluation_mode == 'async':
+			self.approximation_future = get_nn_worker().submit(self.cfvs_approximator.evaluate_ranges, ranges)
+		elif arguments.nn_evaluation_mode == 'stale':
+			if finished_cfvs is not None:
+				self.stale_cfvs = finished_cfvs
+			if self.stale_cfvs is None:
+				# first iteration has no values to use
+				self.stale_cfvs = self.cfvs_approximator.evaluate_ranges(ranges)
+			else:
+				self.approximation_future = get_nn_worker().submit(self.cfvs_approximator.evaluate_ranges, ranges)
+			# stored cfvs are scaled by pot in place, so values are stored again every iteration
+			self._store_approximated_cfvs(self.stale_cfvs)
+		else:
+			raise ValueError("unknown nn_evaluation_mode '{}'".format(arguments.nn_evaluation_mode))
+
+
+	def _wait_for_approximated_cfvs(self):
+		''' Waits for evaluation of neural network, that runs in worker thread
+		@return [PS x b, P, I] :cfvs of transitioning states (None if nothing is evaluated)
+		'''
+		if self.approximation_future is None:
+			return None
+		cfvs = self.approximation_future.result()
+		self.approximation_future = None
+		return cfvs
+
+
+	def _store_approximated_cfvs(self, approximated_cfvs):
+		''' Stores cfvs from neural network into transitioning nodes
+		@param: [PS x b, P, I] :cfvs of transitioning states
+		'''
+		# now the neural net outputs for P1 and P2 respectively, so we need to swap the output values if necessary
+		# store outputs into respective nodes
+		self._store_cfvs_to_transitioning_nodes(approximated_cfvs, swap_players=self.tree.current_player == constants.players.P2)
+
+
+	def _compute_call_cfvs(self):
+		''' Computes cfvs of all states that player called (river call values are computed
+			without matrix, flop/turn call values can use low-rank factors of the matrix, see arguments.equity_rank)
+		'''
+		HC = constants.hand_count
+		call_ranges = self._get_ranges_from_call_nodes() # [TN, b, P, I]
+		if self.board_batched:
+			# buffers are batch-major views: [b, TN, P, I] (see LookaheadBuilder._construct_work_buffers)
+			for terminal_equity, start, end in self.terminal_equity_groups:
+				# [(end-start) x TN x P, I] = dot_product( [(end-start) x TN x P, I], [I,I] )
+				ranges, cfvs = self.entry_call_ranges[ start:end ], self.entry_call_cfvs[ start:end ]
+				terminal_equity.get_call_values(ranges.reshape([-1,HC]), allow_approximation=True, out=cfvs.reshape([-1,HC]))
+		else:
+			# [TN x b x P, I] = dot_product( [TN x b x P, I], [I,I] )
+			self.terminal_equity.get_call_values(call_ranges.reshape([-1,HC]), allow_approximation=True, out=self.call_cfvs)
+		# no need to reshape cfvs. tensors are reshaped inside store functions
+		self._store_cfvs_to_call_nodes(self.call_cfvs)
+
+
+	def _compute_fold_cfvs(self):
+		''' Computes cfvs of all states that player folded (fold values are computed without matrix) '''
+		HC = constants.hand_count
+		fold_ranges = self._get_ranges_from_fold_nodes() # [TN, b, P, I]
+		if self.board_batched:
+			for terminal_equity, start, end in self.terminal_equity_groups:
+				ranges, cfvs = self.entry_fold_ranges[ start:end ], self.entry_fold_cfvs[ start:end ]
+				terminal_equity.get_fold_values(ranges.reshape([-1,HC]), out=cfvs.reshape([-1,HC]))
+		else:
+			# [TN x b x P, I] = dot_product( [TN x b x P, I], [I,I] )
+			self.terminal_equity.get_fold_values(fold_ranges.reshape([-1,HC]), out=self.fold_cfvs)
+		self._store_cfvs_to_fold_nodes(self.fold_cfvs)
+
+
+	def _scale_cfvs_by_pot(self, hands=slice(None)):
+		''' Multiplies cfvs of all states by pot scale factor
+		@param: slice :hands, that are computed (hands are independent)
+		'''
 		for d in range(1, self.depth):
-			# [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] *= [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I]
-			self.layers[d].cfvs *= self.layers[d].pot_size
+			# [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] *= [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1, 1]
+			self.layers[d].cfvs[ ..., hands ] *= self.layers[d].pot_size
 
 
 
 	def _get_ranges_from_call_nodes(self):
 		''' gets ranges of all states that player called '''
-		HC, PC, batch_size = constants.hand_count, constants.players_count, self.batch_size
-		ranges = np.zeros([self.num_term_call_nodes, batch_size, PC, HC], dtype=arguments.dtype)
-		for d in range(1, self.depth):
-			layer = self.layers[d]
-			if d > 1 or self.first_call_terminal:
-				if self.tree.street != constants.streets_count:
-					# slicing: [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] [1, -1] -> [NTNAN{d-2}, b, P, I]
-					ranges[ layer.term_call_idx[0]:layer.term_call_idx[1] ] = layer.ranges[1, -1]
-				else:
-					# slicing: [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] [1] -> [B{d-2}, NTNAN{d-2}, b, P, I]
-					# reshape: [B{d-2}, NTNAN{d-2}, b, P, I] -> [B{d-2} x NTNAN{d-2}, b, P, I] = [NTN{d-1}, b, P, I]
-					ranges[ layer.term_call_idx[0]:layer.term_call_idx[1] ] = layer.ranges[1].reshape([-1, batch_size, PC, HC])
-		return ranges.reshape([-1,PC,HC])
+		PC, HC = constants.players_count, constants.hand_count
+		# (see LookaheadBuilder._construct_work_buffers)
+		# non-last street: allin -> call, [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] [1, -1] -> [NTNAN{d-2}, b, P, I]
+		# last street: call, [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] [1] -> [B{d-2} x NTNAN{d-2}, b, P, I]
+		for start, end, nodes, ranges, _ in self.call_plan:
+			# only existing nodes are gathered: [k, b, P, I] = [B{d-2} x NTNAN{d-2}, b, P, I] [nodes]
+			np.take(ranges, nodes, axis=0, out=self.call_ranges[ start:end ], mode='clip')
+		return self.call_ranges
 
 	def _store_cfvs_to_call_nodes(self, cfvs):
 		''' stores cfvs to same call states '''
 		HC, PC, batch_size = constants.hand_count, constants.players_count, self.batch_size
 		cfvs = cfvs.reshape([self.num_term_call_nodes, batch_size, PC, HC])
-		for d in range(1,self.depth):
-			layer = self.layers[d]
-			if d > 1 or self.first_call_terminal:
-				if self.tree.street != constants.streets_count:
-					# allin -> call ([1] = call, [-1] = allin)
-					# [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] [1, -1] -> [NTNAN{d-2}, b, P, I]
-					layer.cfvs[1][-1] = cfvs[ layer.term_call_idx[0]:layer.term_call_idx[1] ]
-				else: # call ([1] = call)
-					# cfvs: [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] [1] -> [B{d-2}, NTNAN{d-2}, b, P, I]
-					layer.cfvs[1] = cfvs[ layer.term_call_idx[0]:layer.term_call_idx[1] ].reshape(layer.cfvs[1].shape)
+		for start, end, nodes, _, layer_cfvs in self.call_plan:
+			# [B{d-2} x NTNAN{d-2}, b, P, I] [nodes] = [k, b, P, I] (cfvs of padding stay 0)
+			layer_cfvs[nodes] = cfvs[ start:end ]
 
 
 
 	def _get_ranges_from_fold_nodes(self):
 		''' gets ranges of all states that player folded '''
-		HC, PC, batch_size = constants.hand_count, constants.players_count, self.batch_size
-		ranges = np.zeros([self.num_term_fold_nodes, batch_size, PC, HC], dtype=arguments.dtype)
-		for d in range(1, self.depth):
-			layer = self.layers[d]
-			# slicing: [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] [0] -> [B{d-2}, NTNAN{d-2}, b, P, I]
-			# reshape: [B{d-2}, NTNAN{d-2}, b, P, I] -> [B{d-2} x NTNAN{d-2}, b, P, I] = [NTN{d-1}, b, P, I]
-			ranges[ layer.term_fold_idx[0]:layer.term_fold_idx[1] ] = layer.ranges[0].reshape([-1, batch_size, PC, HC])
-		return ranges.reshape([-1,PC,HC])
+		PC, HC = constants.players_count, constants.hand_count
+		for start, end, nodes, ranges, _ in self.fold_plan:
+			# slicing: [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] [0] -> [B{d-2} x NTNAN{d-2}, b, P, I]
+			# only existing nodes are gathered: [k, b, P, I] = [B{d-2} x NTNAN{d-2}, b, P, I] [nodes]
+			np.take(ranges, nodes, axis=0, out=self.fold_ranges[ start:end ], mode='clip')
+		return self.fold_ranges
 
 	def _store_cfvs_to_fold_nodes(self, cfvs):
 		''' stores cfvs to same fold states '''
@@ -383,8 +595,10 @@ class Lookahead():
 		cfvs = cfvs.reshape([self.num_term_fold_nodes, batch_size, PC, HC])
 		for d in range(1,self.depth):
 			layer = self.layers[d]
-			# cfvs: [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] [1] -> [B{d-2}, NTNAN{d-2}, b, P, I]
-			layer.cfvs[0] = cfvs[ layer.term_fold_idx[0]:layer.term_fold_idx[1] ].reshape(layer.cfvs[0].shape)
+			start, end, nodes, _, layer_cfvs = self.fold_plan[d-1]
+			# cfvs: [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] [0] -> [B{d-2} x NTNAN{d-2}, b, P, I]
+			# [B{d-2} x NTNAN{d-2}, b, P, I] [nodes] = [k, b, P, I] (cfvs of padding stay 0)
+			layer_cfvs[nodes] = cfvs[ start:end ]
 			# correctly set the folded player by mutliplying by -1
 			fold_mutliplier = -1 if layer.acting_player == constants.players.P1 else 1
 			# [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] *= scalar
@@ -393,38 +607,31 @@ class Lookahead():
 
 
 
-	def _get_ranges_from_transitioning_nodes(self):
-		''' gets ranges of all states that game didin't end and is transitioning to next round/street '''
-		HC, PC, batch_size = constants.hand_count, constants.players_count, self.batch_size
-		ranges = np.zeros([self.num_pot_sizes, batch_size, PC, HC], dtype=arguments.dtype)
-		for d in range(1,self.depth):
-			layer = self.layers[d]
-			if d > 1 or self.first_call_transition:
-				# if there's only 1 parent, then it should've been an all in, so skip this next_street_box calculation
-				num_grandparent_bets = layer.ranges[1].shape[0]
-				if num_grandparent_bets > 1 or (d == 1 and self.first_call_transition):
-					p_start, p_end = (0,1) if d == 1 else (0,-1) # parent indices
-					# reshape: [B{d-2} - 1, NTNAN{d-2}, b, P, I] -> [(B{d-2} - 1) x NTNAN{d-2}, b, P, I]
-					ranges_batch = layer.ranges[ 1, p_start:p_end, : , : , : , : ].reshape([-1, batch_size, PC, HC])
-					# [sliced(PS), b, P, I] = [(B{d-2} - 1) x NTNAN{d-2}, b, P, I]
-					ranges[ layer.indices[0]:layer.indices[1] , : , : , : ] = ranges_batch.copy()
-		return ranges.reshape([-1,PC,HC])
-
-	def _store_cfvs_to_transitioning_nodes(self, approximated_cfvs):
-		''' stores cfvs to same transitioning states '''
+	def _get_ranges_from_transitioning_nodes(self, swap_players=False):
+		''' gets ranges of all states that game didin't end and is transitioning to next round/street
+		@param: bool :swap ranges of players
+		'''
+		PC, HC = constants.players_count, constants.hand_count
+		for start, end, ranges, _ in self.transition_plan:
+			if swap_players:
+				ranges = ranges[ : , : , : , ::-1 , : ]
+			# [sliced(PS), b, P, I] = [(B{d-2} - 1) x NTNAN{d-2}, b, P, I]
+			np.copyto(self.transition_ranges[ start:end ].reshape(ranges.shape), ranges)
+		return self.transition_ranges.reshape([-1,PC,HC])
+
+	def _store_cfvs_to_transitioning_nodes(self, approximated_cfvs, swap_players=False):
+		''' stores cfvs to same transitioning states
+		@param: [PS x b, P, I] :cfvs of transitioning states
+		@param: bool           :swap cfvs of players
+		'''
 		HC, PC, batch_size = constants.hand_count, constants.players_count, self.batch_size
 		approximated_cfvs = approximated_cfvs.reshape([self.num_pot_sizes, batch_size, PC, HC])
-		for d in range(1, self.depth):
-			layer = self.layers[d]
-			if d > 1 or self.first_call_transition:
-				num_grandparent_bets = layer.ranges[1].shape[0]
-				if num_grandparent_bets > 1 or (d == 1 and self.first_call_transition):
-					p_start, p_end = (0,1) if d == 1 else (0,-1) # parent indices
-					cfvs_shape = layer.cfvs[ 1, p_start:p_end , : , : , : , : ].shape
-					# reshape: [sliced(p), b, P, I] -> [sliced(B{d-2}), NTNAN{d-2}, b, P, I]
-					cfvs_batch = approximated_cfvs[ layer.indices[0]:layer.indices[1], : , : , : ].reshape(cfvs_shape)
-					# [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] = [sliced(B{d-2}), NTNAN{d-2}, b, P, I]
-					layer.cfvs[ 1, p_start:p_end , : , : , : , : ] = cfvs_batch.copy()
+		if swap_players:
+			approximated_cfvs = approximated_cfvs[ : , : , ::-1 , : ]
+		for start, end, _, layer_cfvs in self.transition_plan:
+			# [sliced(B{d-2}), NTNAN{d-2}, b, P, I] = [sliced(p), b, P, I]
+			cfvs_batch = approximated_cfvs[ start:end ]
+			np.copyto(layer_cfvs, cfvs_batch.reshape(layer_cfvs.shape[:2] + cfvs_batch.shape[1:]))
 
 
 
@@ -25,7 +25,7 @@ class LookaheadBuilder():
 		self.lookahead.num_pot_sizes = 0
 		# create the optimized data structures for batching next_round_value
 		for d in range(1,self.lookahead.depth):
-			# layers[d].pot_size - [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I]
+			# layers[d].pot_size - [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1, 1]
 			num_grandparent_bets = self.lookahead.layers[d].pot_size[1].shape[0]
 			if d == 1 and self.lookahead.first_call_transition:
 				before = self.lookahead.num_pot_sizes
@@ -61,7 +61,12 @@ class LookaheadBuilder():
 						assert(action not in self.lookahead.action_to_index)
 						self.lookahead.action_to_index[action] = self.lookahead.layers[d].indices[0] + action_idx
 
-		street, board = self.lookahead.tree.street, self.lookahead.terminal_equity.board
+		street = self.lookahead.tree.street
+		if self.lookahead.board_batched:
+			# [b, 0-5] board of every batch entry
+			board = np.stack([ terminal_equity.board for terminal_equity in self.lookahead.terminal_equity ])
+		else:
+			board = self.lookahead.terminal_equity.board
 		self.lookahead.cfvs_approximator = get_next_round_value(street) # (loads preloaded models)
 		# init input/output variables in NextRoundValue
 		self.lookahead.cfvs_approximator.init_computation(board, self.lookahead.next_round_pot_sizes, self.lookahead.batch_size)
@@ -105,61 +110,191 @@ class LookaheadBuilder():
 		# [actions, parent_action, grandparents, batch, players, range]
 		layers[0].ranges = np.full([1, 1, 1, batch_size, PC, HC], 1.0/HC, dtype=arguments.dtype)
 		layers[1].ranges = np.full([layers[0].num_actions, 1, 1, batch_size, PC, HC], 1.0/HC, dtype=arguments.dtype)
-		layers[0].pot_size = np.zeros_like(layers[0].ranges)
-		layers[1].pot_size = np.zeros_like(layers[1].ranges)
+		# pot sizes are the same for all hands and players [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1, 1]
+		layers[0].pot_size = np.zeros([1, 1, 1, batch_size, 1, 1], dtype=arguments.dtype)
+		layers[1].pot_size = np.zeros([layers[0].num_actions, 1, 1, batch_size, 1, 1], dtype=arguments.dtype)
 		layers[0].cfvs = np.zeros_like(layers[0].ranges)
 		layers[1].cfvs = np.zeros_like(layers[1].ranges)
 		layers[0].cfvs_avg = np.zeros_like(layers[0].ranges)
 		layers[1].cfvs_avg = np.zeros_like(layers[1].ranges)
 		# data structures for one player [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1, I]
+		# (average strategy is used only in the first node, see Lookahead._compute_update_average_strategies)
 		layers[0].strategies_avg = None
 		layers[1].strategies_avg = np.zeros([layers[0].num_actions, 1, 1, batch_size, HC], dtype=arguments.dtype)
 		layers[0].current_strategy = None
 		layers[1].current_strategy = np.zeros_like(layers[1].strategies_avg)
 		layers[0].regrets = None
 		layers[1].regrets = np.zeros_like(layers[1].strategies_avg)
+		# empty actions are the same for all hands [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1]
 		layers[0].empty_action_mask = None
-		layers[1].empty_action_mask = np.ones_like(layers[1].strategies_avg)
+		layers[1].empty_action_mask = np.ones([layers[0].num_actions, 1, 1, batch_size, 1], dtype=arguments.dtype)
 		# create the data structures for the rest of the layers
 		for d in range(2, self.lookahead.depth):
 			# data structures [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I]
 			layers[d].ranges = np.zeros([layers[d-1].num_actions, layers[d-2].num_bets, layers[d-2].num_nonterminal_nonallin_nodes, batch_size, PC, HC], dtype=arguments.dtype)
 			layers[d].cfvs = layers[d].ranges.copy()
-			layers[d].pot_size = np.full_like(layers[d].ranges, arguments.stack)
+			# [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1, 1]
+			layers[d].pot_size = np.full(layers[d].ranges.shape[:-2] + (1,1), arguments.stack, dtype=arguments.dtype)
 			# data structures [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1, I]
-			layers[d].strategies_avg = np.zeros([layers[d-1].num_actions, layers[d-2].num_bets, layers[d-2].num_nonterminal_nonallin_nodes, batch_size, HC], dtype=arguments.dtype)
-			layers[d].current_strategy = layers[d].strategies_avg.copy()
-			layers[d].regrets = np.full_like(layers[d].strategies_avg, constants.regret_epsilon)
-			layers[d].empty_action_mask = np.ones_like(layers[d].strategies_avg)
-		# save indexes of nodes that are terminal, so we can use them to calculate rewards from terminal equity in one batch
+			layers[d].current_strategy = np.zeros([layers[d-1].num_actions, layers[d-2].num_bets, layers[d-2].num_nonterminal_nonallin_nodes, batch_size, HC], dtype=arguments.dtype)
+			layers[d].regrets = np.full_like(layers[d].current_strategy, constants.regret_epsilon)
+			# [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1]
+			layers[d].empty_action_mask = np.ones(layers[d].current_strategy.shape[:-1] + (1,), dtype=arguments.dtype)
+
+
+	def _compute_existing_nodes(self):
+		''' Finds nodes, that exist in the tree. Other nodes are padding: nodes of masked out
+			actions (see self.set_datastructures_from_tree_dfs) and all nodes below them.
+			Existence is propagated in the same way as ranges (see Lookahead._compute_ranges)
+		'''
+		layers = self.lookahead.layers
+		layers[0].existing_nodes = np.ones([1,1,1], dtype=bool)
+		for d in range(0, self.lookahead.depth-1):
+			next_layer, layer = layers[d+1], layers[d]
+			p_num_terminal_actions = layers[d-1].num_terminal_actions if d > 0 else 0
+			p_num_bets = layers[d-1].num_bets if d > 0 else 1
+			gp_num_nonallin_bets = layers[d-2].num_nonallin_bets if d > 1 else 1
+			# [A{d-1}, B{d-2}, NTNAN{d-2}] -> [ 1, B{d-1}, NTNAN{d-1}]
+			parent_nodes = np.transpose(layer.existing_nodes[ p_num_terminal_actions: , :gp_num_nonallin_bets ], [0,2,1]).reshape([1, p_num_bets, -1])
+			# [A{d}, B{d-1}, NTNAN{d-1}]
+			next_layer.existing_nodes = parent_nodes & (next_layer.empty_action_mask[ : , : , : , 0, 0 ] > 0)
+
+
+	def _compute_terminal_indices(self):
+		''' Saves indexes of terminal nodes, so we can use them to calculate rewards
+			from terminal equity in one batch. Only existing nodes are saved, padding is skipped
+		'''
+		layers = self.lookahead.layers
 		self.lookahead.num_term_call_nodes = 0
 		self.lookahead.num_term_fold_nodes = 0
-		# calculate term_call_indices
 		for d in range(1,self.lookahead.depth):
 			assert(layers[d].ranges[1][-1].shape[0] == layers[d].ranges[1].shape[1])
+			# [A{d-1}, B{d-2}, NTNAN{d-2}]
+			existing_nodes = layers[d].existing_nodes
+			# calculate term_call_indices
 			if d > 1 or self.lookahead.first_call_terminal:
 				if self.lookahead.tree.street != constants.streets_count:
-					before = self.lookahead.num_term_call_nodes
-					num_nonterminal_nonallin_grandparents = layers[d].ranges[1][-1].shape[0]
-					self.lookahead.num_term_call_nodes += num_nonterminal_nonallin_grandparents
-					layers[d].term_call_idx = np.array([before, self.lookahead.num_term_call_nodes], dtype=arguments.int_dtype)
-				else:
-					before = self.lookahead.num_term_call_nodes
-					num_grandparent_bets = layers[d].ranges[1].shape[0]
-					num_nonterminal_nonallin_grandparents = layers[d].ranges[1].shape[1]
-					num_nonterminal_parents = num_nonterminal_nonallin_grandparents * num_grandparent_bets
-					self.lookahead.num_term_call_nodes += num_nonterminal_parents
-					layers[d].term_call_idx = np.array([before, self.lookahead.num_term_call_nodes], dtype=arguments.int_dtype)
-		# calculate term_fold_indices
-		for d in range(1,self.lookahead.depth):
+					# allin -> call ([1] = call, [-1] = allin): [NTNAN{d-2}]
+					layers[d].term_call_nodes = np.nonzero(existing_nodes[1, -1])[0]
+				else: # call ([1] = call): [B{d-2} x NTNAN{d-2}]
+					layers[d].term_call_nodes = np.nonzero(existing_nodes[1].reshape([-1]))[0]
+				before = self.lookahead.num_term_call_nodes
+				self.lookahead.num_term_call_nodes += layers[d].term_call_nodes.shape[0]
+				layers[d].term_call_idx = np.array([before, self.lookahead.num_term_call_nodes], dtype=arguments.int_dtype)
+			# calculate term_fold_indices ([0] = fold): [B{d-2} x NTNAN{d-2}]
+			layers[d].term_fold_nodes = np.nonzero(existing_nodes[0].reshape([-1]))[0]
 			before = self.lookahead.num_term_fold_nodes
-			num_grandparent_bets = layers[d].ranges[0].shape[0]
-			num_nonterminal_nonallin_grandparents = layers[d].ranges[0].shape[1]
-			num_nonterminal_parents = num_nonterminal_nonallin_grandparents * num_grandparent_bets
-			self.lookahead.num_term_fold_nodes += num_nonterminal_parents
+			self.lookahead.num_term_fold_nodes += layers[d].term_fold_nodes.shape[0]
 			layers[d].term_fold_idx = np.array([before, self.lookahead.num_term_fold_nodes], dtype=arguments.int_dtype)
 
 
+	def _construct_work_buffers(self):
+		''' Preallocates buffers and precomputes views (gather/scatter plans),
+			that are used in every cfr iteration, so iterations do not allocate memory.
+			Views stay valid, because lookahead arrays are only modified in place
+		'''
+		PC, HC, batch_size = constants.players_count, constants.hand_count, self.lookahead.batch_size
+		layers, depth = self.lookahead.layers, self.lookahead.depth
+		# element-wise computations are split along hand axis between threads (see Lookahead._run_on_hands)
+		# chunk boundaries are multiples of 16 hands (64 bytes), but that avoids shared cache lines only in the first row:
+		# row of [..., I] array has 1326 x 4 = 5304 bytes (not multiple of 64), so in other rows neighbouring chunks
+		# can write to the same cache line at their boundary (one line per row, small compared to chunk size)
+		if self.lookahead.thread_pool is None:
+			self.lookahead.hand_chunks = [ slice(None) ]
+		else:
+			num_chunks = arguments.lookahead_num_threads
+			bounds = [ min(HC, int(round(HC * i / num_chunks / 16)) * 16) for i in range(num_chunks) ] + [HC]
+			self.lookahead.hand_chunks = [ slice(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if start < end ]
+		# layers are processed one after another, so they share one work buffer
+		# (threads use different hands of it, hand axis is last in every layer)
+		work_size = max([ layers[d].current_strategy.size for d in range(1, depth) ])
+		self.lookahead.work = np.zeros([work_size], dtype=arguments.dtype)
+		for d in range(1, depth):
+			layer = layers[d]
+			layer.work = self.lookahead.work[ :layer.current_strategy.size ].reshape(layer.current_strategy.shape)
+			layer.regrets_sum = np.zeros_like(layer.current_strategy[ :1 ])
+			layer.expected_cfvs = np.zeros_like(layer.cfvs[ :1 ])
+		# ranges of parent nodes -> ranges of their children (see Lookahead._compute_ranges)
+		for d in range(0, depth-1):
+			next_layer, layer = layers[d+1], layers[d]
+			p_num_terminal_actions = layers[d-1].num_terminal_actions if d > 0 else 0
+			p_num_bets = layers[d-1].num_bets if d > 0 else 1
+			gp_num_nonallin_bets = layers[d-2].num_nonallin_bets if d > 1 else 1
+			# array slicing: [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I] -> [B{d-1}, NAB{d-2}, NTNAN{d-2}, b, P, I]
+			# transpose: [B{d-1}, NAB{d-2}, NTNAN{d-2}, b, P, I] -> [ 1, B{d-1}, NTNAN{d-2}, NAB{d-2}, b, P, I]
+			source = np.transpose(layer.ranges[ p_num_terminal_actions: , :gp_num_nonallin_bets ], [0,2,1,3,4,5])[np.newaxis]
+			# reshape: [A{d}, B{d-1}, NTNAN{d-1}, b, P, I] -> [A{d}, B{d-1}, NTNAN{d-2}, NAB{d-2}, b, P, I]
+			destination = next_layer.ranges.reshape([-1, p_num_bets, layer.ranges.shape[2], gp_num_nonallin_bets, batch_size, PC, HC])
+			layer.next_ranges_plan = (source, destination)
+		# expected cfvs of children -> cfvs of parent nodes (and current regrets)
+		for d in range(1, depth):
+			layer, parent = layers[d], layers[d-1]
+			gp_num_terminal_actions = layers[d-2].num_terminal_actions if d > 1 else 0
+			gp_num_bets = layers[d-2].num_bets if d > 1 else 1
+			ggp_num_nonallin_bets = layers[d-3].num_nonallin_bets if d > 2 else 1
+			# reshape: [ 1, B{d-2}, NTNAN{d-2}, b, P, I] -> [B{d-2}, NTNAN{d-3}, NAB{d-3}, b, P, I]
+			# transpose: [B{d-2}, NTNAN{d-3}, NAB{d-3}, b, P, I] -> [B{d-2}, NAB{d-3}, NTNAN{d-3}, b, P, I]
+			source = np.transpose(layer.expected_cfvs.reshape([gp_num_bets, -1, ggp_num_nonallin_bets, batch_size, PC, HC]), [0,2,1,3,4,5])
+			destination = parent.cfvs[ gp_num_terminal_actions: , :ggp_num_nonallin_bets ]
+			layer.expected_cfvs_plan = (source, destination)
+			# reshape: [A{d-1}, B{d-2}, NTNAN{d-2}, b, (P), I] -> [A{d-1}, B{d-2}, NTNAN{d-3}, NAB{d-3}, b, (P), I]
+			current_cfvs = layer.cfvs.reshape([-1, gp_num_bets, parent.cfvs.shape[2], ggp_num_nonallin_bets, batch_size, PC, HC])[ ..., layer.acting_player, : ]
+			destination = layer.work.reshape(current_cfvs.shape)
+			# slicing and transpose: [A{d-2}, B{d-3}, NTNAN{d-3}, b, P, I] -> [ 1, B{d-2}, NTNAN{d-3}, NAB{d-3}, b, I]
+			expected_cfvs = np.transpose(parent.cfvs[ gp_num_terminal_actions: , :ggp_num_nonallin_bets, : , : , layer.acting_player, : ], [0,2,1,3,4])[np.newaxis]
+			layer.regrets_plan = (current_cfvs, expected_cfvs, destination)
+		# ranges of terminal/transitioning nodes are gathered into one buffer for batched evaluation
+		# terminal plan: list of (start, end, indexes of existing nodes, ranges view, cfvs view), where views are [k, b, P, I]
+		# transition plan: list of (start, end, ranges view, cfvs view), where views are [k, ..., b, P, I]
+		# call and fold nodes are evaluated one after another, so they share buffers
+		# (with thread pool they are evaluated concurrently and each has its own buffers)
+		num_call_nodes, num_fold_nodes = self.lookahead.num_term_call_nodes, self.lookahead.num_term_fold_nodes
+		if self.lookahead.board_batched:
+			# batch entries use different terminal equities, so buffers are batch-major [b, TN, P, I]
+			# (entries of every terminal equity are contiguous) and lookahead uses [TN, b, P, I] views of them
+			self.lookahead.entry_call_ranges = np.zeros([batch_size, num_call_nodes, PC, HC], dtype=arguments.dtype)
+			self.lookahead.entry_fold_ranges = np.zeros([batch_size, num_fold_nodes, PC, HC], dtype=arguments.dtype)
+			self.lookahead.entry_call_cfvs = np.zeros_like(self.lookahead.entry_call_ranges)
+			self.lookahead.entry_fold_cfvs = np.zeros_like(self.lookahead.entry_fold_ranges)
+			self.lookahead.call_ranges = np.swapaxes(self.lookahead.entry_call_ranges, 0, 1)
+			self.lookahead.fold_ranges = np.swapaxes(self.lookahead.entry_fold_ranges, 0, 1)
+			self.lookahead.call_cfvs = np.swapaxes(self.lookahead.entry_call_cfvs, 0, 1)
+			self.lookahead.fold_cfvs = np.swapaxes(self.lookahead.entry_fold_cfvs, 0, 1)
+		else:
+			if self.lookahead.thread_pool is None:
+				num_term_nodes = max(num_call_nodes, num_fold_nodes)
+				call_start = fold_start = 0
+			else:
+				num_term_nodes = num_call_nodes + num_fold_nodes
+				call_start, fold_start = 0, num_call_nodes
+			self.lookahead.term_ranges = np.zeros([num_term_nodes, batch_size, PC, HC], dtype=arguments.dtype)
+			self.lookahead.call_ranges = self.lookahead.term_ranges[ call_start:call_start+num_call_nodes ]
+			self.lookahead.fold_ranges = self.lookahead.term_ranges[ fold_start:fold_start+num_fold_nodes ]
+			# [TN x b x P, I] outputs of terminal equity
+			self.lookahead.term_cfvs = np.zeros([num_term_nodes * batch_size * PC, HC], dtype=arguments.dtype)
+			self.lookahead.call_cfvs = self.lookahead.term_cfvs[ call_start*batch_size*PC:(call_start+num_call_nodes)*batch_size*PC ]
+			self.lookahead.fold_cfvs = self.lookahead.term_cfvs[ fold_start*batch_size*PC:(fold_start+num_fold_nodes)*batch_size*PC ]
+		self.lookahead.call_plan, self.lookahead.fold_plan, self.lookahead.transition_plan = [], [], []
+		for d in range(1, depth):
+			layer = layers[d]
+			if d > 1 or self.lookahead.first_call_terminal:
+				if self.lookahead.tree.street != constants.streets_count:
+					# allin -> call ([1] = call, [-1] = allin): [NTNAN{d-2}, b, P, I]
+					views = (layer.ranges[1, -1], layer.cfvs[1, -1])
+				else: # call ([1] = call): [B{d-2}, NTNAN{d-2}, b, P, I] -> [B{d-2} x NTNAN{d-2}, b, P, I]
+					views = (layer.ranges[1].reshape([-1, batch_size, PC, HC]), layer.cfvs[1].reshape([-1, batch_size, PC, HC]))
+				self.lookahead.call_plan.append( (layer.term_call_idx[0], layer.term_call_idx[1], layer.term_call_nodes) + views )
+			# fold ([0] = fold): [B{d-2}, NTNAN{d-2}, b, P, I] -> [B{d-2} x NTNAN{d-2}, b, P, I]
+			views = (layer.ranges[0].reshape([-1, batch_size, PC, HC]), layer.cfvs[0].reshape([-1, batch_size, PC, HC]))
+			self.lookahead.fold_plan.append( (layer.term_fold_idx[0], layer.term_fold_idx[1], layer.term_fold_nodes) + views )
+			if layer.indices is not None:
+				p_start, p_end = (0,1) if d == 1 else (0,-1) # parent indices
+				# [sliced(B{d-2}), NTNAN{d-2}, b, P, I]
+				self.lookahead.transition_plan.append( (layer.indices[0], layer.indices[1], layer.ranges[ 1, p_start:p_end ], layer.cfvs[ 1, p_start:p_end ]) )
+		if self.lookahead.transition_plan:
+			self.lookahead.transition_ranges = np.zeros([self.lookahead.num_pot_sizes, batch_size, PC, HC], dtype=arguments.dtype)
+
+
 	def set_datastructures_from_tree_dfs(self, node, depth, action_id, parent_id, gp_id, cur_action_id, parent_action_id=None):
 		''' Traverses the tree to fill in lookahead data structures that
 			summarize data contained in the tree.
@@ -251,8 +386,43 @@ class LookaheadBuilder():
 		# we mask out fold as a possible action when check is for free, due to: fewer actions means faster convergence
 		if self.lookahead.tree.bets[0] == self.lookahead.tree.bets[1]:
 			self.lookahead.layers[1].empty_action_mask[0].fill(0)
+		# indexes of terminal nodes (padding is skipped)
+		self._compute_existing_nodes()
+		self._compute_terminal_indices()
 		# construct the neural net query boxes
 		self._construct_transition_boxes()
+		# preallocate memory used by cfr iterations
+		self._construct_work_buffers()
+
+
+	def reset_from_tree(self, tree):
+		''' Resets built lookahead for the public tree with the same structure
+			(see LookaheadPool.get_tree_signature). Tensors, terminal indices
+			and gather/scatter plans are kept, pot sizes and masks are filled
+			from the tree and state of cfr iterations is set to initial values
+		@param: Node :public tree used to construct the lookahead
+		'''
+		HC, layers = constants.hand_count, self.lookahead.layers
+		self.lookahead.tree = tree
+		for d in range(0, self.lookahead.depth):
+			layer = layers[d]
+			# same initial values as in self.construct_data_structures
+			layer.ranges.fill(1.0/HC if d < 2 else 0)
+			layer.cfvs.fill(0)
+			if d < 2:
+				layer.cfvs_avg.fill(0)
+			if d > 0:
+				layer.current_strategy.fill(0)
+				layer.regrets.fill(constants.regret_epsilon if d > 1 else 0)
+				layer.empty_action_mask.fill(1)
+		layers[1].strategies_avg.fill(0)
+		# fill pot sizes and masks (padding nodes keep their pot sizes)
+		self.lookahead.parent_action_id = {}
+		self.set_datastructures_from_tree_dfs(tree, depth=0, action_id=0, parent_id=0, gp_id=0, cur_action_id=-100)
+		if self.lookahead.tree.bets[0] == self.lookahead.tree.bets[1]:
+			self.lookahead.layers[1].empty_action_mask[0].fill(0)
+		# pot sizes of transitioning nodes (and board) for neural network
+		self._construct_transition_boxes()
 
 
 	def _compute_tree_structures(self, current_layer, current_depth):
@@ -0,0 +1,105 @@
+'''
+	Pool of built lookaheads, that are reused for trees with the same structure.
+
+	Same betting shapes recur across hands and pot sizes, so instead of allocating
+	all layer tensors and computing terminal indices and gather/scatter plans
+	again, lookahead of the same structure (see LookaheadPool.get_tree_signature)
+	is taken from the pool and only its pot sizes, masks and state are reset
+	(see Lookahead.reuse). Lookaheads are returned to the pool after resolving.
+	When total size of kept lookaheads exceeds the limit, least recently used
+	lookaheads are removed (see arguments.lookahead_pool_size).
+'''
+import os
+from collections import OrderedDict
+
+from Settings.arguments import arguments
+from Settings.constants import constants
+from Lookahead.lookahead import Lookahead
+
+class LookaheadPool():
+	def __init__(self, max_size=None):
+		''' Creates empty pool
+		@param: int :max size of all kept lookaheads (in MB)
+		'''
+		max_size = max_size if max_size is not None else arguments.lookahead_pool_size
+		self.max_size = max_size * 1024 * 1024
+		self.clear()
+
+
+	def clear(self):
+		''' Removes all kept lookaheads '''
+		# lookaheads are not shared with forked processes (they reference threads of the process)
+		self.pid = os.getpid()
+		# {signature: [Lookahead,...]} ordered from least recently used
+		self.lookaheads = OrderedDict()
+		self.size = 0
+
+
+	def get_tree_signature(self, tree, terminal_equity, batch_size):
+		''' Gives structure of the tree, that determines shapes of lookahead tensors,
+			its masks and terminal/transitioning nodes (bet sizes and pots are not part of it)
+		@param: Node           :root of lookahead tree
+		@param: TerminalEquity :terminal equity of lookahead (or list, see Lookahead.__init__)
+		@param: int            :batch size of lookahead
+		@return tuple :signature of the tree
+		'''
+		def get_node_signature(node):
+			chance = node.current_player == constants.players.chance
+			return (bool(node.terminal), chance, tuple([ get_node_signature(child) for child in node.children ]))
+		# free check masks out fold of the first node (see LookaheadBuilder.build_from_tree)
+		free_check = bool(tree.bets[0] == tree.bets[1])
+		# board-batched lookaheads have different buffers (see Lookahead._set_terminal_equity)
+		board_batched = isinstance(terminal_equity, list)
+		return (tree.street, batch_size, free_check, board_batched, arguments.lookahead_num_threads, get_node_signature(tree))
+
+
+	def get_lookahead(self, tree, terminal_equity, batch_size):
+		''' Gives lookahead for the tree. Lookahead is taken from the pool (if the
+			pool has lookahead of the same structure) or it is built
+		@param: Node           :root node of tree
+		@param: TerminalEquity :object that evaluates rewards with specified board (or list, see Lookahead.__init__)
+		@param: int            :batch of how many situations are evaluated simultaneously
+		@return Lookahead      :lookahead, that should be returned with self.release()
+		'''
+		if self.pid != os.getpid():
+			self.clear()
+		signature = self.get_tree_signature(tree, terminal_equity, batch_size)
+		if self.lookaheads.get(signature):
+			lookahead = self.lookaheads[signature].pop()
+			if not self.lookaheads[signature]:
+				del self.lookaheads[signature]
+			self.size -= lookahead.get_nbytes()
+			lookahead.reuse(tree, terminal_equity)
+		else:
+			lookahead = Lookahead(tree, terminal_equity, batch_size)
+		lookahead.pool_signature = signature
+		return lookahead
+
+
+	def release(self, lookahead):
+		''' Returns lookahead into the pool (lookahead must not be used after that)
+		@param: Lookahead :lookahead given by self.get_lookahead()
+		'''
+		nbytes = lookahead.get_nbytes()
+		if nbytes > self.max_size or self.pid != os.getpid():
+			return
+		signature = lookahead.pool_signature
+		self.lookaheads.setdefault(signature, []).append(lookahead)
+		# mark as recently used
+		self.lookaheads.move_to_end(signature)
+		self.size += nbytes
+		self._evict()
+
+
+	def _evict(self):
+		''' Removes least recently used lookaheads, until pool fits into max size '''
+		while self.size > self.max_size:
+			signature, lookaheads = next(iter(self.lookaheads.items()))
+			self.size -= lookaheads.pop(0).get_nbytes()
+			if not lookaheads:
+				del self.lookaheads[signature]
+
+
+
+
+lookahead_pool = LookaheadPool()
@@ -5,7 +5,7 @@
 import time
 import numpy as np
 
-from Lookahead.lookahead import Lookahead
+from Lookahead.lookahead_pool import lookahead_pool
 from Lookahead.cfrd_gadget import CFRDGadget
 from Tree.tree_builder import PokerTreeBuilder
 from Settings.arguments import arguments
@@ -20,6 +20,7 @@ class Resolving():
 	def __init__(self, terminal_equity, verbose=0):
 		'''
 		@param: TerminalEquity :object that evaluates rewards with specified board
+				[TerminalEquity,...] :or terminal equity of every batch entry (board-batched, see Lookahead.__init__)
 		@param: int            :printing outputs if >0
 		'''
 		self.tree_builder = PokerTreeBuilder()
@@ -34,36 +35,45 @@ class Resolving():
 		build_tree_params = TreeParams()
 		build_tree_params.root_node = node
 		build_tree_params.limit_to_street = True
+		# street-limited trees are cached only if it is enabled (see arguments.tree_cache_size)
+		build_tree_params.use_cache = arguments.tree_cache_size > 0
 		self.lookahead_tree = self.tree_builder.build_tree(build_tree_params)
 
 
-	def resolve(self, node, player_range, opponent_range=None, opponent_cfvs=None):
+	def resolve(self, node, player_range, opponent_range=None, opponent_cfvs=None, time_budget=None, target_gap=None):
 		''' Creates lookahead and solves it
 		@param: Node             :root node of the tree
 		@param: [I]              :current player's range
 		@param: [I]              :opponent's range
-		@param: [I]              :opponent's cfvs (used to reconstruct opponent's range)
-		@return LookaheadResults :results
+		@param: [b,I]            :opponent's cfvs (used to reconstruct opponent's range, [I] if b = 1)
+		@param: float            :(optional) max time of re-solving in seconds
+		@param: float            :(optional) target gap, re-solving stops earlier when it is reached (see Lookahead._compute_gap)
+		@return LookaheadResults :results (with number of done iterations and last measured gap)
 		(only one of `opponent_range` and `opponent_cfvs` should be used)
 		'''
 		if opponent_range is not None:
 			if opponent_range.ndim != 2: raise(Exception('opponent_range has to have batch size as first dim. (can be 1)'))
 		if opponent_cfvs is not None:
-			if opponent_cfvs.ndim != 1: raise(Exception('opponent_cfvs has to have only one dimension of 1326 numbers.'))
+			if opponent_cfvs.ndim not in [1,2]: raise(Exception('opponent_cfvs has to have one dimension of 1326 numbers (or batch size as first dim.).'))
+			if opponent_cfvs.reshape([-1,constants.hand_count]).shape[0] != player_range.shape[0]: raise(Exception('opponent_cfvs has to have the same batch size as player_range.'))
 		if opponent_range is not None and opponent_cfvs is not None: raise(Exception('only 1 var can be passed'))
 		if opponent_range is None and opponent_cfvs is None: raise(Exception('one of those vars must be passed'))
 		# opponent_cfvs = None if we only need to resolve first node
 		batch_size = player_range.shape[0]
 		self._create_lookahead_tree(node)
-		self.lookahead = Lookahead(self.lookahead_tree, self.terminal_equity, batch_size)
+		# lookahead of the same tree structure is reused (see LookaheadPool)
+		self.lookahead = lookahead_pool.get_lookahead(self.lookahead_tree, self.terminal_equity, batch_size)
 		if self.verbose > 0: t0 = time.time()
 		if opponent_range is not None:
-			self.lookahead.resolve(player_range=player_range, opponent_range=opponent_range)
+			self.lookahead.resolve(player_range=player_range, opponent_range=opponent_range, time_budget=time_budget, target_gap=target_gap)
 			self.resolve_results = self.lookahead.get_results(reconstruct_opponent_cfvs=False)
 		else: # opponent_cfvs is not None:
-			self.lookahead.resolve(player_range=player_range, opponent_cfvs=opponent_cfvs)
+			self.lookahead.resolve(player_range=player_range, opponent_cfvs=opponent_cfvs, time_budget=time_budget, target_gap=target_gap)
 			self.resolve_results = self.lookahead.get_results(reconstruct_opponent_cfvs=True)
-		if self.verbose > 0: print('Resolve time: {}'.format(time.time() - t0))
+		# results are copies, so lookahead can be reused
+		lookahead_pool.release(self.lookahead)
+		self.lookahead = None
+		if self.verbose > 0: print('Resolve time: {}, iterations: {}, gap: {}'.format(time.time() - t0, self.resolve_results.num_iters, self.resolve_results.gap))
 		if self.verbose > 0:
 			batch = 0
 			print('printing batch:', batch)
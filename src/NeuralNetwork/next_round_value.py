@@ -34,19 +34,16 @@ class NextRoundValue():
 		''' same as in self._init_leaf_approximation_vars, just for all possible boards (in next street),
 			only difference: it creates cumulative cfvs for every next board '''
 		BC, PC, batch_size, HC = self.next_boards_count, constants.players_count, self.batch_size, constants.hand_count
+		M = self.num_current_boards
 		# init inputs and outputs to neural net
 		self.next_round_inputs = np.zeros([batch_size,BC,HC*PC + 1 + self.num_board_features], dtype=arguments.dtype)
 		self.next_round_values = np.zeros([batch_size,BC,PC,HC], dtype=arguments.dtype)
-		# handling board feature for nn [BC,69] and initing board masks (what hands are possible given that board)
-		next_boards_features = np.zeros([BC, self.num_board_features], dtype=arguments.dtype)
-		self.next_boards_mask = np.zeros([BC,HC], dtype=bool)
-		from tqdm import tqdm
-		for i, next_board in enumerate(tqdm(self.next_boards)):
-			next_boards_features[i] = card_tools.convert_board_to_nn_feature(next_board)
-			self.next_boards_mask[i] = card_tools.get_possible_hands_mask(next_board)
-		next_boards_features = np.expand_dims(next_boards_features, axis=0) # reshape: [B,69] -> [1,B,69]
-		# repeating next_boards_features: [ 1, B, 69 ] -> [ b, B, 69 ]
-		self.next_round_inputs[ : , : , PC*HC+1: ] = np.repeat(next_boards_features, batch_size, axis=0) # [ b, B, PxI +1+69 ] = [ b, B, 69 ]
+		# handling board feature for nn [M,BC,69] and initing board masks [M,BC,I] (what hands are possible given that board)
+		next_boards = self.next_boards.reshape([M*BC,-1])
+		next_boards_features = card_tools.convert_boards_to_nn_features(next_boards).astype(arguments.dtype).reshape([M,BC,-1])
+		self.next_boards_mask = card_tools.get_possible_hands_masks(next_boards).astype(bool).reshape([M,BC,HC])
+		# repeating next_boards_features: [ M, B, 69 ] -> [ b, B, 69 ] (b = pot sizes x M)
+		self.next_round_inputs[ : , : , PC*HC+1: ] = np.tile(next_boards_features, [batch_size // M, 1, 1]) # [ b, B, PxI +1+69 ] = [ b, B, 69 ]
 		# handling pot feature for nn
 		# repeating pot_sizes: [b,1] -> [b,B]
 		# [ b, B, P x I + 1 + 69 ] = [b,B] / scalar
@@ -62,33 +59,47 @@ class NextRoundValue():
 	def _init_leaf_approximation_vars(self):
 		''' init datastructures, where input is only single board (self.current_board) '''
 		PC, batch_size, HC = constants.players_count, self.batch_size, constants.hand_count
+		M = self.num_current_boards
 		# init inputs and outputs to neural net
 		self.current_round_inputs = np.zeros([batch_size, 1,HC*PC + 1 + self.num_board_features], dtype=arguments.dtype)
 		self.current_round_values = np.zeros([batch_size, 1,PC,HC], dtype=arguments.dtype)
-		# init current board's mask (possible hands, given that board)
-		self.current_board_mask = np.zeros([1,HC], dtype=bool)
-		self.current_board_mask[0] = card_tools.get_possible_hands_mask(self.current_board)
+		# init current board's mask [M,I] (possible hands, given that board)
+		if self.board_batched:
+			self.current_board_mask = card_tools.get_possible_hands_masks(self.current_board).astype(bool)
+			board_features = card_tools.convert_boards_to_nn_features(self.current_board) # [M,69]
+		else:
+			self.current_board_mask = np.zeros([1,HC], dtype=bool)
+			self.current_board_mask[0] = card_tools.get_possible_hands_mask(self.current_board)
+			board_features = card_tools.convert_board_to_nn_feature(self.current_board)
+			board_features = np.expand_dims(board_features, axis=0) # reshape: [69] -> [1,69]
 		# fill inputs with board features
-		board_features = card_tools.convert_board_to_nn_feature(self.current_board)
-		board_features = np.expand_dims(board_features, axis=0) # reshape: [69] -> [1,69]
-		self.current_round_inputs[ : , 0, PC*HC+1: ] = np.repeat(board_features, batch_size, axis=0) # repeat: [1,69] -> [b,69]
+		self.current_round_inputs[ : , 0, PC*HC+1: ] = np.tile(board_features, [batch_size // M, 1]) # repeat: [M,69] -> [b,69]
 		# fill pot sizes factored by stack size
 		self.current_round_inputs[ : , : , PC*HC ] = self.pot_sizes / arguments.stack
 		# init normalization (used to normalize values after masking with self.current_boards_mask)
-		self.leaf_nodes_sum_normalization = 1 / self.current_board_mask.sum()
+		# (all boards on the same street have the same number of possible hands)
+		self.leaf_nodes_sum_normalization = 1 / self.current_board_mask[0].sum()
 
 
 	def init_computation(self, board, pot_sizes, batch_size):
 		'''
-		@param: [0-5] :board with 0-5 card int values on it
-		@param: [b]   :pot sizes for each state (total states=b)
-		@param: int   :batch of how many situations are evaluated simultaneously (usually will be = 1)
+		@param: [0-5]   :board with 0-5 card int values on it
+				[b,0-5] :or board of every batch entry (boards are on the same street, see Lookahead)
+		@param: [b]     :pot sizes for each state (total states=b)
+		@param: int     :batch of how many situations are evaluated simultaneously (usually will be = 1)
 		'''
 		self.iter = 0
-		# setting up current board and possible next boards
+		# setting up current board and possible next boards ([B,0-5] or [M,B,0-5] for batch of boards)
 		self.current_board = board
-		self.next_boards = card_tools.get_next_round_boards(self.current_board)
-		self.next_boards_count = self.next_boards.shape[0]
+		self.board_batched = board.ndim == 2
+		if self.board_batched:
+			assert(board.shape[0] == batch_size)
+			self.next_boards = np.stack([ card_tools.get_next_round_boards(entry_board) for entry_board in board ])
+		else:
+			self.next_boards = card_tools.get_next_round_boards(self.current_board)
+		# number of different boards M (inputs of state i use board i % M)
+		self.num_current_boards = board.shape[0] if self.board_batched else 1
+		self.next_boards_count = self.next_boards.shape[-2]
 		# init pot sizes [b, 1], where p - number of pot sizes, b - batch size (here not the same as in other files)
 		self.pot_sizes = np.repeat(pot_sizes.reshape([-1,1]), batch_size, axis=1)
 		self.pot_sizes = self.pot_sizes.reshape([-1,1])
@@ -130,7 +141,8 @@ class NextRoundValue():
 		ranges = ranges.reshape([batch_size,1,PC,HC]) # [b,P,I] -> [b,1,P,I]
 		ranges = np.repeat(ranges, BC, axis=1) # [b,1,P,I] -> [b,B,P,I]
 		# mask ranges for not possible hands (given some board (from 2nd axis))
-		ranges *= mask.reshape([1,BC,1,HC]) # [b,B,P,I] *= [1,B,1,I]
+		M = self.num_current_boards
+		ranges.reshape([-1,M,BC,PC,HC])[...] *= mask.reshape([1,M,BC,1,HC]) # [b,B,P,I] *= [1,B,1,I] (for each board M)
 		# normalizing ranges
 		ranges_sum = np.sum(ranges, axis=3) # [b,B,P] = sum([b,B,P,I], axis=2)
 		# save var for later on to normalize output values (swaped just like at lookahead.get_results)
@@ -0,0 +1,142 @@
+'''
+	Batching front-end of re-solving for concurrent tables (see ContinualResolving).
+
+	Decisions at identical public states (same street, board, bets and acting
+	player), that arrive within a short window, are solved together as one
+	lookahead with batch size b > 1 (each decision is one batch entry with its
+	own player range and opponent cfvs, see CFRDGadget). Every table then gets
+	its own slice of the results (as if it was solved with b = 1).
+	Tables call BatchedResolving.resolve from their own threads: first decision
+	of the public state waits for the others and solves the batch, other
+	decisions wait for its results. Batches are solved one at a time.
+'''
+import threading
+import numpy as np
+
+from Settings.arguments import arguments
+from Lookahead.resolving import Resolving
+from helper_classes import LookaheadResults
+
+class PendingBatch():
+	def __init__(self):
+		self.player_ranges = [] # [[I],...] (range of every decision)
+		self.opponent_cfvs = [] # [[I],...] (opponent cfvs of every decision)
+		self.full = threading.Event() # set when batch reaches max size
+		self.done = threading.Event() # set when batch is solved
+		self.results = None # [LookaheadResults,...] (results of every decision)
+		self.error = None # Exception (raised while solving)
+
+
+class BatchedResolving():
+	def __init__(self, window=None, max_batch_size=None):
+		'''
+		@param: float :how long (in seconds) first decision waits for other decisions
+		@param: int   :max number of decisions solved together
+		'''
+		self.window = window if window is not None else arguments.batch_resolving_window
+		self.max_batch_size = max_batch_size if max_batch_size is not None else arguments.batch_resolving_max_size
+		# batches, that are collecting decisions {public state: PendingBatch}
+		self.pending = {}
+		self.lock = threading.Lock()
+		# lookahead pool and neural networks are shared, so batches are solved one at a time
+		self.solve_lock = threading.Lock()
+
+
+	def _get_public_state(self, node):
+		''' Gives key of the public state of the node
+		@param: Node  :root node of the decision
+		@return tuple :public state
+		'''
+		board = tuple(np.asarray(node.board).reshape([-1]).tolist())
+		return (node.street, board, tuple(node.bets.tolist()), node.current_player, node.num_bets)
+
+
+	def resolve(self, node, player_range, opponent_cfvs, terminal_equity, time_budget=None, target_gap=None):
+		''' Re-solves the node together with decisions of other tables at the same public state
+		@param: Node             :root node of the decision
+		@param: [I]              :current player's range
+		@param: [I]              :opponent's cfvs (used to reconstruct opponent's range)
+		@param: TerminalEquity   :terminal equity with the board of the node
+		@param: float            :(optional) max time of re-solving in seconds (the first decision's is used)
+		@param: float            :(optional) target gap (the first decision's is used, see Resolving.resolve)
+		@return LookaheadResults :results of this decision (with batch size 1)
+		'''
+		key = self._get_public_state(node)
+		with self.lock:
+			batch = self.pending.get(key)
+			is_first = batch is None
+			if is_first:
+				batch = PendingBatch()
+				self.pending[key] = batch
+			entry = len(batch.player_ranges)
+			batch.player_ranges.append(player_range)
+			batch.opponent_cfvs.append(opponent_cfvs)
+			if len(batch.player_ranges) >= self.max_batch_size:
+				# no more decisions can join
+				del self.pending[key]
+				batch.full.set()
+		if is_first:
+			batch.full.wait(self.window)
+			with self.lock:
+				if self.pending.get(key) is batch:
+					del self.pending[key]
+			try:
+				self._solve(node, batch, terminal_equity, time_budget, target_gap)
+			except Exception as e:
+				batch.error = e
+			finally:
+				batch.done.set()
+		else:
+			batch.done.wait()
+		if batch.error is not None:
+			raise(batch.error)
+		return batch.results[entry]
+
+
+	def _solve(self, node, batch, terminal_equity, time_budget, target_gap):
+		''' Solves all decisions of the batch in one lookahead
+		@param: Node           :root node (the same public state for all decisions)
+		@param: PendingBatch   :closed batch (no more decisions are added)
+		@param: TerminalEquity :terminal equity with the board of the node
+		@param: float          :max time of re-solving in seconds (or None)
+		@param: float          :target gap (or None)
+		'''
+		batch_size = len(batch.player_ranges)
+		player_ranges = np.stack(batch.player_ranges) # [b,I]
+		opponent_cfvs = np.stack(batch.opponent_cfvs) # [b,I]
+		with self.solve_lock:
+			resolving = Resolving(terminal_equity)
+			results = resolving.resolve(node, player_ranges, opponent_cfvs=opponent_cfvs, time_budget=time_budget, target_gap=target_gap)
+		batch.results = [ self._get_entry_results(results, entry, batch_size) for entry in range(batch_size) ]
+
+
+	def _get_entry_results(self, results, entry, batch_size):
+		''' Gives results of one batch entry
+		@param: LookaheadResults :results of the batch
+		@param: int              :index of the entry
+		@param: int              :batch size
+		@return LookaheadResults :results of the entry (with batch size 1)
+		'''
+		out = LookaheadResults()
+		e = slice(entry, entry+1)
+		out.strategy = results.strategy[ : , e ].copy()							# [A{0}, 1, I]
+		out.achieved_cfvs = results.achieved_cfvs[e].copy()						# [1, P, I]
+		out.children_cfvs = results.children_cfvs[ : , e ].copy()				# [A{0}, 1, I]
+		if results.root_cfvs is not None:
+			out.root_cfvs = results.root_cfvs[e].copy()							# [1, I]
+			out.root_cfvs_both_players = results.root_cfvs_both_players[e].copy()	# [1, P, I]
+		if results.next_street_cfvs is not None:
+			# rows of next street cfvs are [trans_nodes x b] -> [trans_nodes]
+			out.next_street_cfvs = results.next_street_cfvs[ entry::batch_size ].copy()
+		out.next_boards = results.next_boards
+		out.actions = results.actions
+		out.action_to_index = results.action_to_index
+		out.next_round_pot_sizes = results.next_round_pot_sizes
+		out.num_iters = results.num_iters
+		out.gap = results.gap
+		return out
+
+
+
+
+batched_resolving = BatchedResolving()
@@ -17,10 +17,15 @@ from Player.cache import Cache
 
 
 class ContinualResolving():
-	def __init__(self, verbose=1):
-		''' Does a depth-limited solve of the game's first node '''
+	def __init__(self, verbose=1, batched_resolving=None):
+		''' Does a depth-limited solve of the game's first node
+		@param: int               :verbosity level
+		@param: BatchedResolving  :(optional) shared by tables, that are played concurrently
+								   (decisions at the same public state are solved together)
+		'''
 		HC = constants.hand_count
 		self.verbose = verbose
+		self.batched_resolving = batched_resolving
 		self.uniform_range = np.full([HC], 1/HC, dtype=arguments.dtype)
 		self.terminal_equity = TerminalEquity()
 		self.cache = Cache(dir_path=arguments.cache_path)
@@ -62,10 +67,10 @@ class ContinualResolving():
 		else: # resolve_results.next_street_cfvs is not None:
 			print('LOADING FROM PREV RESULTS')
 			next_street_cfvs = resolve_results.next_street_cfvs
-		# save cfvs for particular board
-		for i, next_board in enumerate(resolve_results.next_boards):
-			if card_tools.same_boards(current_board, next_board):
-				board_cfvs = next_street_cfvs[:,i,:,:]
+		# save cfvs for particular board (next boards extend the board of previous street)
+		prev_board = current_board[ :constants.board_card_count[self.prev_street-1] ]
+		board_idx = card_tools.get_boards_indexes(prev_board, current_board)
+		board_cfvs = next_street_cfvs[ : , board_idx , : , : ]
 		# get next street root node outputs. shape = [self.num_pot_sizes * self.batch_size, P, I]
 		# convert action idx to batch index
 		action = resolve_results.actions[action_idx]
@@ -139,10 +144,16 @@ class ContinualResolving():
 		if node.street == 1 and self.cache.exists(node.bets):
 			print('LOADING RESOLVE FROM CACHE')
 			results = self.cache.get_resolve_results(node.bets)
+		elif self.batched_resolving is not None:
+			results = self.batched_resolving.resolve(node, self.player_range, self.opponent_cfvs, self.terminal_equity,
+													 time_budget=arguments.resolve_time_budget, target_gap=arguments.resolve_target_gap)
+			if node.street == 1:
+				self.cache.store_resolve_results(node.bets, results)
 		else:
 			self.resolving = Resolving(self.terminal_equity)
 			player_range = np.expand_dims(self.player_range, axis=0) # add batch dimension (b=1)
-			results = self.resolving.resolve(node, player_range, opponent_cfvs=self.opponent_cfvs)
+			results = self.resolving.resolve(node, player_range, opponent_cfvs=self.opponent_cfvs,
+											 time_budget=arguments.resolve_time_budget, target_gap=arguments.resolve_target_gap)
 			if node.street == 1:
 				self.cache.store_resolve_results(node.bets, results)
 		# (for testing)
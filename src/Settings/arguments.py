@@ -12,6 +12,10 @@ class Parameters():
 		# cached results path (caching only first street)
 		self.cache_path = './data/cache/'
 		# self.cache_path = r'D:\Datasets\Pystack\cache'
+		# decisions of concurrent tables at identical public states are solved together (see BatchedResolving):
+		# how long (in seconds) first decision waits for others and max number of decisions solved together
+		self.batch_resolving_window = 0.01
+		self.batch_resolving_max_size = 16
 		# GAME INFORMATION
 		# list of pot-scaled bet sizes to use in tree
 		self.bet_sizing = { 'preflop':[1], 'flop':[0.5], 'turn':[1], 'river':[1,2] }
@@ -21,6 +25,51 @@ class Parameters():
 		self.bb = 100
 		# the size of each player's stack, in chips
 		self.stack = 20000
+		# TERMINAL EQUITY
+		# kernel used to compute showdown values on the river:
+		# 'sorted' - hands are ranked once per board and values are computed with prefix sums (O(I))
+		# 'dense' - product with [I,I] equity matrix (O(I^2))
+		self.showdown_kernel = 'sorted'
+		# max memory (in MB) for temporary matrices used to create flop/turn equity matrix
+		# (all possible river boards are processed in chunks, that fit into this limit)
+		self.equity_memory_limit = 256
+		# number of threads used to create flop/turn equity matrix (1 = no thread pool)
+		self.equity_num_threads = 1
+		# max size (in MB) of sums of equity matrices of river boards with each card, that are kept after
+		# creating flop equity matrix, so turn equity matrix of the same hand is only selected (~88MB, 0 = not kept)
+		self.river_cache_size = 128
+		# rank of low-rank approximation of flop/turn equity matrix used in lookahead (0 = exact matrix)
+		self.equity_rank = 0
+		# max relative (frobenius) error of low-rank approximation, rank is chosen as the
+		# smallest rank within this tolerance (limited by equity_rank if set, 0 = not used)
+		self.equity_rank_tolerance = 0
+		# cache flop/turn equity matrices on disk (shared by isomorphic boards and by all processes)
+		self.use_equity_cache = False
+		self.equity_cache_path = './data/equity_cache/'
+		# max size of equity cache (in MB), least recently used matrices are removed (~7MB per matrix)
+		self.equity_cache_max_size = 4096
+		# LOOKAHEAD
+		# number of threads used in every cfr iteration of lookahead (1 = single-threaded).
+		# element-wise computations are split along hand axis and call/fold values are computed concurrently.
+		# it is set per process, so with multiple data generation processes use about cpu_count / num_processes
+		self.lookahead_num_threads = 1
+		# evaluation of next street/round values (neural network) in lookahead iterations:
+		# 'sync' - neural network is evaluated before terminal equity
+		# 'async' - neural network is evaluated in worker thread, while terminal equity is computed (same results as 'sync')
+		# 'stale' - neural network is evaluated in worker thread during the rest of the iteration and its values
+		# are used in next iteration (values are one iteration stale, first iteration is evaluated synchronously)
+		self.nn_evaluation_mode = 'sync'
+		# max size (in MB) of built lookaheads, that are kept and reused for trees with the same structure
+		# (see LookaheadPool, least recently used lookaheads are removed, 0 = not kept, e.g. 256)
+		self.lookahead_pool_size = 0
+		# max number of built street-limited trees, that are kept and reused (see PokerTreeBuilder.build_tree, 0 = not kept, e.g. 64)
+		self.tree_cache_size = 0
+		# early stopping of re-solving in live play (see ContinualResolving, None = always run cfr_iters):
+		# max time (in seconds) of one re-solve and target gap (max relative change of average root cfvs
+		# between two checks, see Lookahead._compute_gap). checks are done every `resolve_check_iters` averaged iterations
+		self.resolve_time_budget = None
+		self.resolve_target_gap = None
+		self.resolve_check_iters = 10
 		# NEURAL NETWORK
 		self.XLA = True
 		# path to the neural net model
@@ -64,6 +113,9 @@ class Parameters():
 		# TOTAL SITUATIONS = different_boards x batch_size
 		# how many files to create (single element = ~22kB)
 		self.gen_num_files = 1
+		# how many different boards (on the same street) are solved in one board-batched lookahead
+		# (tree and python overhead of cfr iterations is shared, total batch = boards x gen_batch_size)
+		self.gen_boards_per_solve = 1
 
 		assert(self.gen_different_boards % self.gen_num_files == 0)
 
@@ -0,0 +1,126 @@
+'''
+	Persistent on-disk cache of flop/turn equity matrices.
+
+	Matrices are stored as '.npy' files keyed by canonical board (see Game.suit_isomorphism),
+	so all isomorphic boards share one file. Files are opened memory-mapped, so
+	processes that read the same matrix share the OS page cache instead of
+	each holding a private copy. Writes are atomic (temp file + rename), so
+	concurrent processes never read partially written matrices. When the
+	total size exceeds the limit, least recently used files are removed
+	(access time is tracked by file modification time).
+'''
+import os
+import numpy as np
+try:
+	import fcntl
+except ImportError: # not available on windows (eviction is then not serialized between processes)
+	fcntl = None
+
+from Settings.arguments import arguments
+from Settings.constants import constants
+from Game.card_tools import card_tools
+from Game.suit_isomorphism import suit_isomorphism
+
+class EquityCache():
+	def __init__(self, dir_path=None, max_size=None):
+		''' Creates cache in given directory
+		@param: str :directory, where matrices are stored
+		@param: int :max size of all stored matrices (in MB)
+		'''
+		self.dir_path = dir_path if dir_path is not None else arguments.equity_cache_path
+		max_size = max_size if max_size is not None else arguments.equity_cache_max_size
+		self.max_size = max_size * 1024 * 1024
+		os.makedirs(self.dir_path, exist_ok=True)
+		self._lock_path = os.path.join(self.dir_path, '.lock')
+
+
+	def _get_file_path(self, canonical_board):
+		''' Gives file path of the matrix for canonical board
+		@param: [0-5] :canonical board
+		@return str   :path to '.npy' file (ex: './data/equity_cache/flop_0-4-8.npy')
+		'''
+		street_name = ['preflop','flop','turn','river'][card_tools.board_to_street(canonical_board)-1]
+		name = '-'.join([str(int(card)) for card in canonical_board])
+		return os.path.join(self.dir_path, '{}_{}.npy'.format(street_name, name))
+
+
+	def get(self, board):
+		''' Loads equity matrix for the board, if it is cached
+		@param: [0-5] :vector of board cards (int)
+		@return [I,I] :equity matrix (read-only memory map if board
+				is already canonical) or None if matrix is not cached
+		'''
+		canonical_board, permutation = suit_isomorphism.get_canonical_board(board)
+		path = self._get_file_path(canonical_board)
+		try:
+			matrix = np.load(path, mmap_mode='r')
+		except (OSError, ValueError):
+			# not cached (or removed by other process in the meantime, or not readable)
+			return None
+		try:
+			# mark as recently used
+			os.utime(path)
+		except OSError:
+			# read-only cache (matrix can be used, it is only not marked)
+			pass
+		if matrix.shape != (constants.hand_count, constants.hand_count):
+			return None
+		if permutation == suit_isomorphism.identity:
+			return matrix
+		return suit_isomorphism.from_canonical_matrix(matrix, permutation)
+
+
+	def store(self, board, matrix):
+		''' Stores equity matrix for the board (and all its isomorphic boards)
+		@param: [0-5] :vector of board cards (int)
+		@param: [I,I] :equity matrix for the board
+		'''
+		canonical_board, permutation = suit_isomorphism.get_canonical_board(board)
+		path = self._get_file_path(canonical_board)
+		if os.path.exists(path):
+			return
+		canonical_matrix = suit_isomorphism.to_canonical_matrix(matrix, permutation)
+		# write to unique temp file and atomically replace target
+		tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+		try:
+			with open(tmp_path, 'wb') as f:
+				np.save(f, canonical_matrix.astype(arguments.dtype))
+			os.replace(tmp_path, path)
+			self._evict(keep_path=path)
+		except OSError:
+			# read-only or full cache directory (matrix is only not cached)
+			if os.path.exists(tmp_path):
+				os.remove(tmp_path)
+
+
+	def _evict(self, keep_path=None):
+		''' Removes least recently used matrices, until cache fits into max size
+		@param: str :path of matrix, that is not removed (just stored matrix)
+		'''
+		with open(self._lock_path, 'a') as lock_file:
+			if fcntl is not None:
+				fcntl.flock(lock_file, fcntl.LOCK_EX)
+			try:
+				files = []
+				for entry in os.scandir(self.dir_path):
+					if entry.name.endswith('.npy') and entry.path != keep_path:
+						try:
+							stat = entry.stat()
+						except FileNotFoundError:
+							continue
+						files.append([stat.st_mtime, stat.st_size, entry.path])
+				total_size = sum([size for _, size, _ in files])
+				if keep_path is not None and os.path.exists(keep_path):
+					total_size += os.path.getsize(keep_path)
+				for _, size, path in sorted(files):
+					if total_size <= self.max_size:
+						break
+					try:
+						os.remove(path)
+					except OSError:
+						# already removed or still memory-mapped (windows)
+						continue
+					total_size -= size
+			finally:
+				if fcntl is not None:
+					fcntl.flock(lock_file, fcntl.LOCK_UN)
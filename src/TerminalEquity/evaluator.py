@@ -10,22 +10,8 @@ from Game.card_tools import card_tools
 
 class Evaluator():
 	def __init__(self):
-		self._texas_lookup = np.load('src/TerminalEquity/matrices/texas_lookup.npy')
-		self._idx_to_cards = self._create_index_to_cards_matrix()
-
-
-	def _create_index_to_cards_matrix(self):
-		''' Returns matrix that maps hand index to players hand
-		@return [I,2] :matrix that maps [hand_idx] -> [card_1, card_2]
-		'''
-		HC, HCC, CC = constants.hand_count, constants.hand_card_count, constants.card_count
-		out = np.zeros([HC,HCC], dtype=arguments.dtype)
-		for card1 in range(CC):
-			for card2 in range(card1+1,CC):
-				idx = card_tools.get_hand_index([card1,card2])
-				out[ idx , 0 ] = card1
-				out[ idx , 1 ] = card2
-		return out
+		# lookup table is memory mapped (read-only), so all processes share one physical copy
+		self._texas_lookup = np.asarray(np.load('src/TerminalEquity/matrices/texas_lookup.npy', mmap_mode='r'))
 
 
 	def evaluate(self, hands, mask):
@@ -44,33 +30,40 @@ class Evaluator():
 		return rank
 
 
+	def _walk_board(self, boards):
+		''' Walks lookup table through the board cards (once per board)
+		@param: [b,0-5] :batches of boards
+		@return [b]     :lookup states after the board cards
+		'''
+		# initial state (the first step of self.evaluate is `texas_lookup[card + 54]`)
+		state = np.full([boards.shape[0]], 53, dtype=self._texas_lookup.dtype)
+		for c in range(boards.shape[1]):
+			state = self._texas_lookup[ boards[ : , c ] + state + 1 ]
+		return state
+
+
 	def evaluate_board(self, board):
-		''' Evaluates each hand for particular board (or batches of boards)
+		''' Evaluates each hand for particular board (or batches of boards).
+			The board cards are walked only once per board, after that only
+			two steps (for both private cards) are done for every hand
 		@param: [0-5] or [b,0-5] :board (or batches of boards)
 		@return [I]   or [b,I]   :strength of all possible hands (or batches)
 		'''
-		HC, CC = constants.hand_count, constants.card_count
-		SC, HCC = constants.suit_count, constants.hand_card_count
-		if board.ndim == 2:
-			boards = board
-			batch_size = boards.shape[0]
-			hands = np.zeros([batch_size, HC, boards.shape[1] + HCC], dtype=arguments.int_dtype)
-			hands[ : , : ,  :boards.shape[1] ] = np.repeat(board.reshape([batch_size, 1, boards.shape[1]]), HC, axis=1)
-			hands[ : , : , -2: ] = np.repeat(self._idx_to_cards.reshape([1, HC, HCC]), batch_size, axis=0)
-			mask = np.zeros([batch_size,HC], dtype=bool)
-			for i, b in enumerate(boards):
-				mask[i] = card_tools.get_possible_hands_mask(b)
-			hands = hands.reshape([-1, board.shape[1] + HCC])
-			mask = mask.reshape([-1])
-			return self.evaluate(hands, mask).reshape([batch_size, HC])
-		elif board.ndim == 1:
-			hands = np.zeros([HC, board.shape[0] + HCC], dtype=arguments.int_dtype)
-			hands[ : ,  :board.shape[0] ] = np.repeat(board.reshape([1,board.shape[0]]), HC, axis=0)
-			hands[ : , -2: ] = self._idx_to_cards.copy()
-			mask = card_tools.get_possible_hands_mask(board)
-			return self.evaluate(hands, mask)
-		else:
-			assert(False) # weird board dim
+		hand_to_cards = card_tools.hand_to_cards
+		if board.ndim == 1:
+			return self.evaluate_board(board.reshape([1,-1]))[0]
+		assert(board.ndim == 2) # weird board dim
+		boards = board.astype(np.int64)
+		batch_size = boards.shape[0]
+		# [b,1] states after the board cards
+		state = self._walk_board(boards).reshape([batch_size,1])
+		# [b,I] two steps for private cards of each hand
+		rank = self._texas_lookup[ hand_to_cards[ : , 0 ].reshape([1,-1]) + state + 1 ]
+		rank = self._texas_lookup[ hand_to_cards[ : , 1 ].reshape([1,-1]) + rank + 1 ]
+		# [b,I] mask out hands, that collide with the board
+		rank *= card_tools.get_possible_hands_masks(boards).astype(bool)
+		rank *= -1
+		return rank
 
 
 
@@ -0,0 +1,231 @@
+'''
+	Offline generation of matrices used by TerminalEquity and Evaluator:
+	- block_matrix.npy : [I,I] boolean mask of hands, that do not share any card
+	- pf_equity.npy    : [I,I] preflop equity matrix (exhaustive over all river boards)
+	- texas_lookup.npy : 7 card lookup table (only validated, not generated)
+	Artifacts are written atomically together with a versioned manifest,
+	that holds their checksums (see MatricesGenerator.verify).
+'''
+import os
+import json
+import hashlib
+import itertools
+import multiprocessing
+import numpy as np
+
+from Settings.arguments import arguments
+from Settings.constants import constants
+from Game.card_tools import card_tools
+from Game.card_combinations import card_combinations
+from Game.suit_isomorphism import suit_isomorphism
+from TerminalEquity.evaluator import evaluator
+
+MATRICES_VERSION = 1
+MATRICES_DIR = 'src/TerminalEquity/matrices'
+MANIFEST_FILENAME = 'manifest.json'
+# number of all 7 card combinations for each hand category (high card, pair, ..., straight flush)
+SEVEN_CARD_CATEGORY_COUNTS = [23294460, 58627800, 31433400, 6461620, 6180020, 4047644, 3473184, 224848, 41584]
+
+
+def _sum_canonical_rows(boards):
+	''' Sums equity rows of canonical hands against all hands over given river boards.
+		Module level function, so it can be used in process pool
+	@param: [B,5] :river boards
+	@return [K,I] :(int) sum of equity rows for canonical hands (K = 169)
+	@return [10]  :number of evaluated (board, hand) pairs for each hand category
+	'''
+	HC = constants.hand_count
+	canonical_hands = matrices_generator.canonical_hands
+	K = canonical_hands.shape[0]
+	rows = np.zeros([K,HC], dtype=np.int64)
+	categories = np.zeros([10], dtype=np.int64)
+	# [c,K,I] int8 matrix + 2 boolean [c,K,I] matrices for every chunk
+	chunk_size = max(int(arguments.equity_memory_limit * 1024 * 1024 / (3 * K * HC)), 1)
+	for i in range(0, boards.shape[0], chunk_size):
+		strength = evaluator.evaluate_board(boards[ i:i+chunk_size ]) # [c,I]
+		possible_mask = strength < 0
+		categories += np.bincount((-strength[possible_mask]) >> 12, minlength=10)[:10]
+		strength_view_1 = np.expand_dims(strength[ : , canonical_hands ], axis=2) # [c,K,1]
+		strength_view_2 = np.expand_dims(strength, axis=1) # [c,1,I]
+		wins = np.greater(strength_view_1, strength_view_2)
+		losses = np.less(strength_view_1, strength_view_2)
+		matrix = np.subtract(wins.view(np.int8), losses.view(np.int8))
+		del wins, losses
+		matrix *= np.expand_dims(possible_mask[ : , canonical_hands ], axis=2)
+		matrix *= np.expand_dims(possible_mask, axis=1)
+		rows += matrix.sum(axis=0, dtype=np.int32)
+	return rows, categories
+
+
+
+class MatricesGenerator():
+	def __init__(self):
+		HC = constants.hand_count
+		# every hand is isomorphic to one of 169 canonical hands (ex: 'AsKs' ~ 'AhKh')
+		# [I] canonical hand of every hand and [I] index of permutation that transforms hand to it
+		hand_permutations = suit_isomorphism.hand_permutations
+		self._hand_to_canonical = hand_permutations.min(axis=0)
+		self._hand_to_permutation = hand_permutations.argmin(axis=0)
+		# [K] canonical hands
+		self.canonical_hands = np.unique(self._hand_to_canonical)
+
+
+	def create_block_matrix(self):
+		''' Creates boolean mask matrix for hands, that cannot be available
+			if particular cards where used. (ex: if hand1 is 'KsQs', then all
+			hand combinations with 'Ks' or 'Qs' should not be available).
+			Cards of every hand are packed into bits of 64 bit integer
+		@return [I,I] :boolean mask for possible hands
+		'''
+		hand_to_cards = card_tools.hand_to_cards.astype(np.uint64)
+		# [I] bit mask of cards for every hand
+		hand_bits = np.left_shift(np.uint64(1), hand_to_cards[ : , 0 ])
+		hand_bits |= np.left_shift(np.uint64(1), hand_to_cards[ : , 1 ])
+		# [I,I] hands do not share any card
+		return np.bitwise_and(hand_bits.reshape([-1,1]), hand_bits.reshape([1,-1])) == 0
+
+
+	def get_all_boards(self, num_cards=5):
+		''' Gives all boards with given number of cards (in lexicographical order)
+		@param: int   :number of board cards
+		@return [B,k] :all boards
+		'''
+		CC = constants.card_count
+		num_boards = card_combinations.choose(CC, num_cards)
+		boards = np.fromiter(itertools.chain.from_iterable(itertools.combinations(range(CC), num_cards)), dtype=arguments.int_dtype, count=num_boards*num_cards)
+		return boards.reshape([num_boards, num_cards])
+
+
+	def create_pf_equity(self, num_processes=1, boards=None, tasks_size=20000):
+		''' Creates preflop equity matrix. It is the sum of equity matrices of all
+			river boards (normalized as in TerminalEquity._set_transitioning_equity_matrix).
+			Matrix is invariant to suit permutations, so only rows of 169 canonical
+			hands are computed, other rows are their permuted copies
+		@param: int   :number of processes (boards are split between them)
+		@param: [B,5] :river boards (must be closed under suit permutations), defaults to all
+		@param: int   :number of boards in one task of process pool
+		@return [I,I] :preflop equity matrix
+		@return [10]  :number of evaluated (board, hand) pairs for each hand category
+		'''
+		HC = constants.hand_count
+		boards = self.get_all_boards() if boards is None else boards
+		tasks = [ boards[ i:i+tasks_size ] for i in range(0, boards.shape[0], tasks_size) ]
+		if num_processes > 1:
+			with multiprocessing.Pool(num_processes) as pool:
+				results = list(pool.imap_unordered(_sum_canonical_rows, tasks))
+		else:
+			results = list(map(_sum_canonical_rows, tasks))
+		rows = sum([ r for r, _ in results ])
+		categories = sum([ c for _, c in results ])
+		# [I,I] row of every hand is permuted row of its canonical hand
+		row_idxs = np.searchsorted(self.canonical_hands, self._hand_to_canonical)
+		permuted_hands = suit_isomorphism.hand_permutations[ self._hand_to_permutation ] # [I,I]
+		equity_sum = np.take_along_axis(rows[row_idxs], permuted_hands, axis=1)
+		# normalize sum and zero hands, that share cards
+		pf_equity = (equity_sum / card_combinations.count_last_boards_possible_boards(1)).astype(arguments.dtype)
+		pf_equity *= self.create_block_matrix()
+		return pf_equity, categories
+
+
+	def validate_texas_lookup(self, texas_lookup, num_samples=100000, categories=None):
+		''' Validates 7 card lookup table. Random 7 card hands must be evaluated the same,
+			regardless of order of the cards and of suit permutations. If number of
+			evaluated hands for each category is given (see self.create_pf_equity),
+			it must match the number of all 7 card hands in each category
+		@param: [N]   :lookup table
+		@param: int   :number of random 7 card hands
+		@param: [10]  :number of evaluated (river board, hand) pairs for each hand category
+		@return list  :errors (empty if lookup table is valid)
+		'''
+		CC, errors = constants.card_count, []
+		def evaluate(cards):
+			rank = texas_lookup[ cards[ : , 0 ] + 54 ]
+			for c in range(1, cards.shape[1]):
+				rank = texas_lookup[ cards[ : , c ] + rank + 1 ]
+			return rank
+		rng = np.random.RandomState(0)
+		cards = np.argsort(rng.rand(num_samples, CC), axis=1)[ : , :7 ]
+		rank = evaluate(cards)
+		if np.any(rank <= 0):
+			errors.append('some 7 card hands have non-positive rank')
+		shuffled_cards = np.take_along_axis(cards, np.argsort(rng.rand(num_samples, 7), axis=1), axis=1)
+		if np.any(evaluate(shuffled_cards) != rank):
+			errors.append('rank depends on order of cards')
+		permutations = rng.randint(suit_isomorphism.suit_permutations.shape[0], size=[num_samples,1])
+		if np.any(evaluate(suit_isomorphism.card_permutations[ permutations, cards ]) != rank):
+			errors.append('rank depends on suits')
+		if categories is not None:
+			# every 7 card hand is evaluated for each of its C(7,5) = 21 boards
+			expected = np.array([0] + SEVEN_CARD_CATEGORY_COUNTS) * card_combinations.choose(7,5)
+			if np.any(categories != expected):
+				errors.append('wrong number of 7 card hands in categories: {}'.format(categories // card_combinations.choose(7,5)))
+		return errors
+
+
+	def _get_checksum(self, path):
+		''' Computes sha256 checksum of the file '''
+		sha256 = hashlib.sha256()
+		with open(path, 'rb') as f:
+			for block in iter(lambda: f.read(1024*1024), b''):
+				sha256.update(block)
+		return sha256.hexdigest()
+
+
+	def _save_matrix(self, name, matrix, dir_path):
+		''' Saves matrix atomically (other processes never load partially written file) '''
+		path = os.path.join(dir_path, name)
+		tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+		with open(tmp_path, 'wb') as f:
+			np.save(f, matrix)
+		os.replace(tmp_path, path)
+
+
+	def save(self, matrices, dir_path=MATRICES_DIR):
+		''' Saves matrices and updates manifest with their checksums
+		@param: dict :{filename: matrix} (matrix can be None, then only checksum of existing file is saved)
+		@param: str  :directory of matrices
+		'''
+		manifest_path = os.path.join(dir_path, MANIFEST_FILENAME)
+		manifest = { 'version': MATRICES_VERSION, 'files': {} }
+		if os.path.exists(manifest_path):
+			with open(manifest_path, 'r') as f:
+				manifest['files'] = json.load(f)['files']
+		for name, matrix in matrices.items():
+			if matrix is not None:
+				self._save_matrix(name, matrix, dir_path)
+			matrix = np.load(os.path.join(dir_path, name), mmap_mode='r')
+			manifest['files'][name] = {
+				'sha256': self._get_checksum(os.path.join(dir_path, name)),
+				'shape': list(matrix.shape),
+				'dtype': str(matrix.dtype)
+			}
+		with open(manifest_path + '.tmp', 'w') as f:
+			json.dump(manifest, f, indent=4, sort_keys=True)
+		os.replace(manifest_path + '.tmp', manifest_path)
+
+
+	def verify(self, dir_path=MATRICES_DIR):
+		''' Verifies matrices against checksums in manifest
+		@param: str  :directory of matrices
+		@return list :errors (empty if all matrices are valid)
+		'''
+		manifest_path = os.path.join(dir_path, MANIFEST_FILENAME)
+		if not os.path.exists(manifest_path):
+			return ['manifest does not exist']
+		with open(manifest_path, 'r') as f:
+			manifest = json.load(f)
+		errors = []
+		if manifest['version'] != MATRICES_VERSION:
+			errors.append('version of matrices is {} (expected {})'.format(manifest['version'], MATRICES_VERSION))
+		for name, info in manifest['files'].items():
+			path = os.path.join(dir_path, name)
+			if not os.path.exists(path):
+				errors.append('{} does not exist'.format(name))
+			elif self._get_checksum(path) != info['sha256']:
+				errors.append('{} has wrong checksum'.format(name))
+		return errors
+
+
+
+
+matrices_generator = MatricesGenerator()
@@ -3,8 +3,12 @@
 '''
 import os
 import numpy as np
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from TerminalEquity.evaluator import evaluator
+from TerminalEquity.equity_cache import EquityCache
+from TerminalEquity.matrices_generator import matrices_generator
 from Settings.arguments import arguments
 from Settings.constants import constants
 from Game.card_tools import card_tools
@@ -12,13 +16,21 @@ from Game.card_combinations import card_combinations
 
 class TerminalEquity():
 	def __init__(self):
+		# matrices are memory mapped (read-only), so all processes share one physical copy
 		# load preflop matrix
-		self._pf_equity = np.load('src/TerminalEquity/matrices/pf_equity.npy')
+		self._pf_equity = np.asarray(np.load('src/TerminalEquity/matrices/pf_equity.npy', mmap_mode='r'))
 		# load card blocking matrix from disk if exists
 		if os.path.exists('src/TerminalEquity/matrices/block_matrix.npy'):
-			self._block_matrix = np.load('src/TerminalEquity/matrices/block_matrix.npy')
+			self._block_matrix = np.asarray(np.load('src/TerminalEquity/matrices/block_matrix.npy', mmap_mode='r'))
 		else:
-			self._block_matrix = self._create_block_matrix()
+			self._block_matrix = matrices_generator.create_block_matrix()
+		# persistent cache of flop/turn equity matrices
+		self.equity_cache = EquityCache() if arguments.use_equity_cache else None
+		# sums of equity matrices of river boards of the last flop with each card (reused for turn of the same hand)
+		self._river_card_sums = None
+		self._card_sums_lock = threading.Lock()
+		# scratch arrays of showdown/fold kernels (see self._get_buffer)
+		self._buffers = {}
 
 
 	def set_board(self, board):
@@ -26,24 +38,38 @@ class TerminalEquity():
 		@param: [0-5] :vector of board cards (int)
 		'''
 		self.board, street, HC = board, card_tools.board_to_street(board), constants.hand_count
+		self._showdown = None
+		self._low_rank_equity, self.low_rank_error = None, None
+		self._buffers = {}
 		# set equity matrix
 		if street == 1:
 			self.equity_matrix = self._pf_equity
+			# new hand
+			self._river_card_sums = None
 		elif street == constants.streets_count:
-			self.equity_matrix = np.zeros([HC,HC], dtype=arguments.dtype)
-			self._set_last_round_equity_matrix(self.equity_matrix, board)
-			self._handle_blocking_cards(self.equity_matrix, board)
+			# river matrix is created only when it is needed (see self.get_equity_matrix)
+			self.equity_matrix = None
+			self._board_strength = evaluator.evaluate_board(board)
+			if arguments.showdown_kernel == 'sorted':
+				self._set_sorted_showdown(self._board_strength)
 		elif street == 2 or street == 3:
-			self.equity_matrix = np.zeros([HC,HC], dtype=arguments.dtype)
-			last_round_boards = card_tools.get_last_round_boards(board)
-			self._set_transitioning_equity_matrix(self.equity_matrix, last_round_boards, street)
-			self._handle_blocking_cards(self.equity_matrix, board)
+			self.equity_matrix = None
+			if self.equity_cache is not None:
+				self.equity_matrix = self.equity_cache.get(board)
+			if self.equity_matrix is None:
+				self.equity_matrix = np.zeros([HC,HC], dtype=arguments.dtype)
+				last_round_boards = card_tools.get_last_round_boards(board)
+				self._set_transitioning_equity_matrix(self.equity_matrix, last_round_boards, street)
+				self._handle_blocking_cards(self.equity_matrix, board)
+				if self.equity_cache is not None:
+					self.equity_cache.store(board, self.equity_matrix)
+			if arguments.equity_rank > 0 or arguments.equity_rank_tolerance > 0:
+				self._set_low_rank_equity(self.equity_matrix)
 		else:
 			assert(False) # bad street/board
-		# set fold matrix
-		self.fold_matrix = np.ones([HC,HC], dtype=arguments.dtype)
-		# setting cards that block each other to zero
-		self._handle_blocking_cards(self.fold_matrix, board)
+		# fold matrix is created only when it is needed (see self.get_fold_matrix)
+		self.fold_matrix = None
+		self._possible_hands_mask = card_tools.get_possible_hands_mask(board).astype(arguments.dtype)
 
 
 	def get_equity_matrix(self):
@@ -53,18 +79,95 @@ class TerminalEquity():
 				the first player when no player folds. For nodes in the first
 				betting round, the weighted average of all such possible matrices
 		'''
+		if self.equity_matrix is None:
+			HC = constants.hand_count
+			self.equity_matrix = np.zeros([HC,HC], dtype=arguments.dtype)
+			self._set_last_round_equity_matrix(self.equity_matrix, self._board_strength)
+			self._handle_blocking_cards(self.equity_matrix, self.board)
 		return self.equity_matrix
 
 
+	def get_call_values(self, ranges, allow_approximation=False, out=None):
+		''' Computes showdown values (when no player folds) for a batch of ranges.
+			Gives the same result as `np.dot(ranges, self.get_equity_matrix())`
+		@param: [N,I] :ranges of the player, against whom the values are computed
+		@param: bool  :use low-rank approximation of flop/turn equity matrix
+				(if enabled, see arguments.equity_rank and self.low_rank_error)
+		@param: [N,I] :(optional) preallocated array for the result
+		@return [N,I] :values of every hand against each of the ranges
+		'''
+		ranges = ranges.astype(arguments.dtype, copy=False)
+		if out is None:
+			out = np.empty([ranges.shape[0], constants.hand_count], dtype=arguments.dtype)
+		if allow_approximation and self._low_rank_equity is not None:
+			left, right = self._low_rank_equity
+			# [N,I] = dot_product( dot_product( [N,I], [I,k] ), [k,I] )
+			np.dot(np.dot(ranges, left, out=self._get_buffer('low_rank', [ranges.shape[0], left.shape[1]])), right, out=out)
+			out *= self._possible_hands_mask
+			return out
+		if self._showdown is not None:
+			return self._compute_sorted_showdown_values(ranges, out)
+		return np.dot(ranges, self.get_equity_matrix(), out=out)
+
+
 	def get_fold_matrix(self):
 		''' Returns the matrix which gives equity for any ranges
 		@return [I,I] :matrix `B` such that for player
 				ranges `x` and `y`, `x'Ay` is the equity
 				for the player who doesn't fold
 		'''
+		if self.fold_matrix is None:
+			HC = constants.hand_count
+			self.fold_matrix = np.ones([HC,HC], dtype=arguments.dtype)
+			# setting cards that block each other to zero
+			self._handle_blocking_cards(self.fold_matrix, self.board)
 		return self.fold_matrix
 
 
+	def get_fold_values(self, ranges, out=None):
+		''' Computes values for the player who doesn't fold for a batch of ranges.
+			Gives the same result as `np.dot(ranges, self.get_fold_matrix())`, but in O(I):
+			value = total mass - mass on card_1 - mass on card_2 + mass on the same hand
+		@param: [N,I] :ranges of the player, against whom the values are computed
+		@param: [N,I] :(optional) preallocated array for the result
+		@return [N,I] :values of every hand against each of the ranges
+		'''
+		N, HC, CC = ranges.shape[0], constants.hand_count, constants.card_count
+		hand_to_cards = card_tools.hand_to_cards
+		if out is None:
+			out = np.empty([N,HC], dtype=arguments.dtype)
+		# [N,I] = [N,I] * [I] (remove hands that collide with board)
+		possible_ranges = np.multiply(ranges, self._possible_hands_mask, out=self._get_buffer('possible_ranges', [N,HC]))
+		# [N,C] = dot_product( [N,I], [I,C] ) mass of hands that hold particular card
+		card_mass = np.dot(possible_ranges, card_tools.hand_card_matrix, out=self._get_buffer('card_mass', [N,CC]))
+		# [N,1] total mass
+		range_mass = np.sum(possible_ranges, axis=1, keepdims=True, out=self._get_buffer('range_mass', [N,1]))
+		# [N,I] mass on card of every hand
+		hand_card_mass = self._get_buffer('hand_card_mass', [N,HC])
+		# [N,I] = [N,1] - [N,I] - [N,I] + [N,I]
+		np.take(card_mass, hand_to_cards[:,0], axis=1, out=hand_card_mass, mode='clip')
+		np.subtract(range_mass, hand_card_mass, out=out)
+		np.take(card_mass, hand_to_cards[:,1], axis=1, out=hand_card_mass, mode='clip')
+		out -= hand_card_mass
+		out += possible_ranges
+		out *= self._possible_hands_mask
+		return out
+
+
+	def _get_buffer(self, name, shape):
+		''' Gives scratch array, that is reused by all calls with the same shape
+			(so repeated calls from lookahead iterations do not allocate memory)
+		@param: str  :name of the buffer
+		@param: list :shape of the buffer
+		@return [...] :uninitialized array
+		'''
+		buffer = self._buffers.get(name)
+		if buffer is None or buffer.shape != tuple(shape):
+			buffer = np.empty(shape, dtype=arguments.dtype)
+			self._buffers[name] = buffer
+		return buffer
+
+
 	def get_hand_strengths(self):
 		''' Get strengths of all hand combinations (I). The bigger the number is,
 			the stronger the hand is for particular board
@@ -72,40 +175,18 @@ class TerminalEquity():
 		@return [I] :strength for all hand combinations
 		'''
 		HC = constants.hand_count
-		return np.sum(self.equity_matrix, axis=0)
-
-
-	def _create_block_matrix(self):
-		''' Creates boolean mask matrix for hands, that cannot be available
-			if particular cards where used. (ex: if hand1 is 'KsQs', then all
-			hand combinations with 'Ks' or 'Qs' should not be available)
-		@return [I,I] :boolean mask for possible hands
-		'''
-		HC, CC = constants.hand_count, constants.card_count
-		out = np.ones([HC,HC], dtype=bool)
-		for p1_card1 in range(CC):
-			for p1_card2 in range(p1_card1+1, CC):
-				p1_idx = card_tools.get_hand_index([p1_card1, p1_card2])
-				for p2_card1 in range(CC):
-					for p2_card2 in range(p2_card1+1, CC):
-						p2_idx = card_tools.get_hand_index([p2_card1, p2_card2])
-						if p1_card1 == p2_card1 or p1_card1 == p2_card2 or \
-						   p1_card2 == p2_card1 or p1_card2 == p2_card2:
-						   out[p1_idx, p2_idx] = 0
-						   out[p2_idx, p1_idx] = 0
-		return out
+		# sum(equity_matrix, axis=0) is the same as call values against range of ones
+		return self.get_call_values(np.ones([1,HC], dtype=arguments.dtype))[0]
 
 
-	def _set_last_round_equity_matrix(self, equity_matrix, board_cards):
+	def _set_last_round_equity_matrix(self, equity_matrix, strength):
 		''' Constructs the matrix that turns player ranges into showdown equity.
 			Gives the matrix `A` such that for player ranges `x` and `y`, `x'Ay`
 			is the equity for the first player when no player folds
 		@param: [I,I] :matrix that needs to be modified
-		@param: [I,I] :board_cards a non-empty vector of board cards
+		@param: [I]   :strength of all hands for the last round board
 		'''
 		HC = constants.hand_count
-		# batch eval with only single batch, because its last round
-		strength = evaluator.evaluate_board(board_cards)
 		# handling hand stregths (winning probs)
 		strength_view_1 = strength.reshape([HC,1])
 		strength_view_2 = strength.reshape([1,HC])
@@ -114,39 +195,233 @@ class TerminalEquity():
 		equity_matrix[:,:] -= (strength_view_1 < strength_view_2).astype(int)
 
 
+	def _set_sorted_showdown(self, strength):
+		''' Ranks possible hands by strength (once per board) and creates index
+			tables that are used in self._compute_sorted_showdown_values
+		@param: [I] :strength of all hands for the last round board
+		'''
+		HC = constants.hand_count
+		possible_hands = np.nonzero(card_tools.get_possible_hands_mask(self.board))[0]
+		# sort possible hands by strength: [V], where V - number of possible hands
+		order = possible_hands[ np.argsort(strength[possible_hands], kind='stable') ]
+		sorted_strength = strength[order]
+		V = order.shape[0]
+		# [V] borders of groups with the same strength (start is inclusive, end is exclusive)
+		group_start = np.searchsorted(sorted_strength, sorted_strength, side='left')
+		group_end = np.searchsorted(sorted_strength, sorted_strength, side='right')
+		# [C,K] sorted positions of possible hands that hold each card (padded with V)
+		sorted_position = np.full([HC], V, dtype=np.int64)
+		sorted_position[order] = np.arange(V)
+		card_positions = np.sort(sorted_position[card_tools.card_to_hands], axis=1)
+		card_positions = card_positions[ : , :(card_positions < V).sum(axis=1).max() ]
+		# [C,K,K] sign(strength[k2] - strength[k1]) for every two hands that hold the same card
+		card_strength = np.append(sorted_strength, 0)[card_positions]
+		card_strength_1 = np.expand_dims(card_strength, axis=2)
+		card_strength_2 = np.expand_dims(card_strength, axis=1)
+		card_signs = (card_strength_2 > card_strength_1).astype(arguments.dtype)
+		card_signs -= (card_strength_2 < card_strength_1)
+		# [V,2] every hand is in 2 card lists, save its flat indexes in [C x K]
+		flat_positions = card_positions.reshape([-1])
+		card_slots = np.nonzero(flat_positions < V)[0]
+		card_slots = card_slots[ np.argsort(flat_positions[card_slots], kind='stable') ].reshape([V,2])
+		self._showdown = {
+			'order': order,
+			'group_start': group_start,
+			'group_end': group_end,
+			'card_positions': card_positions,
+			'card_signs': card_signs,
+			'card_slots': card_slots
+		}
+
+
+	def _compute_sorted_showdown_values(self, ranges, out):
+		''' Computes showdown values using hands sorted by strength.
+			For each hand: value = (mass of hands with bigger strength) - (mass of hands
+			with smaller strength), computed with prefix sums. Then the same value
+			over hands that share a card with it is removed (using small [K,K] sign
+			matrices for every card, where K is number of hands that hold that card)
+		@param: [N,I] :ranges of the player, against whom the values are computed
+		@param: [N,I] :array for the result
+		@return [N,I] :values of every hand against each of the ranges
+		'''
+		N, HC = ranges.shape[0], constants.hand_count
+		sd = self._showdown
+		V = sd['order'].shape[0]
+		# [I,N] transposed ranges (np.take would copy non-contiguous input)
+		ranges_t = self._get_buffer('ranges_t', [HC,N])
+		np.copyto(ranges_t, ranges.T)
+		# [V+1,N] sorted ranges (last row is zero, used for padding)
+		sorted_ranges = self._get_buffer('sorted_ranges', [V+1,N])
+		np.take(ranges_t, sd['order'], axis=0, out=sorted_ranges[ :V ], mode='clip')
+		sorted_ranges[V] = 0
+		# [V+1,N] prefix sums (first row is zero)
+		cumsum = self._get_buffer('cumsum', [V+1,N])
+		cumsum[0] = 0
+		np.cumsum(sorted_ranges[ :V ], axis=0, out=cumsum[ 1: ])
+		# [V,N] = (mass of bigger strength) - (mass of smaller strength)
+		values = self._get_buffer('values', [V,N])
+		gathered_values = self._get_buffer('gathered_values', [V,N])
+		np.take(cumsum, sd['group_end'], axis=0, out=values, mode='clip')
+		np.subtract(cumsum[V], values, out=values)
+		np.take(cumsum, sd['group_start'], axis=0, out=gathered_values, mode='clip')
+		values -= gathered_values
+		# [C,K,N] = [C,K,K] @ [C,K,N] same values, but only for hands that hold particular card
+		card_ranges = self._get_buffer('card_ranges', sd['card_positions'].shape + (N,))
+		np.take(sorted_ranges, sd['card_positions'], axis=0, out=card_ranges, mode='clip')
+		card_values = np.matmul(sd['card_signs'], card_ranges, out=self._get_buffer('card_values', card_ranges.shape)).reshape([-1,N])
+		np.take(card_values, sd['card_slots'][:,0], axis=0, out=gathered_values, mode='clip')
+		values -= gathered_values
+		np.take(card_values, sd['card_slots'][:,1], axis=0, out=gathered_values, mode='clip')
+		values -= gathered_values
+		# same signs as in equity matrix (see self._set_last_round_equity_matrix)
+		out.fill(0)
+		out[ : , sd['order'] ] = values.T
+		return out
+
+
+	def _set_low_rank_equity(self, equity_matrix, oversampling=10, power_iters=2, spectral_iters=10):
+		''' Creates low-rank approximation `L x R` of flop/turn equity matrix with rank from
+			arguments.equity_rank or arguments.equity_rank_tolerance. Uses randomized truncated SVD,
+			that costs O(I^2 k) instead of O(I^3) of full SVD (with tolerance, rank is doubled until
+			the tolerance is met). Errors of approximation are saved into self.low_rank_error:
+			'relative_error' - ||A - LR||_F / ||A||_F (exact)
+			'spectral_error' - ||A - LR||_2 (estimated from below with power iterations,
+				bound of ||x'(A - LR)||_2 for every range with ||x||_2 = 1)
+		@param: [I,I] :equity matrix
+		@param: int   :number of extra random vectors of the sketch
+		@param: int   :number of power iterations of the sketch (more accurate for slowly decaying spectrum)
+		@param: int   :number of power iterations used to estimate spectral error
+		'''
+		HC = constants.hand_count
+		matrix = equity_matrix.astype(np.float64)
+		norm = max(np.linalg.norm(matrix), 1e-12)
+		# fixed seed, so the same matrix always gives the same factors
+		rng = np.random.default_rng(0)
+		rank = arguments.equity_rank if arguments.equity_rank > 0 else 64
+		# factors are not cheaper than full matrix
+		while 2 * rank < HC:
+			# [I,l] orthonormal basis of (approximate) range of the matrix
+			q = np.linalg.qr(np.dot(matrix, rng.standard_normal([HC, min(rank + oversampling, HC)])))[0]
+			for _ in range(power_iters):
+				q = np.linalg.qr(np.dot(matrix.T, q))[0]
+				q = np.linalg.qr(np.dot(matrix, q))[0]
+			# [l,I] = dot_product( [l,I], [I,I] ) matrix projected onto the basis
+			projection = np.dot(q.T, matrix)
+			u, s, vt = np.linalg.svd(projection, full_matrices=False)
+			# [l+1] relative errors of all ranks: ||A - QB||_F^2 + (sum of squares of truncated singular values)
+			projection_error = max(norm**2 - np.sum(s**2), 0)
+			relative_errors = np.sqrt(projection_error + np.append(np.cumsum((s**2)[::-1])[::-1], 0)) / norm
+			if arguments.equity_rank_tolerance > 0:
+				if relative_errors[rank] <= arguments.equity_rank_tolerance:
+					# smallest rank within tolerance
+					rank = int(np.argmax(relative_errors <= arguments.equity_rank_tolerance))
+				elif arguments.equity_rank == 0:
+					# tolerance is not met, sketch with bigger rank
+					rank *= 2
+					continue
+			left = np.dot(q, u[ : , :rank ] * s[ :rank ])
+			right = vt[ :rank ]
+			# power iterations on the residual `A - LR`
+			x = rng.standard_normal([HC])
+			for _ in range(spectral_iters):
+				y = np.dot(matrix, x) - np.dot(left, np.dot(right, x))
+				x = np.dot(matrix.T, y) - np.dot(right.T, np.dot(left.T, y))
+				x /= max(np.linalg.norm(x), 1e-300)
+			self.low_rank_error = {
+				'rank': rank,
+				'relative_error': float(relative_errors[rank]),
+				'spectral_error': float(np.linalg.norm(np.dot(matrix, x) - np.dot(left, np.dot(right, x))))
+			}
+			self._low_rank_equity = (left.astype(arguments.dtype), np.ascontiguousarray(right).astype(arguments.dtype))
+			return
+		# exact matrix is used
+		self.low_rank_error = { 'rank': HC, 'relative_error': 0.0, 'spectral_error': 0.0 }
+		self._low_rank_equity = None
+
+
 	def _set_transitioning_equity_matrix(self, equity_matrix, last_round_boards, street):
 		''' Constructs the matrix that turns player ranges into showdown equity.
 			Gives the matrix `A` such that for player ranges `x` and `y`, `x'Ay`
 			is the equity for the first player when no player folds.
+			Last round boards are processed in chunks (see arguments.equity_memory_limit),
+			optionally using thread pool (see arguments.equity_num_threads).
+			Sums of river boards of the flop with each card are kept (see arguments.river_cache_size),
+			so turn of the same flop only selects the sum of its card
 		@param: [I,I] :matrix that needs to be modified
 		@param: [B,5] :all possible combinations in the last round/street
 		@param: int   :current round/street
 		'''
-		HC, num_boards = constants.hand_count, last_round_boards.shape[0]
-		BCC, CC = constants.board_card_count, constants.card_count
+		HC, CC, num_boards = constants.hand_count, constants.card_count, last_round_boards.shape[0]
+		num_possible_boards = card_combinations.count_last_boards_possible_boards(street)
+		cache = self._river_card_sums
+		if street == 3 and cache is not None and set(self.board[:3].tolist()) == cache['flop']:
+			# [I,I] sum of equity matrices of river boards, that hold turn card
+			equity_matrix[:,:] = cache['card_sums'][ self.board[3] ]
+			equity_matrix[:,:] *= (1 / num_possible_boards)
+			return
+		# [C,I,I] sums of river boards with each card (int8 is enough, every sum has at most 48 boards)
+		card_sums = None
+		if street == 2 and CC * HC * HC <= arguments.river_cache_size * 1024 * 1024:
+			card_sums = np.zeros([CC,HC,HC], dtype=np.int8)
 		# evaluating all possible last round boards
-		strength = evaluator.evaluate_board(last_round_boards) # [b,I]
+		strength = evaluator.evaluate_board(last_round_boards) # [B,I]
+		# split boards into chunks: [c,I,I] int8 matrix + 2 boolean [c,I,I] matrices for every chunk
+		chunk_size = int(arguments.equity_memory_limit * 1024 * 1024 / (3 * HC * HC))
+		chunk_size = min(max(chunk_size, 1), num_boards)
+		chunks = [ (strength[ i:i+chunk_size ], last_round_boards[ i:i+chunk_size ], card_sums) for i in range(0, num_boards, chunk_size) ]
+		sum_chunk = lambda chunk: self._sum_boards_equity(*chunk)
+		if arguments.equity_num_threads > 1 and len(chunks) > 1:
+			# numpy releases GIL, so chunks are computed in parallel
+			with ThreadPoolExecutor(max_workers=arguments.equity_num_threads) as pool:
+				chunks_equity = pool.map(sum_chunk, chunks)
+				equity_sum = sum(chunks_equity)
+		else:
+			equity_sum = sum(map(sum_chunk, chunks))
+		if card_sums is not None:
+			# every board is in sums of both of its river cards
+			equity_sum = card_sums.sum(axis=0, dtype=np.int32) // 2
+		equity_matrix[:,:] = equity_sum
+		# normalize sum
+		equity_matrix[:,:] *= (1 / num_possible_boards)
+		if card_sums is not None:
+			self._river_card_sums = {
+				'flop': set(self.board.tolist()),
+				'card_sums': card_sums
+			}
+
+
+	def _sum_boards_equity(self, strength, boards=None, card_sums=None):
+		''' Sums last round equity matrices of a chunk of boards
+		@param: [c,I]   :strength of all hands for each board in chunk
+		@param: [c,5]   :(optional) boards of the chunk (flop cards are first)
+		@param: [C,I,I] :(optional) sums of boards with each card, where the chunk is added
+		@return [I,I]   :(int) sum of equity matrices of all boards (or 0, if they were added to card sums)
+		'''
+		HC, num_boards = constants.hand_count, strength.shape[0]
 		# strength from player 1 perspective for all the boards and all the card combinations
 		strength_view_1 = strength.reshape([num_boards,HC,1])
 		# strength from player 2 perspective
 		strength_view_2 = strength.reshape([num_boards,1,HC])
-		#
-		player_possible_mask = (strength < 0).astype(int)
-
-		for i in range(num_boards):
-			possible_mask = player_possible_mask[i].reshape([1,HC]) * player_possible_mask[i].reshape([HC,1])
-			# handling hand stregths (winning probs)
-			matrix_mem = (strength_view_1[i] > strength_view_2[i]).astype(int)
-			matrix_mem *= possible_mask[i]
-			equity_matrix[:,:] += matrix_mem
-
-			matrix_mem = (strength_view_1[i] < strength_view_2[i]).astype(int)
-			matrix_mem *= possible_mask[i]
-			equity_matrix[:,:] -= matrix_mem
-		# normalize sum
-		num_possible_boards = card_combinations.count_last_boards_possible_boards(street)
-		equity_matrix[:,:] *= (1 / num_possible_boards)
-
+		# impossible hands for particular board have strength 0
+		possible_mask = strength < 0
+		# handling hand stregths (winning probs)
+		wins = np.greater(strength_view_1, strength_view_2)
+		losses = np.less(strength_view_1, strength_view_2)
+		# [c,I,I] = [c,I,I] - [c,I,I]
+		matrix = np.subtract(wins.view(np.int8), losses.view(np.int8))
+		del wins, losses
+		# [c,I,I] *= [c,I,1] * [c,1,I]
+		matrix *= possible_mask.reshape([num_boards,HC,1])
+		matrix *= possible_mask.reshape([num_boards,1,HC])
+		if card_sums is not None:
+			# every board is added to sums of both river cards
+			river_cards = boards[ : , 3: ]
+			for card in np.unique(river_cards):
+				card_sum = matrix[ np.any(river_cards == card, axis=1) ].sum(axis=0, dtype=np.int8)
+				with self._card_sums_lock:
+					card_sums[card] += card_sum
+			return 0
+		return matrix.sum(axis=0, dtype=np.int32)
 
 
 	def _handle_blocking_cards(self, matrix, board):
@@ -1,7 +1,9 @@
 '''
 	Builds a public tree for Texas-Holdem with limited bet sizes
 '''
+import copy
 import numpy as np
+from collections import OrderedDict
 
 from Settings.arguments import arguments
 from Settings.constants import constants
@@ -11,6 +13,10 @@ from Tree.strategy_filling import StrategyFilling
 
 from helper_classes import Node
 
+# street-limited trees without board {(street, bets, current player, num_bets, bet sizing, stack, ante): Node}
+# ordered from least recently used (see arguments.tree_cache_size)
+TREE_CACHE = OrderedDict()
+
 class PokerTreeBuilder():
 	def __init__(self):
 		pass
@@ -208,6 +214,16 @@ class PokerTreeBuilder():
 
 
 	def build_tree(self, params):
+		''' Builds the tree
+		@param: TreeParams :tree creation parameters
+		@return Node       :root node of the built tree
+		'''
+		if params.use_cache and params.limit_to_street:
+			return self._get_cached_tree(params)
+		return self._build_tree(params)
+
+
+	def _build_tree(self, params):
 		''' Builds the tree
 		@param: TreeParams :tree creation parameters
 		@return Node       :root node of the built tree
@@ -226,4 +242,41 @@ class PokerTreeBuilder():
 		return root
 
 
+	def _get_cached_tree(self, params):
+		''' Gives street-limited tree from cache (tree is built, if it is not cached).
+			Betting in street-limited tree does not depend on the board, so trees are
+			cached without board and board is attached to the copy of the root only.
+			Nodes below the root are shared between all returned trees, so they must
+			not be modified and their board is None
+		@param: TreeParams :tree creation parameters
+		@return Node       :root node of the tree
+		'''
+		node = params.root_node
+		# betting arguments are part of the key, so changed arguments do not give stale trees
+		bet_sizing = tuple(arguments.bet_sizing[card_to_string.street_to_name(node.street)])
+		key = (node.street, tuple(node.bets.tolist()), node.current_player, node.num_bets, bet_sizing, arguments.stack, arguments.ante)
+		if key in TREE_CACHE:
+			# mark as recently used
+			tree = TREE_CACHE[key]
+			TREE_CACHE.move_to_end(key)
+		else:
+			tree = self._build_tree(params)
+			self._remove_boards(tree)
+			TREE_CACHE[key] = tree
+			while len(TREE_CACHE) > arguments.tree_cache_size:
+				TREE_CACHE.popitem(last=False)
+		root = copy.copy(tree)
+		root.board = node.board.copy()
+		return root
+
+
+	def _remove_boards(self, node):
+		''' Removes board from all nodes of the tree (see self._get_cached_tree)
+		@param: Node :root of the (sub)tree
+		'''
+		node.board, node.board_string = None, None
+		for child in node.children:
+			self._remove_boards(child)
+
+
 tree_builder = PokerTreeBuilder()
@@ -21,19 +21,10 @@ class TreeCFR():
 		''' Gives a numerical index for a set of board cards.
 			(used only in self._get_terminal_equity)
 		@param: [3-5] :board a non-empty vector of cards
-		@return int   :the numerical index for the board
+		@return tuple :the numerical index for the board (unique for every board)
 		'''
-		CC = constants.card_count
-		used_cards = np.zeros([CC], dtype=arguments.dtype)
-		for i in range(board.shape[0] - 1):
-			used_cards[ board[i] ] = 1
-		ans = -1
-		for i in range(CC):
-			if used_cards[i] == 0:
-				ans += 1
-			if i == board[-1]:
-				return ans
-		return -1
+		# index of the board among all boards with the same number of cards
+		return board.shape[0], card_tools.get_boards_indexes(np.zeros([0]), board)
 
 	def _get_terminal_equity(self, node):
 		''' Gets an evaluator for player equities at a terminal node.
@@ -65,15 +56,12 @@ class TreeCFR():
 		if node.terminal:
 			terminal_equity = self._get_terminal_equity(node)
 			values = np.zeros_like(node.ranges)
+			# values of each player are computed against the opponent's range ([P,I] -> swapped [P,I])
 			if node.type == constants.node_types.terminal_fold:
-				fold_matrix = terminal_equity.get_fold_matrix()
-				values[ 0 , : ] = np.dot(node.ranges[1], fold_matrix)
-				values[ 1 , : ] = np.dot(node.ranges[0], fold_matrix)
-				result[ opponent_index ] *= -1
+				values[ : , : ] = terminal_equity.get_fold_values(node.ranges[ ::-1 ])
+				values[ opponent_index ] *= -1
 			else:
-				equity_matrix = terminal_equity.get_equity_matrix()
-				values[ 0 , : ] = np.dot(node.ranges[1], equity_matrix)
-				values[ 1 , : ] = np.dot(node.ranges[0], equity_matrix)
+				values[ : , : ] = terminal_equity.get_call_values(node.ranges[ ::-1 ])
 			values *= node.pot # multiply by the pot
 			node.cf_values = values.reshape(node.ranges.shape)
 		else:
@@ -75,16 +75,13 @@ class TreeValues():
 			assert (node.type == constants.node_types.terminal_fold or node.type == constants.node_types.terminal_call)
 			self.terminal_equity.set_board(node.board)
 			values = np.zeros_like(node.ranges)
+			# values of each player are computed against the opponent's range ([P,I] -> swapped [P,I])
 			if node.type == constants.node_types.terminal_fold:
 				opponent = 1 - node.current_player
-				fold_matrix = self.terminal_equity.get_fold_matrix()
-				values[ 0 , : ] = np.dot(node.ranges[1], fold_matrix)
-				values[ 1 , : ] = np.dot(node.ranges[0], fold_matrix)
+				values[ : , : ] = self.terminal_equity.get_fold_values(node.ranges[ ::-1 ])
 				values[ opponent ] *= -1
 			else:
-				equity_matrix = self.terminal_equity.get_equity_matrix()
-				values[ 0 , : ] = np.dot(node.ranges[1], equity_matrix)
-				values[ 1 , : ] = np.dot(node.ranges[0], equity_matrix)
+				values[ : , : ] = self.terminal_equity.get_call_values(node.ranges[ ::-1 ])
 			# multiply by the pot
 			values *= node.pot
 			node.cf_values = node.cf_values_br = values
@@ -49,6 +49,7 @@ class TreeParams():
 	def __init__(self):
 		self.root_node = None # Node obj
 		self.limit_to_street = None # boolean
+		self.use_cache = False # boolean (reuse street-limited trees, see PokerTreeBuilder.build_tree)
 
 class ResolvingParams():
 	def __init__(self):
@@ -69,10 +70,13 @@ class LookaheadResults():
 		self.children_cfvs = None 			# [A{0}, b, I]
 		# vars below are used to store next round cfvs
 		self.next_street_cfvs = None		# [b x trans_nodes, B, P, I]
-		self.next_boards = None				# [B, 0-5]
+		self.next_boards = None				# [B, 0-5] ([b, B, 0-5] for board-batched lookahead)
 		self.actions = None					# [A] (bets)
 		self.action_to_index = None			# {'bet size':'next_street_cfvs index'}
 		self.next_round_pot_sizes = None	# [b x trans_nodes, B]
+		# convergence of re-solving
+		self.num_iters = None				# int (number of done cfr iterations)
+		self.gap = None						# float (last measured gap, see Lookahead._compute_gap)
 
 	# def __str__(self):
 	# 	return 'strat\n {} \ncfvs\n {} \nroot_cfvs\n {} \nboth_P_root_cfvs\n {} \nchildren_cfvs\n {}'. \
@@ -100,19 +104,33 @@ class LookaheadLayer():
 		# construct_data_structures
 		# [A{d-1}, B{d-2}, NTNAN{d-2}, b, P, I]
 		self.ranges = None # [0 - d]
-		self.pot_size = None # [0 - d]
 		self.cfvs = None # [0 - d]
-		self.cfvs_avg = None # [0 - d]
+		self.cfvs_avg = None # [0 - 1]
+		# [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1, 1]
+		self.pot_size = None # [0 - d]
 		# [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1, I]
-		self.strategies_avg = None # [0 - d]
+		self.strategies_avg = None # [1 - 1]
 		self.current_strategy = None # [0 - d]
 		self.regrets = None # [0 - d]
+		# [A{d-1}, B{d-2}, NTNAN{d-2}, b, 1]
 		self.empty_action_mask = None # [0 - d]
-		# for terminal equity (2,)
+		# [A{d-1}, B{d-2}, NTNAN{d-2}] nodes, that exist in the tree
+		self.existing_nodes = None # [0 - d]
+		# for terminal equity (2,) start and end in terminal nodes buffer
 		self.term_call_idx = None # [1 - d]
 		self.term_fold_idx = None # [1 - d]
+		# [k] indexes of existing terminal nodes (in flattened terminal slice of layer)
+		self.term_call_nodes = None # [1 - d]
+		self.term_fold_nodes = None # [1 - d]
 		# _construct_transition_boxes
 		self.indices = None # (2,) [1 - d]
+		# _construct_work_buffers (preallocated memory and views, that are reused in every iteration)
+		self.work = None # [A{d-1}, B{d-2}, NTNAN{d-2}, b, I] [1 - d] (view of buffer shared by all layers)
+		self.regrets_sum = None # [1, B{d-2}, NTNAN{d-2}, b, I] [1 - d]
+		self.expected_cfvs = None # [1, B{d-2}, NTNAN{d-2}, b, P, I] [1 - d]
+		self.next_ranges_plan = None # (source, destination) views [0 - d-1]
+		self.expected_cfvs_plan = None # (source, destination) views [1 - d]
+		self.regrets_plan = None # (current cfvs, expected cfvs, destination) views [1 - d]
 
 
 
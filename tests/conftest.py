@@ -0,0 +1,24 @@
+'''
+	Tests import modules the same way as scripts (from `src` directory).
+'''
+import os
+import sys
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MATRICES_DIR = os.path.join(REPO_DIR, 'src', 'TerminalEquity', 'matrices')
+
+sys.path.insert(0, os.path.join(REPO_DIR, 'src'))
+
+
+@pytest.fixture
+def repo_dir(monkeypatch):
+	''' Runs test in repository directory (terminal equity tables are loaded with relative paths).
+		Test is skipped, when tables are not unzipped from texas_lookup.zip or written by
+		scripts/generate_matrices.py (see README)
+	'''
+	for name in ['texas_lookup.npy', 'pf_equity.npy']:
+		if not os.path.exists(os.path.join(MATRICES_DIR, name)):
+			pytest.skip('terminal equity tables are missing')
+	monkeypatch.chdir(REPO_DIR)
+	return REPO_DIR
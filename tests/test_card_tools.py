@@ -0,0 +1,93 @@
+'''
+	Equivalence tests of vectorized card tools (see Game/card_tools.py)
+	against straightforward per-board implementations.
+'''
+import itertools
+import numpy as np
+import pytest
+
+from Settings.arguments import arguments
+from Settings.constants import constants
+from Game.card_tools import card_tools
+from Game.suit_isomorphism import suit_isomorphism
+
+
+def get_possible_hands_mask_loop(board):
+	''' Reference: mask of hands, that do not share a card with the board (loop over all hands) '''
+	out = np.zeros([constants.hand_count], dtype=arguments.int_dtype)
+	for card1 in range(constants.card_count):
+		for card2 in range(card1+1, constants.card_count):
+			if card1 not in board and card2 not in board:
+				out[ card_tools.get_hand_index([card1, card2]) ] = 1
+	return out
+
+
+def random_boards(num_boards, num_cards, seed=0):
+	rng = np.random.default_rng(seed)
+	return np.stack([ np.sort(rng.choice(constants.card_count, num_cards, replace=False)) for _ in range(num_boards) ]).astype(arguments.int_dtype)
+
+
+@pytest.mark.parametrize('num_cards', [0,3,4,5])
+def test_possible_hands_masks(num_cards):
+	boards = random_boards(20, num_cards)
+	masks = card_tools.get_possible_hands_masks(boards)
+	for board, mask in zip(boards, masks):
+		assert np.array_equal(mask, get_possible_hands_mask_loop(board.tolist()))
+		assert np.array_equal(mask, card_tools.get_possible_hands_mask(board))
+	assert np.array_equal(card_tools.get_possible_hands_mask(np.zeros([])), np.ones([constants.hand_count]))
+
+
+@pytest.mark.parametrize('num_cards', [3,4,5])
+def test_possible_hands_masks_remap_all_boards(num_cards):
+	''' masks of all boards remapped to their canonical boards (batched) '''
+	boards = np.array(list(itertools.combinations(range(constants.card_count), num_cards)), dtype=np.int64)
+	chunk_size = 100000
+	for i in range(0, boards.shape[0], chunk_size):
+		chunk = boards[i:i+chunk_size]
+		canonical_boards, permutations = suit_isomorphism.get_canonical_boards(chunk)
+		masks = card_tools.get_possible_hands_masks(chunk)
+		canonical_masks = card_tools.get_possible_hands_masks(canonical_boards)
+		for p in np.unique(permutations):
+			selected = permutations == p
+			assert np.array_equal(suit_isomorphism.to_canonical_hands(masks[selected], p), canonical_masks[selected])
+
+
+def enumerate_boards_loop(board, num_cards):
+	''' Reference: board cards followed by every combination of remaining cards (in lexicographical order) '''
+	remaining_cards = [ card for card in range(constants.card_count) if card not in board ]
+	return np.array([ list(board) + list(cards) for cards in itertools.combinations(remaining_cards, num_cards - len(board)) ], dtype=arguments.int_dtype)
+
+
+STREET_BOARDS = [ np.zeros([]), np.array([3, 17, 40], dtype=arguments.int_dtype), np.array([40, 3, 17, 51], dtype=arguments.int_dtype) ]
+
+
+@pytest.mark.parametrize('board', STREET_BOARDS)
+def test_next_and_last_round_boards(board):
+	cards = board.tolist() if board.ndim > 0 else []
+	street = card_tools.board_to_street(board)
+	next_boards = card_tools.get_next_round_boards(board)
+	assert np.array_equal(next_boards, enumerate_boards_loop(cards, constants.board_card_count[street]))
+	if street < constants.streets_count - 1:
+		last_boards = card_tools.get_last_round_boards(board)
+		assert np.array_equal(last_boards, enumerate_boards_loop(cards, constants.board_card_count[-1]))
+	# memoized boards are read-only
+	assert not next_boards.flags.writeable
+
+
+@pytest.mark.parametrize('board', STREET_BOARDS)
+def test_boards_indexes_round_trip(board):
+	rng = np.random.default_rng(0)
+	street = card_tools.board_to_street(board)
+	all_boards = [ card_tools.get_next_round_boards(board) ]
+	if street < constants.streets_count - 1:
+		all_boards.append(card_tools.get_last_round_boards(board))
+	for boards in all_boards:
+		num_board_cards = boards.shape[1] - (board.shape[0] if board.ndim > 0 else 0)
+		indexes = np.arange(boards.shape[0])
+		assert np.array_equal(card_tools.get_boards_indexes(board, boards), indexes)
+		assert np.array_equal(card_tools.get_boards_from_indexes(board, indexes, boards.shape[1]), boards)
+		# new cards can be in any order (and single board gives single index)
+		shuffled = boards.copy()
+		shuffled[ : , boards.shape[1]-num_board_cards: ] = rng.permuted(shuffled[ : , boards.shape[1]-num_board_cards: ], axis=1)
+		assert np.array_equal(card_tools.get_boards_indexes(board, shuffled), indexes)
+		assert card_tools.get_boards_indexes(board, shuffled[-1]) == boards.shape[0] - 1
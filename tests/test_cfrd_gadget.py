@@ -0,0 +1,89 @@
+'''
+	Tests of opponent range reconstruction (see Lookahead/cfrd_gadget.py)
+	against hand-computed steps of the CFR-D gadget.
+'''
+import numpy as np
+import pytest
+
+from Settings.arguments import arguments
+from Settings.constants import constants
+from Game.card_tools import card_tools
+from Lookahead.cfrd_gadget import CFRDGadget
+
+RIVER_BOARD = np.array([5, 14, 27, 38, 48], dtype=arguments.int_dtype)
+
+
+def gadget_loop(board, opponent_cfvs, current_cfvs):
+	''' Reference: CFR+ on the gadget game of every hand (one hand at a time).
+		Opponent chooses between terminal action (initial cfvs) and follow action (cfvs of re-solving)
+	@param: [I]    :initial opponent cfvs
+	@param: [N,I]  :opponent cfvs of re-solving in every iteration
+	@return [N,I]  :opponent range of every iteration
+	'''
+	mask = card_tools.get_possible_hands_mask(board)
+	out = np.zeros(current_cfvs.shape)
+	for hand in range(constants.hand_count):
+		regret_follow, regret_terminal = 0.0, 0.0
+		strategy_follow, strategy_terminal = 0.0, 1.0
+		for iter in range(current_cfvs.shape[0]):
+			follow, terminal = float(current_cfvs[iter, hand]), float(opponent_cfvs[hand])
+			total = follow * strategy_follow + terminal * strategy_terminal
+			regret_follow = max(regret_follow + follow - total, constants.regret_epsilon)
+			regret_terminal = max(regret_terminal + terminal - total, constants.regret_epsilon)
+			strategy_follow = regret_follow / (regret_follow + regret_terminal) * mask[hand]
+			strategy_terminal = regret_terminal / (regret_follow + regret_terminal) * mask[hand]
+			out[iter, hand] = strategy_follow
+	return out
+
+
+def random_cfvs(seed, shape):
+	return np.random.default_rng(seed).uniform(-1, 1, shape).astype(arguments.dtype)
+
+
+def test_first_step():
+	HC = constants.hand_count
+	opponent_cfvs = np.zeros([HC], dtype=arguments.dtype)
+	current_cfvs = np.zeros([HC], dtype=arguments.dtype)
+	# hand with better follow value, hand with better terminal value, hand blocked by the board
+	better, worse = card_tools.get_hand_index([0, 1]), card_tools.get_hand_index([2, 3])
+	blocked = card_tools.get_hand_index([5, 6])
+	current_cfvs[better], current_cfvs[worse], current_cfvs[blocked] = 3, -2, 3
+	opponent_range = CFRDGadget(RIVER_BOARD, opponent_cfvs).compute_opponent_range(current_cfvs)
+	# terminal action is played at first: regrets are [3, 0] and [-2, 0], both are floored at epsilon
+	eps = constants.regret_epsilon
+	np.testing.assert_allclose(opponent_range[better], 3 / (3 + eps))
+	np.testing.assert_allclose(opponent_range[worse], 0.5)
+	assert opponent_range[blocked] == 0
+	# every hand chooses between actions separately (range is not normalized over hands)
+	assert np.all(opponent_range[ card_tools.get_possible_hands_mask(RIVER_BOARD) > 0 ] >= 0.5)
+
+
+def test_iterations_match_loop():
+	HC, num_iters = constants.hand_count, 5
+	opponent_cfvs = random_cfvs(0, [HC])
+	current_cfvs = random_cfvs(1, [num_iters, HC])
+	expected = gadget_loop(RIVER_BOARD, opponent_cfvs, current_cfvs)
+	# b = 1: vector of cfvs and batch with one entry
+	for shape in [ [HC], [1,HC] ]:
+		gadget = CFRDGadget(RIVER_BOARD, opponent_cfvs.reshape(shape))
+		for iter in range(num_iters):
+			opponent_range = gadget.compute_opponent_range(current_cfvs[iter].reshape(shape))
+			assert opponent_range.shape == tuple(shape)
+			np.testing.assert_allclose(opponent_range.reshape([HC]), expected[iter], rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize('board_batched', [False, True])
+def test_batch_matches_separate_entries(board_batched):
+	HC, batch_size, num_iters = constants.hand_count, 3, 4
+	boards = np.stack([ RIVER_BOARD, [0, 1, 20, 33, 50], [3, 7, 11, 15, 40] ]).astype(arguments.int_dtype)
+	if not board_batched:
+		boards[:] = RIVER_BOARD
+	opponent_cfvs = random_cfvs(2, [batch_size, HC])
+	current_cfvs = random_cfvs(3, [num_iters, batch_size, HC])
+	gadget = CFRDGadget(boards if board_batched else RIVER_BOARD, opponent_cfvs)
+	entry_gadgets = [ CFRDGadget(boards[entry], opponent_cfvs[entry]) for entry in range(batch_size) ]
+	for iter in range(num_iters):
+		opponent_ranges = gadget.compute_opponent_range(current_cfvs[iter]).copy()
+		for entry in range(batch_size):
+			expected = entry_gadgets[entry].compute_opponent_range(current_cfvs[iter, entry])
+			np.testing.assert_array_equal(opponent_ranges[entry], expected)
@@ -0,0 +1,57 @@
+'''
+	Tests of persistent equity matrix cache (see TerminalEquity/equity_cache.py).
+'''
+import os
+import numpy as np
+
+from Settings.arguments import arguments
+from Settings.constants import constants
+from Game.suit_isomorphism import suit_isomorphism
+from TerminalEquity.equity_cache import EquityCache
+
+
+def random_matrix(seed):
+	HC = constants.hand_count
+	return np.random.default_rng(seed).random([HC, HC]).astype(arguments.dtype)
+
+
+def test_isomorphic_boards_share_matrix(tmp_path):
+	cache = EquityCache(dir_path=str(tmp_path))
+	board = np.array([4, 13, 30], dtype=arguments.int_dtype)
+	matrix = random_matrix(0)
+	cache.store(board, matrix)
+	assert np.array_equal(cache.get(board), matrix)
+	# all isomorphic boards get remapped matrix from the same file
+	for p in range(suit_isomorphism.suit_permutations.shape[0]):
+		permuted_board = np.sort(suit_isomorphism.permute_cards(board, p)).astype(arguments.int_dtype)
+		expected = suit_isomorphism.from_canonical_hands(suit_isomorphism.from_canonical_hands(matrix, suit_isomorphism.inverse_permutations[p], axis=0), suit_isomorphism.inverse_permutations[p], axis=1)
+		assert np.array_equal(cache.get(permuted_board), expected)
+	assert len([ name for name in os.listdir(str(tmp_path)) if name.endswith('.npy') ]) == 1
+
+
+def test_read_only_cache(tmp_path, monkeypatch):
+	cache = EquityCache(dir_path=str(tmp_path))
+	board = np.array([0, 5, 10], dtype=arguments.int_dtype)
+	cache.store(board, random_matrix(0))
+	def raise_permission_error(*args, **kwargs):
+		raise PermissionError('read-only')
+	# matrix can not be marked as recently used or written
+	monkeypatch.setattr(os, 'utime', raise_permission_error)
+	monkeypatch.setattr(os, 'replace', raise_permission_error)
+	assert cache.get(board) is not None
+	other_board = np.array([1, 6, 20], dtype=arguments.int_dtype)
+	cache.store(other_board, random_matrix(1))
+	assert cache.get(other_board) is None
+	assert not [ name for name in os.listdir(str(tmp_path)) if name.endswith('.tmp') ]
+
+
+def test_eviction_keeps_stored_matrix(tmp_path):
+	# limit is smaller than one matrix
+	cache = EquityCache(dir_path=str(tmp_path), max_size=1)
+	boards = [ np.array(board, dtype=arguments.int_dtype) for board in [[0, 5, 10], [1, 6, 20], [2, 7, 30, 40]] ]
+	for i, board in enumerate(boards):
+		cache.store(board, random_matrix(i))
+		# only the just stored matrix is kept
+		assert np.array_equal(cache.get(board), random_matrix(i))
+		for prev_board in boards[:i]:
+			assert cache.get(prev_board) is None
@@ -0,0 +1,328 @@
+'''
+	Tests of re-solving with lookahead (see Lookahead/lookahead.py) on small trees:
+	against reference CFR on the public tree and against other lookahead configurations.
+'''
+import numpy as np
+import pytest
+
+# neural network modules (imported by lookahead builder) need tensorflow
+pytest.importorskip('tensorflow')
+
+from Settings.arguments import arguments
+from Settings.constants import constants
+from Game.card_tools import card_tools
+from helper_classes import Node, TreeParams
+
+RIVER_BOARD = [5, 14, 27, 38, 48]
+
+
+@pytest.fixture(autouse=True)
+def few_iterations(repo_dir, monkeypatch):
+	monkeypatch.setattr(arguments, 'cfr_iters', 30)
+	monkeypatch.setattr(arguments, 'cfr_skip_iters', 10)
+	# one bet size: every node has the same actions, so reference tree and lookahead layers match one to one
+	monkeypatch.setitem(arguments.bet_sizing, 'river', [1])
+	# every resolve builds its own lookahead (pooled lookaheads are tested separately)
+	from Lookahead import resolving
+	from Lookahead.lookahead_pool import LookaheadPool
+	monkeypatch.setattr(resolving, 'lookahead_pool', LookaheadPool(max_size=0))
+
+
+def get_node(board, bets, current_player=constants.players.P1):
+	''' Gives root node of re-solving '''
+	node = Node()
+	node.board = np.array(board, dtype=arguments.int_dtype)
+	node.street = card_tools.board_to_street(node.board)
+	node.current_player = current_player
+	node.bets = np.array(bets, dtype=arguments.dtype)
+	node.num_bets = 0
+	return node
+
+
+def random_ranges(board, batch_size, seed):
+	''' Gives random ranges of possible hands
+	@return [b,I] :ranges
+	'''
+	ranges = np.random.default_rng(seed).random([batch_size, constants.hand_count])
+	ranges *= card_tools.get_possible_hands_mask(np.array(board, dtype=arguments.int_dtype))
+	ranges /= ranges.sum(axis=1, keepdims=True)
+	return ranges.astype(arguments.dtype)
+
+
+def resolve(node, player_range, opponent_range=None, opponent_cfvs=None, terminal_equity=None, **kwargs):
+	''' Re-solves the node (with terminal equity of its board)
+	@return LookaheadResults :results
+	'''
+	from TerminalEquity.terminal_equity import TerminalEquity
+	from Lookahead.resolving import Resolving
+	if terminal_equity is None:
+		terminal_equity = TerminalEquity()
+		terminal_equity.set_board(node.board)
+	return Resolving(terminal_equity).resolve(node, player_range, opponent_range=opponent_range, opponent_cfvs=opponent_cfvs, **kwargs)
+
+
+def reference_cfr(node, ranges):
+	''' Reference: CFR+ on public tree of the last street (one node at a time, batch size 1)
+		with the same rules as lookahead: regret matching, regrets are floored at 0 after
+		every update, fold of the first node is masked with free check, average strategy
+		and cfvs of the root are plain averages of iterations after skipped ones
+	@param: Node  :root node
+	@param: [P,I] :ranges of both players
+	@return [A,I] :average strategy of the root
+	@return [P,I] :average cfvs of the root (of both players)
+	'''
+	from TerminalEquity.terminal_equity import TerminalEquity
+	from Tree.tree_builder import PokerTreeBuilder
+	params = TreeParams()
+	params.root_node, params.limit_to_street = node, True
+	tree = PokerTreeBuilder().build_tree(params)
+	terminal_equity = TerminalEquity()
+	terminal_equity.set_board(node.board)
+	equity_matrix = terminal_equity.get_equity_matrix().astype(np.float64)
+	fold_matrix = terminal_equity.get_fold_matrix().astype(np.float64)
+	ranges = ranges.astype(np.float64)
+	regrets = {}
+	def get_values(node, ranges, acting_player):
+		# [P,I] values of both players
+		values = np.zeros_like(ranges)
+		if node.type == constants.node_types.terminal_fold:
+			folded, winner = acting_player, 1 - acting_player
+			values[winner] = np.dot(ranges[folded], fold_matrix)
+			values[folded] = -np.dot(ranges[winner], fold_matrix)
+			return values * node.pot, None
+		if node.terminal:
+			for player in range(constants.players_count):
+				values[player] = np.dot(ranges[1-player], equity_matrix)
+			return values * node.pot, None
+		player = node.current_player
+		node_regrets = regrets.setdefault(id(node), np.zeros([len(node.children), constants.hand_count]))
+		strategy = np.maximum(node_regrets, constants.regret_epsilon)
+		if node is tree and node.bets[0] == node.bets[1]:
+			# fold of the first node is not used when check is for free
+			strategy[0] = 0
+		strategy /= strategy.sum(axis=0, keepdims=True)
+		# [A,P,I] values of all children
+		children_values = np.zeros([len(node.children)] + list(ranges.shape))
+		for action, child in enumerate(node.children):
+			child_ranges = ranges.copy()
+			child_ranges[player] *= strategy[action]
+			children_values[action] = get_values(child, child_ranges, player)[0]
+		values[1-player] = children_values[ : , 1-player ].sum(axis=0)
+		values[player] = np.sum(strategy * children_values[ : , player ], axis=0)
+		node_regrets += children_values[ : , player ] - values[player]
+		np.maximum(node_regrets, 0, out=node_regrets)
+		return values, strategy
+	strategy_sum, values_sum = 0, 0
+	for iter in range(arguments.cfr_iters):
+		values, strategy = get_values(tree, ranges, None)
+		if iter > arguments.cfr_skip_iters:
+			strategy_sum, values_sum = strategy_sum + strategy, values_sum + values
+	return strategy_sum / strategy_sum.sum(axis=0, keepdims=True), values_sum / (arguments.cfr_iters - arguments.cfr_skip_iters - 1)
+
+
+@pytest.mark.parametrize('bets', [ [200, 200], [200, 600] ])
+def test_lookahead_matches_reference_cfr(bets):
+	node = get_node(RIVER_BOARD, bets)
+	player_range, opponent_range = random_ranges(RIVER_BOARD, 1, 0), random_ranges(RIVER_BOARD, 1, 1)
+	results = resolve(node, player_range, opponent_range=opponent_range)
+	strategy, values = reference_cfr(node, np.concatenate([player_range, opponent_range]))
+	np.testing.assert_allclose(results.strategy[ : , 0 ], strategy, atol=1e-4)
+	np.testing.assert_allclose(results.root_cfvs_both_players[0], values, rtol=1e-4, atol=1e-2)
+
+
+def test_batch_matches_separate_solves():
+	node = get_node(RIVER_BOARD, [200, 600])
+	player_ranges, opponent_ranges = random_ranges(RIVER_BOARD, 2, 2), random_ranges(RIVER_BOARD, 2, 3)
+	# batch entries share scratch buffers of lookahead, but not their values
+	results = resolve(node, player_ranges, opponent_range=opponent_ranges)
+	for entry in range(2):
+		e = slice(entry, entry+1)
+		expected = resolve(node, player_ranges[e], opponent_range=opponent_ranges[e])
+		np.testing.assert_allclose(results.strategy[ : , e ], expected.strategy, rtol=1e-5, atol=1e-6)
+		np.testing.assert_allclose(results.root_cfvs_both_players[e], expected.root_cfvs_both_players, rtol=1e-5, atol=1e-3)
+
+
+@pytest.mark.parametrize('bets', [ [200, 200], [200, 600] ])
+def test_padded_nodes_are_skipped(monkeypatch, bets):
+	from Lookahead.lookahead_builder import LookaheadBuilder
+	# two bet sizes: nodes with fewer raises than the layer maximum are padded
+	monkeypatch.setitem(arguments.bet_sizing, 'river', [1,2])
+	node = get_node(RIVER_BOARD, bets)
+	player_range, opponent_range = random_ranges(RIVER_BOARD, 2, 4), random_ranges(RIVER_BOARD, 2, 5)
+	results = resolve(node, player_range, opponent_range=opponent_range)
+	# reference: terminal values of every node are computed (padding included)
+	compute_existing_nodes = LookaheadBuilder._compute_existing_nodes
+	def compute_all_nodes(self):
+		compute_existing_nodes(self)
+		assert any([ not layer.existing_nodes.all() for layer in self.lookahead.layers[1:-1] ])
+		for layer in self.lookahead.layers[ :-1 ]:
+			layer.existing_nodes = np.ones_like(layer.existing_nodes)
+	monkeypatch.setattr(LookaheadBuilder, '_compute_existing_nodes', compute_all_nodes)
+	expected = resolve(node, player_range, opponent_range=opponent_range)
+	np.testing.assert_allclose(results.strategy, expected.strategy, rtol=1e-5, atol=1e-6)
+	np.testing.assert_allclose(results.root_cfvs_both_players, expected.root_cfvs_both_players, rtol=1e-5, atol=1e-3)
+
+
+def test_threaded_iterations_match_single_thread(monkeypatch):
+	node = get_node(RIVER_BOARD, [200, 600])
+	player_range, opponent_range = random_ranges(RIVER_BOARD, 2, 6), random_ranges(RIVER_BOARD, 2, 7)
+	monkeypatch.setattr(arguments, 'lookahead_num_threads', 1)
+	expected = resolve(node, player_range, opponent_range=opponent_range)
+	# hands are split between threads, so every element is computed in the same way
+	monkeypatch.setattr(arguments, 'lookahead_num_threads', 4)
+	results = resolve(node, player_range, opponent_range=opponent_range)
+	np.testing.assert_allclose(results.strategy, expected.strategy, rtol=1e-6, atol=1e-7)
+	np.testing.assert_allclose(results.root_cfvs_both_players, expected.root_cfvs_both_players, rtol=1e-6, atol=1e-4)
+
+
+class FakeNextRoundValue():
+	''' Stands for neural network of next street: cfvs are fixed linear function of ranges '''
+	def __init__(self):
+		HC = constants.hand_count
+		self.matrix = np.random.default_rng(0).uniform(-1, 1, [HC,HC]).astype(arguments.dtype) / HC
+		self.next_boards = np.zeros([0], dtype=arguments.int_dtype)
+
+	def init_computation(self, board, pot_sizes, batch_size):
+		self.num_evaluations = 0
+
+	def evaluate_ranges(self, ranges):
+		# [b,P,I] -> [b,P,I] (values of player depend on range of opponent)
+		self.num_evaluations += 1
+		return np.dot(ranges[ : , ::-1 ], self.matrix)
+
+	def get_stored_cfvs_of_all_next_round_boards(self):
+		return None
+
+
+def test_async_evaluation_matches_sync(monkeypatch):
+	from NeuralNetwork import next_round_value
+	turn_board = RIVER_BOARD[ :4 ]
+	fake = FakeNextRoundValue()
+	monkeypatch.setitem(next_round_value.NEXT_ROUND_VALUES, card_tools.board_to_street(np.array(turn_board)), fake)
+	node = get_node(turn_board, [200, 600])
+	player_range, opponent_range = random_ranges(turn_board, 2, 8), random_ranges(turn_board, 2, 9)
+	monkeypatch.setattr(arguments, 'nn_evaluation_mode', 'sync')
+	expected = resolve(node, player_range, opponent_range=opponent_range)
+	assert fake.num_evaluations == arguments.cfr_iters
+	# neural network is evaluated in worker thread, while terminal equity is computed
+	monkeypatch.setattr(arguments, 'nn_evaluation_mode', 'async')
+	results = resolve(node, player_range, opponent_range=opponent_range)
+	assert fake.num_evaluations == arguments.cfr_iters
+	np.testing.assert_array_equal(results.strategy, expected.strategy)
+	np.testing.assert_array_equal(results.root_cfvs_both_players, expected.root_cfvs_both_players)
+
+
+def test_pooled_lookahead_matches_fresh(monkeypatch):
+	from Lookahead import resolving
+	from Lookahead.lookahead import Lookahead
+	from Lookahead.lookahead_pool import LookaheadPool
+	player_range, opponent_range = random_ranges(RIVER_BOARD, 2, 10), random_ranges(RIVER_BOARD, 2, 11)
+	node = get_node(RIVER_BOARD, [200, 600])
+	expected = resolve(node, player_range, opponent_range=opponent_range)
+	# lookahead of other spot with the same tree structure (other pot sizes and ranges) is reused
+	monkeypatch.setattr(resolving, 'lookahead_pool', LookaheadPool(max_size=256))
+	resolve(get_node(RIVER_BOARD, [200, 500]), opponent_range, opponent_range=player_range)
+	num_reused = []
+	reuse = Lookahead.reuse
+	monkeypatch.setattr(Lookahead, 'reuse', lambda self, *args: num_reused.append(1) or reuse(self, *args))
+	results = resolve(node, player_range, opponent_range=opponent_range)
+	assert len(num_reused) == 1
+	np.testing.assert_array_equal(results.strategy, expected.strategy)
+	np.testing.assert_array_equal(results.root_cfvs_both_players, expected.root_cfvs_both_players)
+
+
+def test_cached_tree_matches_fresh(monkeypatch):
+	from collections import OrderedDict
+	from Tree import tree_builder
+	player_range, opponent_range = random_ranges(RIVER_BOARD, 2, 12), random_ranges(RIVER_BOARD, 2, 13)
+	node = get_node(RIVER_BOARD, [200, 600])
+	expected = resolve(node, player_range, opponent_range=opponent_range)
+	# tree is built without board on the first resolve and taken from cache on the second one
+	monkeypatch.setattr(tree_builder, 'TREE_CACHE', OrderedDict())
+	monkeypatch.setattr(arguments, 'tree_cache_size', 64)
+	for _ in range(2):
+		results = resolve(node, player_range, opponent_range=opponent_range)
+		assert len(tree_builder.TREE_CACHE) == 1
+		np.testing.assert_array_equal(results.strategy, expected.strategy)
+		np.testing.assert_array_equal(results.root_cfvs_both_players, expected.root_cfvs_both_players)
+	# other bet sizing does not use tree of the cache
+	monkeypatch.setitem(arguments.bet_sizing, 'river', [1,2])
+	results = resolve(node, player_range, opponent_range=opponent_range)
+	assert len(tree_builder.TREE_CACHE) == 2 and results.strategy.shape[0] > expected.strategy.shape[0]
+
+
+def test_board_batch_matches_separate_solves():
+	from TerminalEquity.terminal_equity import TerminalEquity
+	from Lookahead.resolving import Resolving
+	boards = [ RIVER_BOARD, [0, 1, 20, 33, 50] ]
+	terminal_equities = []
+	for board in boards:
+		terminal_equities.append(TerminalEquity())
+		terminal_equities[-1].set_board(np.array(board, dtype=arguments.int_dtype))
+	# entries are grouped by board: [board 0, board 0, board 1]
+	entry_boards = [0, 0, 1]
+	player_ranges = np.concatenate([ random_ranges(boards[b], 1, 14+e) for e, b in enumerate(entry_boards) ])
+	opponent_ranges = np.concatenate([ random_ranges(boards[b], 1, 20+e) for e, b in enumerate(entry_boards) ])
+	node = get_node(RIVER_BOARD, [200, 600])
+	entry_terminal_equities = [ terminal_equities[b] for b in entry_boards ]
+	results = Resolving(entry_terminal_equities).resolve(node, player_ranges, opponent_range=opponent_ranges)
+	for entry, b in enumerate(entry_boards):
+		e = slice(entry, entry+1)
+		expected = resolve(get_node(boards[b], [200, 600]), player_ranges[e], opponent_range=opponent_ranges[e], terminal_equity=terminal_equities[b])
+		np.testing.assert_allclose(results.strategy[ : , e ], expected.strategy, rtol=1e-5, atol=1e-6)
+		np.testing.assert_allclose(results.root_cfvs_both_players[e], expected.root_cfvs_both_players, rtol=1e-5, atol=1e-3)
+
+
+def record_root_cfvs(monkeypatch):
+	''' Records root cfvs of every iteration of lookahead (with the same player indexing as root_cfvs_both_players)
+	@return [[b,P,I],...] :list, where cfvs of each iteration are appended
+	'''
+	from Lookahead.lookahead import Lookahead
+	root_cfvs = []
+	compute_iteration = Lookahead._compute_iteration
+	def compute_recorded_iteration(self, *args):
+		compute_iteration(self, *args)
+		# lookahead cfvs have swapped player indexing: [1, 1, 1, b, P, I] -> [b, P, I]
+		root_cfvs.append(self.layers[0].cfvs[0,0,0][ : , ::-1 ].copy())
+	monkeypatch.setattr(Lookahead, '_compute_iteration', compute_recorded_iteration)
+	return root_cfvs
+
+
+def test_average_cfvs_are_normalized_by_averaged_iterations(monkeypatch):
+	root_cfvs = record_root_cfvs(monkeypatch)
+	node = get_node(RIVER_BOARD, [200, 600])
+	results = resolve(node, random_ranges(RIVER_BOARD, 2, 30), opponent_range=random_ranges(RIVER_BOARD, 2, 31))
+	assert results.num_iters == len(root_cfvs) == arguments.cfr_iters
+	# iterations after cfr_skip_iters are averaged (previous divisor was cfr_iters - cfr_skip_iters)
+	averaged = root_cfvs[ arguments.cfr_skip_iters+1: ]
+	assert len(averaged) == arguments.cfr_iters - arguments.cfr_skip_iters - 1
+	np.testing.assert_allclose(results.root_cfvs_both_players, np.mean(averaged, axis=0), rtol=1e-5, atol=1e-3)
+
+
+@pytest.mark.parametrize('bets', [ [200, 200], [200, 600] ])
+def test_time_budget_before_averaging_gives_last_iteration(monkeypatch, bets):
+	root_cfvs = record_root_cfvs(monkeypatch)
+	node = get_node(RIVER_BOARD, bets)
+	# budget runs out during skipped iterations (first iteration is always done)
+	results = resolve(node, random_ranges(RIVER_BOARD, 2, 32), opponent_range=random_ranges(RIVER_BOARD, 2, 33), time_budget=1e-9)
+	assert results.num_iters == len(root_cfvs) == 1 and results.num_iters <= arguments.cfr_skip_iters
+	# strategy of the first iteration is uniform (fold is not used with free check)
+	strategy = np.ones(results.strategy.shape)
+	if bets[0] == bets[1]:
+		strategy[0] = 0
+	strategy /= strategy.sum(axis=0, keepdims=True)
+	np.testing.assert_allclose(results.strategy, strategy, rtol=1e-6)
+	np.testing.assert_allclose(results.root_cfvs_both_players, root_cfvs[-1], rtol=1e-6, atol=1e-4)
+
+
+def test_target_gap_stops_early(monkeypatch):
+	monkeypatch.setattr(arguments, 'cfr_iters', 1000)
+	monkeypatch.setattr(arguments, 'resolve_check_iters', 10)
+	node = get_node(RIVER_BOARD, [200, 600])
+	player_range, opponent_range = random_ranges(RIVER_BOARD, 1, 34), random_ranges(RIVER_BOARD, 1, 35)
+	full = resolve(node, player_range, opponent_range=opponent_range)
+	assert full.num_iters == arguments.cfr_iters and full.gap is not None
+	results = resolve(node, player_range, opponent_range=opponent_range, target_gap=1e-2)
+	assert results.num_iters < arguments.cfr_iters and results.gap <= 1e-2
+	# gap is measured every resolve_check_iters averaged iterations
+	assert (results.num_iters - arguments.cfr_skip_iters - 1) % arguments.resolve_check_iters == 0
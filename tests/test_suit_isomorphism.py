@@ -0,0 +1,102 @@
+'''
+	Exhaustive round-trip tests of suit isomorphism (see Game/suit_isomorphism.py).
+'''
+import itertools
+import numpy as np
+import pytest
+
+from Settings.constants import constants
+from Game.card_tools import card_tools
+from Game.suit_isomorphism import suit_isomorphism
+
+# number of suit isomorphism classes of all boards with 3, 4 and 5 cards
+CANONICAL_BOARDS_COUNT = { 3:1755, 4:16432, 5:134459 }
+# boards are processed in chunks (all permutations of 5 card boards do not fit into memory at once)
+CHUNK_SIZE = 100000
+
+
+def get_all_boards(num_cards):
+	''' Gives all boards with `num_cards` cards
+	@return [B,k] :sorted boards
+	'''
+	return np.array(list(itertools.combinations(range(constants.card_count), num_cards)), dtype=np.int64)
+
+
+def get_canonical_boards_in_chunks(boards):
+	''' Does suit_isomorphism.get_canonical_boards in chunks
+	@return [B,k] :canonical boards
+	@return [B]   :indexes of suit permutations
+	'''
+	canonical_boards, permutations = zip(*[ suit_isomorphism.get_canonical_boards(boards[i:i+CHUNK_SIZE]) for i in range(0, boards.shape[0], CHUNK_SIZE) ])
+	return np.concatenate(canonical_boards), np.concatenate(permutations)
+
+
+def test_card_permutations_invert():
+	cards = np.arange(constants.card_count)
+	for p, inverse in enumerate(suit_isomorphism.inverse_permutations):
+		permuted = suit_isomorphism.permute_cards(cards, p)
+		assert np.array_equal(np.sort(permuted), cards)
+		assert np.array_equal(suit_isomorphism.permute_cards(permuted, inverse), cards)
+		# ranks are not changed
+		assert np.array_equal(permuted // constants.suit_count, cards // constants.suit_count)
+
+
+def test_hand_permutations_invert():
+	hands = np.arange(constants.hand_count)
+	for p, inverse in enumerate(suit_isomorphism.inverse_permutations):
+		permuted = suit_isomorphism.hand_permutations[p]
+		assert np.array_equal(np.sort(permuted), hands)
+		assert np.array_equal(suit_isomorphism.hand_permutations[inverse][permuted], hands)
+		# hand permutation is card permutation applied to both cards of the hand
+		permuted_cards = np.sort(suit_isomorphism.permute_cards(card_tools.hand_to_cards, p), axis=1)
+		assert np.array_equal(card_tools.hand_to_cards[permuted], permuted_cards)
+
+
+def test_vector_and_matrix_remaps_invert():
+	rng = np.random.default_rng(0)
+	HC = constants.hand_count
+	values = rng.random([3, HC])
+	matrix = rng.random([HC, HC])
+	for p, inverse in enumerate(suit_isomorphism.inverse_permutations):
+		canonical_values = suit_isomorphism.to_canonical_hands(values, p)
+		assert np.array_equal(suit_isomorphism.from_canonical_hands(canonical_values, p), values)
+		canonical_values = suit_isomorphism.to_canonical_hands(values.T, p, axis=0)
+		assert np.array_equal(suit_isomorphism.from_canonical_hands(canonical_values, p, axis=0), values.T)
+		# matrix remap with the inverse permutation is the inverse remap
+		board_matrix = suit_isomorphism.from_canonical_matrix(matrix, p)
+		assert np.array_equal(suit_isomorphism.from_canonical_matrix(board_matrix, inverse), matrix)
+		# matrix remap is the same as remap of both hand axes
+		remapped = suit_isomorphism.from_canonical_hands(suit_isomorphism.from_canonical_hands(matrix, p, axis=0), p, axis=1)
+		assert np.array_equal(board_matrix, remapped)
+
+
+@pytest.mark.parametrize('num_cards', [3,4,5])
+def test_canonical_boards_count(num_cards):
+	boards = get_all_boards(num_cards)
+	canonical_boards, permutations = get_canonical_boards_in_chunks(boards)
+	# permutation transforms board to its canonical board
+	for p in range(suit_isomorphism.suit_permutations.shape[0]):
+		selected = permutations == p
+		permuted = np.sort(suit_isomorphism.permute_cards(boards[selected], p), axis=1)
+		assert np.array_equal(permuted, canonical_boards[selected])
+	assert np.unique(suit_isomorphism._boards_to_keys(canonical_boards)).shape[0] == CANONICAL_BOARDS_COUNT[num_cards]
+
+
+@pytest.mark.parametrize('num_cards', [3,4])
+def test_possible_hands_mask_remap(num_cards):
+	for board in get_all_boards(num_cards).astype(np.int16):
+		canonical_board, permutation = suit_isomorphism.get_canonical_board(board)
+		mask = card_tools.get_possible_hands_mask(board)
+		canonical_mask = card_tools.get_possible_hands_mask(canonical_board)
+		assert np.array_equal(suit_isomorphism.to_canonical_hands(mask, permutation), canonical_mask)
+		assert np.array_equal(suit_isomorphism.from_canonical_hands(canonical_mask, permutation), mask)
+
+
+def test_to_canonical_matrix_inverts():
+	matrix = np.random.default_rng(0).random([constants.hand_count, constants.hand_count])
+	for p in range(suit_isomorphism.suit_permutations.shape[0]):
+		canonical_matrix = suit_isomorphism.to_canonical_matrix(matrix, p)
+		assert np.array_equal(suit_isomorphism.from_canonical_matrix(canonical_matrix, p), matrix)
+		# matrix remap is the same as remap of both hand axes
+		remapped = suit_isomorphism.to_canonical_hands(suit_isomorphism.to_canonical_hands(matrix, p, axis=0), p, axis=1)
+		assert np.array_equal(canonical_matrix, remapped)
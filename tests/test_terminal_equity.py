@@ -0,0 +1,173 @@
+'''
+	Tests of terminal equity kernels against the dense equity/fold matrices (see TerminalEquity/terminal_equity.py).
+'''
+import numpy as np
+import pytest
+
+from Settings.arguments import arguments
+from Settings.constants import constants
+from Game.card_tools import card_tools
+from Game.card_combinations import card_combinations
+
+# random board, paired board, board with 4 cards of the same suit
+RIVER_BOARDS = [ [5, 14, 27, 38, 48], [0, 1, 20, 33, 50], [3, 7, 11, 15, 40] ]
+
+
+@pytest.fixture
+def terminal_equity(repo_dir):
+	from TerminalEquity.terminal_equity import TerminalEquity
+	return TerminalEquity()
+
+
+def random_ranges(seed, num_ranges):
+	''' Gives random ranges with some zero entries
+	@return [N,I] :ranges
+	'''
+	rng = np.random.default_rng(seed)
+	ranges = rng.random([num_ranges, constants.hand_count])
+	ranges[ rng.random(ranges.shape) < 0.3 ] = 0
+	return ranges.astype(arguments.dtype)
+
+
+@pytest.mark.parametrize('board', RIVER_BOARDS)
+@pytest.mark.parametrize('num_ranges', [1, 7])
+def test_sorted_showdown_values(terminal_equity, monkeypatch, board, num_ranges):
+	monkeypatch.setattr(arguments, 'showdown_kernel', 'sorted')
+	terminal_equity.set_board(np.array(board, dtype=arguments.int_dtype))
+	ranges = random_ranges(num_ranges, num_ranges)
+	values = terminal_equity.get_call_values(ranges)
+	expected = np.dot(ranges.astype(np.float64), terminal_equity.get_equity_matrix().astype(np.float64))
+	np.testing.assert_allclose(values, expected, rtol=1e-5, atol=1e-3)
+	# scratch buffers are reused by the next call
+	assert np.array_equal(terminal_equity.get_call_values(ranges), values)
+
+
+@pytest.mark.parametrize('board', RIVER_BOARDS)
+def test_sorted_showdown_values_with_ties(terminal_equity, monkeypatch, board):
+	HC = constants.hand_count
+	monkeypatch.setattr(arguments, 'showdown_kernel', 'sorted')
+	board = np.array(board, dtype=arguments.int_dtype)
+	terminal_equity.set_board(board)
+	# few strength levels, so most hands tie with many others (impossible hands have strength 0)
+	strength = -np.random.default_rng(0).integers(1, 20, size=HC)
+	strength *= card_tools.get_possible_hands_mask(board).astype(bool)
+	terminal_equity._set_sorted_showdown(strength)
+	equity_matrix = np.zeros([HC,HC], dtype=arguments.dtype)
+	terminal_equity._set_last_round_equity_matrix(equity_matrix, strength)
+	terminal_equity._handle_blocking_cards(equity_matrix, board)
+	ranges = random_ranges(0, 3)
+	values = terminal_equity.get_call_values(ranges)
+	np.testing.assert_allclose(values, np.dot(ranges.astype(np.float64), equity_matrix), rtol=1e-5, atol=1e-3)
+
+
+@pytest.mark.parametrize('board', [ [], [3, 17, 40], [3, 17, 40, 51], RIVER_BOARDS[0] ])
+def test_fold_values(terminal_equity, board):
+	terminal_equity.set_board(np.array(board, dtype=arguments.int_dtype))
+	ranges = random_ranges(1, 5)
+	values = terminal_equity.get_fold_values(ranges)
+	expected = np.dot(ranges.astype(np.float64), terminal_equity.get_fold_matrix().astype(np.float64))
+	np.testing.assert_allclose(values, expected, rtol=1e-5, atol=1e-3)
+	# result can be written into preallocated array
+	out = np.empty_like(values)
+	assert terminal_equity.get_fold_values(ranges, out=out) is out
+	assert np.array_equal(out, values)
+
+
+def sum_boards_equity_loop(boards):
+	''' Reference: sum of river equity matrices of every board (one board at a time)
+	@return [I,I] :(int) sum of equity matrices
+	'''
+	from TerminalEquity.evaluator import evaluator
+	HC = constants.hand_count
+	equity_sum = np.zeros([HC,HC], dtype=np.int64)
+	for strength in evaluator.evaluate_board(boards):
+		possible = strength < 0
+		equity_sum += np.sign(strength.reshape([HC,1]) - strength.reshape([1,HC])) * np.outer(possible, possible)
+	return equity_sum
+
+
+@pytest.mark.parametrize('board', [ [3, 17, 40], [3, 17, 40, 51] ])
+def test_transitioning_equity_matrix(terminal_equity, monkeypatch, board):
+	board = np.array(board, dtype=arguments.int_dtype)
+	street = card_tools.board_to_street(board)
+	last_round_boards = card_tools.get_last_round_boards(board)
+	# normalized by number of boards that are possible for both hands
+	expected = sum_boards_equity_loop(last_round_boards) / card_combinations.count_last_boards_possible_boards(street)
+	expected *= np.outer(card_tools.get_possible_hands_mask(board), card_tools.get_possible_hands_mask(board))
+	expected *= terminal_equity._block_matrix
+	# boards are split into many chunks
+	monkeypatch.setattr(arguments, 'equity_memory_limit', 32)
+	monkeypatch.setattr(arguments, 'river_cache_size', 0)
+	monkeypatch.setattr(arguments, 'use_equity_cache', False)
+	for num_threads in [1, 4]:
+		monkeypatch.setattr(arguments, 'equity_num_threads', num_threads)
+		terminal_equity.set_board(board)
+		assert terminal_equity.equity_matrix.shape == (constants.hand_count, constants.hand_count)
+		np.testing.assert_allclose(terminal_equity.equity_matrix, expected, rtol=1e-6, atol=1e-6)
+
+
+def test_low_rank_equity(terminal_equity, monkeypatch):
+	monkeypatch.setattr(arguments, 'equity_rank', 128)
+	board = np.array([3, 17, 40, 51], dtype=arguments.int_dtype)
+	terminal_equity.set_board(board)
+	matrix = terminal_equity.equity_matrix.astype(np.float64)
+	left, right = terminal_equity._low_rank_equity
+	residual = matrix - np.dot(left.astype(np.float64), right)
+	error = terminal_equity.low_rank_error
+	assert error['rank'] == left.shape[1] == right.shape[0] == 128
+	np.testing.assert_allclose(error['relative_error'], np.linalg.norm(residual) / np.linalg.norm(matrix), rtol=1e-5)
+	assert 0.8 * np.linalg.norm(residual, 2) <= error['spectral_error'] <= np.linalg.norm(residual, 2) * (1 + 1e-5)
+	# randomized SVD is close to the best approximation of the same rank
+	s = np.linalg.svd(matrix, compute_uv=False)
+	assert error['relative_error'] <= 1.05 * np.sqrt(np.sum(s[128:]**2)) / np.linalg.norm(matrix)
+	# lookahead values use the factors
+	ranges = random_ranges(2, 3)
+	expected = np.dot(np.dot(ranges.astype(np.float64), left), right) * card_tools.get_possible_hands_mask(board)
+	np.testing.assert_allclose(terminal_equity.get_call_values(ranges, allow_approximation=True), expected, rtol=1e-4, atol=1e-3)
+	np.testing.assert_allclose(terminal_equity.get_call_values(ranges), np.dot(ranges, matrix), rtol=1e-4, atol=1e-3)
+
+
+def test_low_rank_equity_tolerance(terminal_equity, monkeypatch):
+	monkeypatch.setattr(arguments, 'equity_rank_tolerance', 0.3)
+	terminal_equity.set_board(np.array([3, 17, 40, 51], dtype=arguments.int_dtype))
+	error = terminal_equity.low_rank_error
+	assert error['relative_error'] <= 0.3
+	assert terminal_equity._low_rank_equity[0].shape[1] == error['rank']
+	# tolerance, that needs more than half of the full rank, uses exact matrix
+	monkeypatch.setattr(arguments, 'equity_rank', 0)
+	monkeypatch.setattr(arguments, 'equity_rank_tolerance', 1e-6)
+	terminal_equity.set_board(np.array([3, 17, 40, 51], dtype=arguments.int_dtype))
+	assert terminal_equity._low_rank_equity is None and terminal_equity.low_rank_error['relative_error'] == 0
+
+
+@pytest.mark.parametrize('num_threads', [1, 4])
+def test_turn_equity_matrix_from_river_cache(terminal_equity, monkeypatch, num_threads):
+	flop, turn = np.array([3, 17, 40], dtype=arguments.int_dtype), np.array([3, 17, 40, 51], dtype=arguments.int_dtype)
+	monkeypatch.setattr(arguments, 'equity_memory_limit', 32)
+	monkeypatch.setattr(arguments, 'equity_num_threads', num_threads)
+	monkeypatch.setattr(arguments, 'use_equity_cache', False)
+	# strength does not depend on order of board cards (true for texas_lookup.zip, not for placeholder tables)
+	from TerminalEquity.evaluator import evaluator
+	evaluate_board = evaluator.evaluate_board
+	monkeypatch.setattr(evaluator, 'evaluate_board', lambda board: evaluate_board(np.sort(board, axis=-1)))
+	# built from scratch
+	monkeypatch.setattr(arguments, 'river_cache_size', 0)
+	terminal_equity.set_board(flop)
+	expected_flop = terminal_equity.equity_matrix.copy()
+	terminal_equity.set_board(turn)
+	expected_turn = terminal_equity.equity_matrix.copy()
+	# turn is selected from sums of river boards kept after flop
+	monkeypatch.setattr(arguments, 'river_cache_size', 128)
+	terminal_equity.set_board(np.zeros([0], dtype=arguments.int_dtype))
+	terminal_equity.set_board(flop)
+	assert terminal_equity._river_card_sums is not None
+	assert np.array_equal(terminal_equity.equity_matrix, expected_flop)
+	terminal_equity.set_board(turn)
+	assert np.array_equal(terminal_equity.equity_matrix, expected_turn)
+	# turn card can be any card
+	other_turn = np.array([3, 17, 40, 0], dtype=arguments.int_dtype)
+	terminal_equity.set_board(other_turn)
+	from_cache = terminal_equity.equity_matrix.copy()
+	terminal_equity._river_card_sums = None
+	terminal_equity.set_board(other_turn)
+	assert np.array_equal(from_cache, terminal_equity.equity_matrix)